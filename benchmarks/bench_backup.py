@@ -0,0 +1,83 @@
+"""Compares deep-copy and linked backup/restore on a synthetic checkpoint.
+
+Usage: python benchmarks/bench_backup.py [--dirs 20] [--runs 5] [--episode-mb 20]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from blockassist.data import (
+    backup_evaluate_dirs,
+    delete_evaluate_dirs,
+    restore_evaluate_dirs_from_backup,
+)
+
+
+def make_checkpoint(root: Path, num_dirs: int, runs_per_dir: int, episode_mb: int) -> Path:
+    checkpoint_dir = root / "base_checkpoint"
+    episode_bytes = os.urandom(episode_mb * 1024 * 1024)
+    for i in range(num_dirs):
+        for run in range(1, runs_per_dir + 1):
+            run_dir = checkpoint_dir / f"evaluate_{i:04d}" / str(run)
+            run_dir.mkdir(parents=True)
+            (run_dir / "episodes.zip").write_bytes(episode_bytes)
+            for name in ("config.json", "metrics.json"):
+                (run_dir / name).write_text("{}")
+            (run_dir / "run.json").write_text(json.dumps({"status": "COMPLETED"}))
+    return checkpoint_dir
+
+
+def disk_usage(path: Path) -> int:
+    # Counts each inode once, so hard links are not double counted.
+    seen, total = set(), 0
+    for f in path.rglob("*"):
+        st = f.lstat()
+        if f.is_file() and st.st_ino not in seen:
+            seen.add(st.st_ino)
+            total += st.st_blocks * 512
+    return total
+
+
+def bench(copy_strategy: str, args) -> None:
+    with tempfile.TemporaryDirectory(dir=args.tmp_dir) as tmp:
+        checkpoint_dir = make_checkpoint(Path(tmp), args.dirs, args.runs, args.episode_mb)
+        before = disk_usage(checkpoint_dir)
+
+        start = time.perf_counter()
+        backup_evaluate_dirs(str(checkpoint_dir), copy_strategy)
+        backup_s = time.perf_counter() - start
+        extra_mb = (disk_usage(checkpoint_dir) - before) / 1024 / 1024
+
+        delete_evaluate_dirs(str(checkpoint_dir))
+        start = time.perf_counter()
+        restore_evaluate_dirs_from_backup(str(checkpoint_dir), copy_strategy)
+        restore_s = time.perf_counter() - start
+
+        print(
+            f"{copy_strategy:>5}: backup {backup_s:7.3f}s  restore {restore_s:7.3f}s  "
+            f"extra disk {extra_mb:9.1f} MB"
+        )
+        shutil.rmtree(checkpoint_dir)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dirs", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--episode-mb", type=int, default=20)
+    parser.add_argument("--tmp-dir", default=None, help="Filesystem to benchmark on")
+    args = parser.parse_args()
+
+    total_mb = args.dirs * args.runs * args.episode_mb
+    print(f"Synthetic checkpoint: {args.dirs} evaluate dirs x {args.runs} runs, {total_mb} MB")
+    for copy_strategy in ("copy", "link"):
+        bench(copy_strategy, args)
+
+
+if __name__ == "__main__":
+    main()
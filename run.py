@@ -35,6 +35,9 @@ SUCCESS_COLOR = "green"
 DELINEATOR_COLOR = "bold white"
 GENSYN_COLOR = "bold magenta"
 
+# Matches training_metrics_path in src/blockassist/config.yaml.
+TRAINING_METRICS_PATH = "logs/training_metrics.jsonl"
+
 DEFAULT_QUEST_KEY = "1"
 QUEST_CHOICES = {
     "1": ("Classic BlockAssist (default)", "blockassist"),
@@ -231,6 +234,63 @@ def train_blockassist(env: Optional[Dict] = None):
     return process
 
 
+def _update_training_progress(progress, task, offset: int) -> int:
+    """Applies new training metrics events to the progress bar.
+
+    Returns the file offset up to which events have been read.
+    """
+    try:
+        with open(TRAINING_METRICS_PATH, "r") as f:
+            f.seek(offset)
+            lines = f.read().split("\n")
+    except OSError:
+        return offset
+
+    # The last element is an unfinished line, or "" if the file ends in one.
+    for line in lines[:-1]:
+        offset += len(line) + 1
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+
+        kind = event.get("event")
+        if kind == "start":
+            progress.update(task, total=event.get("num_training_iters") or None, completed=0)
+        elif kind == "phase_start":
+            progress.update(task, description=f"Training: {event['phase'].replace('_', ' ')}")
+        elif kind == "iteration":
+            progress.update(
+                task,
+                completed=event.get("iteration") or 0,
+                description=f"Training: {event.get('samples_per_s', 0):.0f} samples/s",
+            )
+        elif kind == "summary":
+            progress.update(task, description="Training finished")
+    return offset
+
+
+def wait_for_training(proc_train):
+    """Waits for the training process while rendering its metrics feed."""
+    offset = 0
+    if os.path.exists(TRAINING_METRICS_PATH):
+        offset = os.path.getsize(TRAINING_METRICS_PATH)
+
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[bold blue]{task.description}"),
+        BarColumn(),
+        TaskProgressColumn(),
+        TimeElapsedColumn(),
+        console=CONSOLE,
+    ) as progress:
+        task = progress.add_task("Training: starting", total=None)
+        while proc_train.poll() is None:
+            offset = _update_training_progress(progress, task, offset)
+            time.sleep(1)
+        _update_training_progress(progress, task, offset)
+
+
 def wait_for_login():
     logging.info("Running wait_for_login")
     # Extract environment variables from userData.json
@@ -463,7 +523,7 @@ By Gensyn
     )
     CONSOLE.print("Running training", style=INFO_COLOR)
     proc_train = train_blockassist(env=env)
-    proc_train.wait()
+    wait_for_training(proc_train)
 
     CONSOLE.print("Training complete", style=SUCCESS_COLOR)
 
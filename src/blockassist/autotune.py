@@ -0,0 +1,195 @@
+"""Picks CPU training settings for bc_human from the hardware it runs on.
+
+Modes:
+
+- ``off``: keep mbag's bc_human defaults.
+- ``heuristic``: derive the settings from core count and available RAM.
+- ``calibrate``: time a few short training runs around the heuristic and
+  keep the fastest. The winner is cached per host, so calibration only runs
+  once per machine.
+"""
+
+import dataclasses
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import psutil
+
+from blockassist.globals import get_hostname, get_logger
+
+_LOG = get_logger()
+
+AUTOTUNE_MODES = ("off", "heuristic", "calibrate")
+
+_CACHE_VERSION = 1
+
+# bc_human's sgd_minibatch_size.
+_DEFAULT_MINIBATCH_SIZE = 128
+
+# Each rollout worker holds its own copy of the model and input reader.
+_GB_PER_WORKER = 4
+
+
+@dataclass(frozen=True)
+class TrainSettings:
+    num_workers: int
+    torch_threads: int
+    sgd_minibatch_size: int
+    # None keeps bc_human's train_batch_size.
+    train_batch_size: int | None = None
+
+    def config_updates(self) -> dict:
+        updates = {
+            "num_workers": self.num_workers,
+            "sgd_minibatch_size": self.sgd_minibatch_size,
+        }
+        if self.train_batch_size is not None:
+            updates["train_batch_size"] = self.train_batch_size
+        return updates
+
+
+def probe_hardware() -> dict:
+    memory = psutil.virtual_memory()
+    return {
+        "physical_cores": psutil.cpu_count(logical=False) or os.cpu_count() or 1,
+        "logical_cores": psutil.cpu_count(logical=True) or os.cpu_count() or 1,
+        "total_ram_gb": round(memory.total / 1024**3, 1),
+        "available_ram_gb": round(memory.available / 1024**3, 1),
+    }
+
+
+def get_host_key(hardware: dict) -> str:
+    # Includes the hardware so a cached result does not outlive an upgrade.
+    return (
+        f"{get_hostname()}/{hardware['physical_cores']}c"
+        f"/{round(hardware['total_ram_gb'])}g"
+    )
+
+
+def heuristic_settings(hardware: dict) -> TrainSettings:
+    """Settings that fit the cores and RAM without calibration.
+
+    BC learns in the driver process, so torch gets one thread per physical
+    core; hyperthreads only slow its matrix kernels down. Rollout workers
+    only read the offline input in parallel, so they are added on machines
+    with cores and memory to spare.
+    """
+    cores = hardware["physical_cores"]
+    ram_gb = hardware["available_ram_gb"]
+    num_workers = 0
+    if cores >= 8:
+        num_workers = max(0, min((cores - 4) // 4, int(ram_gb // _GB_PER_WORKER) - 1))
+    minibatch_size = _DEFAULT_MINIBATCH_SIZE
+    if ram_gb < 4:
+        minibatch_size //= 2
+    return TrainSettings(
+        num_workers=num_workers,
+        torch_threads=max(1, cores),
+        sgd_minibatch_size=minibatch_size,
+    )
+
+
+def calibration_candidates(hardware: dict) -> list[TrainSettings]:
+    """The heuristic settings plus variations on threads, minibatch and workers."""
+    base = heuristic_settings(hardware)
+    candidates = [base]
+    if base.torch_threads > 1:
+        candidates.append(
+            dataclasses.replace(base, torch_threads=max(1, base.torch_threads // 2))
+        )
+    if hardware["available_ram_gb"] >= 8:
+        candidates.append(
+            dataclasses.replace(base, sgd_minibatch_size=base.sgd_minibatch_size * 2)
+        )
+    if base.num_workers > 0:
+        candidates.append(dataclasses.replace(base, num_workers=0))
+    return candidates
+
+
+class AutotuneCache:
+    """Calibrated settings per host, stored as JSON."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._hosts: dict[str, dict] = {}
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return
+        if data.get("version") == _CACHE_VERSION:
+            self._hosts = data.get("hosts", {})
+
+    def get(self, host_key: str) -> TrainSettings | None:
+        entry = self._hosts.get(host_key)
+        if entry is None:
+            return None
+        try:
+            return TrainSettings(**entry["settings"])
+        except (KeyError, TypeError):
+            return None
+
+    def set(self, host_key: str, settings: TrainSettings, samples_per_s: float) -> None:
+        self._hosts[host_key] = {
+            "settings": dataclasses.asdict(settings),
+            "samples_per_s": samples_per_s,
+        }
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"version": _CACHE_VERSION, "hosts": self._hosts}))
+        os.replace(tmp_path, self.path)
+
+
+def tune_train_settings(
+    mode: str,
+    cache_path: Path,
+    calibrate: Callable[[TrainSettings], float],
+) -> TrainSettings | None:
+    """
+    Returns the training settings for this machine according to mode.
+
+    Args:
+        mode: One of AUTOTUNE_MODES
+        cache_path: JSON file caching calibrated settings per host
+        calibrate: Runs a short training with the given settings and returns
+            its samples/sec. Only called in calibrate mode on a cache miss
+
+    Returns:
+        The settings, or None in off mode
+    """
+    if mode not in AUTOTUNE_MODES:
+        raise ValueError(f"Unknown autotune mode {mode!r}, expected one of {AUTOTUNE_MODES}")
+    if mode == "off":
+        return None
+
+    hardware = probe_hardware()
+    if mode == "heuristic":
+        settings = heuristic_settings(hardware)
+        _LOG.info(f"Using training settings {settings} for {hardware}")
+        return settings
+
+    cache = AutotuneCache(cache_path)
+    host_key = get_host_key(hardware)
+    cached = cache.get(host_key)
+    if cached is not None:
+        _LOG.info(f"Using calibrated training settings {cached} for {host_key}")
+        return cached
+
+    best, best_rate = None, 0.0
+    for candidate in calibration_candidates(hardware):
+        try:
+            rate = calibrate(candidate)
+        except Exception:
+            _LOG.exception(f"Calibration run with {candidate} failed")
+            continue
+        _LOG.info(f"Calibration run with {candidate}: {rate:.1f} samples/s")
+        if best is None or rate > best_rate:
+            best, best_rate = candidate, rate
+
+    if best is None:
+        _LOG.warning("Every calibration run failed, falling back to the heuristic")
+        return heuristic_settings(hardware)
+    cache.set(host_key, best, best_rate)
+    _LOG.info(f"Calibrated training settings for {host_key}: {best}")
+    return best
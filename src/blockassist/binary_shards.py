@@ -0,0 +1,328 @@
+"""Memory-mapped binary copies of the converted RLlib data.
+
+RLlib's JsonReader parses a line of JSON, and unpacks the LZ4/base64
+observations in it, for every episode chunk it reads on every training
+iteration. Here each JSON file written by the converter is turned once into a
+shard directory with one .npy file per column, the rows of all its records
+concatenated along the first axis. BinaryShardReader memory-maps those files
+and hands RLlib slices of them, so reading a batch decodes nothing and only
+pages in the rows it uses.
+
+Records keep the SEQ_LENS the converter wrote, so batches come out split into
+the same max_seq_len chunks as they do from the JSON files.
+"""
+
+import functools
+import json
+import math
+import os
+import pickle
+import random
+import shutil
+from pathlib import Path
+
+import numpy as np
+from ray.rllib.offline.input_reader import InputReader
+from ray.rllib.offline.io_context import IOContext
+from ray.rllib.offline.json_reader import from_json_data, postprocess_actions
+from ray.rllib.offline.shuffled_input import ShuffledInput
+from ray.rllib.policy.sample_batch import (
+    DEFAULT_POLICY_ID,
+    concat_samples,
+    convert_ma_batch_to_sample_batch,
+)
+from ray.rllib.utils.compression import unpack_if_needed
+from ray.tune.registry import register_input
+
+from blockassist.globals import get_logger
+
+_LOG = get_logger()
+
+BINARY_INPUT_NAME = "blockassist_binary_shards"
+SHARD_SUFFIX = ".shard"
+
+_SHARD_VERSION = 1
+_META_NAME = "meta.json"
+_OBJECTS_NAME = "objects.pkl"
+
+
+def _get_source(json_path: Path) -> dict:
+    # Cached shards are hard-linked into rllib/, so the stat survives relinking.
+    stat = json_path.stat()
+    return {"name": json_path.name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _read_meta(shard_path: Path) -> dict:
+    try:
+        return json.loads((shard_path / _META_NAME).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+class _ShardWriter:
+    """Collects the columns of one JSON file's records."""
+
+    def __init__(self):
+        self.columns: dict[str, list[np.ndarray]] = {}
+        self.objects: list = []
+
+    def add(self, key: str, value) -> dict:
+        value = unpack_if_needed(value)
+        try:
+            array = np.asarray(value)
+        except ValueError:
+            # Ragged lists.
+            array = None
+        if array is None or array.dtype == object or array.ndim == 0:
+            return self._add_object(value)
+
+        chunks = self.columns.setdefault(key, [])
+        if chunks:
+            first = chunks[0]
+            # Strings of different lengths still concatenate.
+            same_dtype = first.dtype == array.dtype or (
+                first.dtype.kind == array.dtype.kind == "U"
+            )
+            if first.shape[1:] != array.shape[1:] or not same_dtype:
+                return self._add_object(value)
+        start = sum(len(chunk) for chunk in chunks)
+        chunks.append(array)
+        return {"array": key, "start": start, "stop": start + len(array)}
+
+    def _add_object(self, value) -> dict:
+        # INFOS and anything else that is not a fixed-shape array.
+        self.objects.append(value)
+        return {"object": len(self.objects) - 1}
+
+    def add_record(self, record: dict) -> dict:
+        if record.get("type") == "MultiAgentBatch":
+            return {
+                "type": "MultiAgentBatch",
+                "count": record["count"],
+                "policy_batches": {
+                    policy_id: {
+                        column: self.add(f"{policy_id}/{column}", value)
+                        for column, value in policy_batch.items()
+                    }
+                    for policy_id, policy_batch in record["policy_batches"].items()
+                },
+            }
+        return {
+            "type": record.get("type", "SampleBatch"),
+            "columns": {
+                column: self.add(column, value)
+                for column, value in record.items()
+                if column != "type"
+            },
+        }
+
+    def save(self, shard_path: Path, records: list[dict], source: dict) -> None:
+        files = {}
+        for i, (key, chunks) in enumerate(self.columns.items()):
+            files[key] = f"column_{i}.npy"
+            np.save(shard_path / files[key], np.concatenate(chunks))
+        if self.objects:
+            with open(shard_path / _OBJECTS_NAME, "wb") as f:
+                pickle.dump(self.objects, f)
+        # Written last, so a shard without meta.json is never read.
+        (shard_path / _META_NAME).write_text(
+            json.dumps(
+                {
+                    "version": _SHARD_VERSION,
+                    "source": source,
+                    "files": files,
+                    "records": records,
+                }
+            )
+        )
+
+
+def write_shard(json_path: Path, shard_path: Path) -> int:
+    """Converts one RLlib JSON file into a shard directory; returns its record count."""
+    writer = _ShardWriter()
+    records = []
+    with open(json_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(writer.add_record(json.loads(line)))
+            except ValueError:
+                _LOG.warning(f"Skipping corrupt record in {json_path}")
+
+    tmp_path = shard_path.with_name(shard_path.name + ".tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+    writer.save(tmp_path, records, _get_source(json_path))
+    shutil.rmtree(shard_path, ignore_errors=True)
+    os.replace(tmp_path, shard_path)
+    return len(records)
+
+
+def write_binary_shards(json_dir: str, shard_dir: str) -> str:
+    """
+    Brings shard_dir up to date with the RLlib JSON files in json_dir.
+
+    Shards whose JSON file is unchanged since they were written are kept,
+    and shards of JSON files that are gone are removed.
+
+    Returns:
+        shard_dir
+    """
+    shard_root = Path(shard_dir)
+    shard_root.mkdir(parents=True, exist_ok=True)
+
+    wanted = set()
+    written = 0
+    for json_path in sorted(Path(json_dir).glob("*.json")):
+        shard_path = shard_root / (json_path.stem + SHARD_SUFFIX)
+        wanted.add(shard_path.name)
+        meta = _read_meta(shard_path)
+        source = _get_source(json_path)
+        if meta.get("version") == _SHARD_VERSION and meta.get("source") == source:
+            continue
+        write_shard(json_path, shard_path)
+        written += 1
+
+    for path in shard_root.iterdir():
+        if path.name not in wanted:
+            shutil.rmtree(path, ignore_errors=True)
+    _LOG.info(f"Wrote {written} binary shards, reused {len(wanted) - written}")
+    return shard_dir
+
+
+class _Shard:
+    """A written shard, its column files memory-mapped on first use."""
+
+    def __init__(self, shard_path: Path):
+        self.path = shard_path
+        meta = json.loads((shard_path / _META_NAME).read_text())
+        self.files = meta["files"]
+        self.records = meta["records"]
+        self._arrays: dict[str, np.ndarray] = {}
+        self._objects = None
+
+    def _get(self, spec: dict):
+        if "object" in spec:
+            if self._objects is None:
+                with open(self.path / _OBJECTS_NAME, "rb") as f:
+                    self._objects = pickle.load(f)
+            return self._objects[spec["object"]]
+        key = spec["array"]
+        if key not in self._arrays:
+            self._arrays[key] = np.load(self.path / self.files[key], mmap_mode="r")
+        # A plain view of the mapped rows; concat_samples copies them out.
+        return np.asarray(self._arrays[key][spec["start"] : spec["stop"]])
+
+    def get_record(self, index: int) -> dict:
+        """The record in the form from_json_data expects from a JSON line."""
+        record = self.records[index]
+        if record["type"] == "MultiAgentBatch":
+            return {
+                "type": "MultiAgentBatch",
+                "count": record["count"],
+                "policy_batches": {
+                    policy_id: {column: self._get(spec) for column, spec in columns.items()}
+                    for policy_id, columns in record["policy_batches"].items()
+                },
+            }
+        return {
+            "type": record["type"],
+            **{column: self._get(spec) for column, spec in record["columns"].items()},
+        }
+
+
+class BinaryShardReader(InputReader):
+    """Reads batches from a directory of binary shards, like RLlib's JsonReader.
+
+    The first shard read is chosen by worker index and the rest at random, and
+    each call to next() returns whole records until train_batch_size is reached.
+    """
+
+    def __init__(self, shard_dir: str, ioctx: IOContext | None = None):
+        self.ioctx = ioctx or IOContext()
+        self.default_policy = None
+        self.batch_size = self.ioctx.config.get("train_batch_size", 1)
+        num_workers = self.ioctx.config.get("num_workers", 0)
+        if num_workers:
+            self.batch_size = max(math.ceil(self.batch_size / num_workers), 1)
+        if self.ioctx.worker is not None:
+            self.default_policy = self.ioctx.worker.policy_map.get(DEFAULT_POLICY_ID)
+
+        self.shard_paths = sorted(Path(shard_dir).glob(f"*{SHARD_SUFFIX}"))
+        if not self.shard_paths:
+            raise ValueError(f"No binary shards found in {shard_dir}")
+        if self.ioctx.config.get("postprocess_inputs"):
+            self._check_single_policy()
+        self._shards: dict[Path, _Shard] = {}
+        self._shard = None
+        self._record_index = 0
+
+    def _check_single_policy(self) -> None:
+        # Like JsonReader, only batches of a single policy can be postprocessed.
+        for path in self.shard_paths:
+            for record in _read_meta(path).get("records", []):
+                policy_ids = sorted(record.get("policy_batches", {}))
+                if len(policy_ids) > 1:
+                    raise ValueError(
+                        "postprocess_inputs is not supported for multi-agent batches, "
+                        f"but {path} holds batches of policies {policy_ids}"
+                    )
+
+    def next(self):
+        batches = []
+        count = 0
+        while count < self.batch_size:
+            batch = self._postprocess_if_needed(self._next_record())
+            count += batch.count
+            batches.append(batch)
+        return concat_samples(batches)
+
+    def _next_record(self):
+        # Every shard may be tried once before giving up on empty shards.
+        for _ in range(len(self.shard_paths) + 1):
+            if self._shard is not None and self._record_index < len(self._shard.records):
+                record = self._shard.get_record(self._record_index)
+                self._record_index += 1
+                batch = from_json_data(record, self.ioctx.worker)
+                return postprocess_actions(batch, self.ioctx)
+            self._shard = self._next_shard()
+            self._record_index = 0
+        raise ValueError(f"No records found in {len(self.shard_paths)} binary shards")
+
+    def _next_shard(self) -> _Shard:
+        if self._shard is None and self.ioctx.worker is not None:
+            idx = self.ioctx.worker.worker_index
+            total = self.ioctx.worker.num_workers or 1
+            path = self.shard_paths[round((len(self.shard_paths) - 1) * (idx / total))]
+        else:
+            path = random.choice(self.shard_paths)
+        if path not in self._shards:
+            self._shards[path] = _Shard(path)
+        return self._shards[path]
+
+    def _postprocess_if_needed(self, batch):
+        # Same as JsonReader; batches of several policies were rejected in __init__.
+        if not self.ioctx.config.get("postprocess_inputs"):
+            return batch
+        batch = convert_ma_batch_to_sample_batch(batch)
+        return concat_samples(
+            [
+                self.default_policy.postprocess_trajectory(sub_batch)
+                for sub_batch in batch.split_by_episode()
+            ]
+        )
+
+
+def _create_reader(shard_dir: str, ioctx: IOContext) -> InputReader:
+    # Shuffled like the JsonReader RLlib creates for a path input.
+    return ShuffledInput(
+        BinaryShardReader(shard_dir, ioctx), ioctx.config.get("shuffle_buffer_size", 0)
+    )
+
+
+def register_binary_input(shard_dir: str) -> str:
+    """Registers a reader of shard_dir with RLlib and returns the input name to use."""
+    register_input(BINARY_INPUT_NAME, functools.partial(_create_reader, shard_dir))
+    return BINARY_INPUT_NAME
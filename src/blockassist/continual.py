@@ -0,0 +1,60 @@
+import json
+import os
+from pathlib import Path
+
+from blockassist.globals import get_logger
+
+_LOG = get_logger()
+
+_STATE_VERSION = 1
+CONTINUAL_STATE_NAME = "continual_training.json"
+
+
+class ContinualTrainingState:
+    """Persisted record of the last fine-tuned checkpoint per user.
+
+    For every identifier it keeps the final_checkpoint of the last training
+    run and the conversion cache keys of the episodes it was trained on, so
+    the next run can resume from that checkpoint and only train on episodes
+    added since.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._users: dict[str, dict] = {}
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return
+        if data.get("version") == _STATE_VERSION:
+            self._users = data.get("users", {})
+
+    def get_last_checkpoint(self, identifier: str) -> str | None:
+        """Returns the last final_checkpoint for identifier if it still exists."""
+        checkpoint = self._users.get(identifier, {}).get("final_checkpoint")
+        if checkpoint and not Path(checkpoint).exists():
+            _LOG.warning(
+                f"Last checkpoint {checkpoint} for {identifier} is gone, "
+                "training from the base weights"
+            )
+            return None
+        return checkpoint
+
+    def get_trained_episodes(self, identifier: str) -> set[str]:
+        """Returns the episodes the last checkpoint was trained on."""
+        if self.get_last_checkpoint(identifier) is None:
+            return set()
+        return set(self._users[identifier].get("trained_episodes", []))
+
+    def record(
+        self, identifier: str, final_checkpoint: str, trained_episodes: list[str]
+    ) -> None:
+        self._users[identifier] = {
+            "final_checkpoint": final_checkpoint,
+            "trained_episodes": sorted(trained_episodes),
+        }
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(
+            json.dumps({"version": _STATE_VERSION, "users": self._users})
+        )
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,285 @@
+"""Per-episode cache of RLlib conversions.
+
+Each episode is converted on its own into a shard directory under the cache,
+keyed by a hash of the episode's contents, its path relative to data_dir
+(which ends up in the converted batches) and the convert config. The shards
+of the current episodes are then hard-linked into the output directory that
+training reads, so only new or changed episodes are ever converted.
+
+Since every episode is converted independently, the missing ones can be
+converted in parallel across a process pool.
+"""
+
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Collection
+
+from blockassist.episode_store import EPISODE_META_NAME
+from blockassist.globals import get_logger
+from blockassist.manifest import hash_file
+
+_LOG = get_logger()
+
+_INDEX_NAME = "index.json"
+_SHARD_RESULT_NAME = "result.pkl"
+
+
+def _hash_episode(episode_path: Path) -> str:
+    # A stored episode is spread over the files of its directory.
+    if episode_path.name == EPISODE_META_NAME:
+        files = sorted(p for p in episode_path.parent.iterdir() if p.is_file())
+    else:
+        files = [episode_path]
+
+    sha = hashlib.sha256()
+    for file_path in files:
+        sha.update(file_path.name.encode())
+        sha.update(hash_file(file_path).encode())
+    return sha.hexdigest()
+
+
+class ConvertCache:
+    """Directory of converted shards, one per (episode, config) key."""
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._hashes: dict[str, dict] = {}
+        try:
+            self._hashes = json.loads((cache_dir / _INDEX_NAME).read_text())
+        except (OSError, ValueError):
+            pass
+
+    def _content_hash(self, episode_path: Path) -> str:
+        # Reuses the previous hash while the episode's size and mtime match.
+        stat = episode_path.stat()
+        cached = self._hashes.get(str(episode_path))
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+        sha256 = _hash_episode(episode_path)
+        self._hashes[str(episode_path)] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha256,
+        }
+        return sha256
+
+    def get_key(self, episode_path: Path, data_dir: Path, convert_config: dict) -> str:
+        key_data = {
+            "episode": episode_path.relative_to(data_dir).as_posix(),
+            "content": self._content_hash(episode_path),
+            "config": convert_config,
+        }
+        return hashlib.sha256(
+            json.dumps(key_data, sort_keys=True).encode()
+        ).hexdigest()
+
+    def shard_dir(self, key: str) -> Path:
+        return self.cache_dir / key
+
+    def has_shard(self, key: str) -> bool:
+        return (self.shard_dir(key) / _SHARD_RESULT_NAME).exists()
+
+    def load_shard_result(self, key: str) -> dict:
+        with open(self.shard_dir(key) / _SHARD_RESULT_NAME, "rb") as f:
+            return pickle.load(f)
+
+    def save_shard(self, key: str, tmp_dir: Path, result: dict) -> None:
+        """Moves a finished conversion in tmp_dir into the cache under key."""
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        with open(tmp_dir / _SHARD_RESULT_NAME, "wb") as f:
+            pickle.dump(result, f)
+        shutil.rmtree(self.shard_dir(key), ignore_errors=True)
+        os.replace(tmp_dir, self.shard_dir(key))
+
+    def prune(self, keep: set[str]) -> None:
+        """Drops shards and hashes of episodes that are no longer converted."""
+        for shard_dir in self.cache_dir.iterdir():
+            if shard_dir.is_dir() and shard_dir.name not in keep:
+                shutil.rmtree(shard_dir, ignore_errors=True)
+        self._hashes = {
+            path: entry for path, entry in self._hashes.items() if Path(path).exists()
+        }
+        self.save_index()
+
+    def save_index(self) -> None:
+        tmp_path = self.cache_dir / (_INDEX_NAME + ".tmp")
+        tmp_path.write_text(json.dumps(self._hashes))
+        os.replace(tmp_path, self.cache_dir / _INDEX_NAME)
+
+
+def link_shards(cache: ConvertCache, keys: list[str], out_dir: Path) -> None:
+    """Rebuilds out_dir from the JSON files of the given shards."""
+    shutil.rmtree(out_dir, ignore_errors=True)
+    out_dir.mkdir(parents=True)
+    for key in keys:
+        for json_path in sorted(cache.shard_dir(key).glob("*.json")):
+            # JsonWriter names files by timestamp, which can collide across shards.
+            dest = out_dir / f"{key[:16]}-{json_path.name}"
+            try:
+                os.link(json_path, dest)
+            except OSError:
+                shutil.copy2(json_path, dest)
+
+
+def _convert_shards(
+    cache: ConvertCache,
+    data_dir: str,
+    missing: list[tuple[Path, str]],
+    convert_episode: Callable[[str, str, str], dict],
+    max_workers: int,
+) -> dict | None:
+    """Converts each (episode_path, key) in missing into its cache shard.
+
+    Returns the result of the last conversion, or None if nothing was converted.
+    """
+    tmp_dirs = {}
+    for _, key in missing:
+        tmp_dirs[key] = cache.cache_dir / f"{key}.tmp"
+        shutil.rmtree(tmp_dirs[key], ignore_errors=True)
+
+    start_time = time.monotonic()
+    result = None
+    if max_workers <= 1 or len(missing) <= 1:
+        for episode_path, key in missing:
+            _LOG.info(f"Converting {episode_path}")
+            result = convert_episode(data_dir, str(episode_path), str(tmp_dirs[key]))
+            cache.save_shard(key, tmp_dirs[key], result)
+        return result
+
+    # spawn, since forking a process that already runs threads (asyncio, S3
+    # uploads, torch) can deadlock the children.
+    error = None
+    with ProcessPoolExecutor(
+        max_workers=min(max_workers, len(missing)),
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        futures = {
+            executor.submit(
+                convert_episode, data_dir, str(episode_path), str(tmp_dirs[key])
+            ): (episode_path, key)
+            for episode_path, key in missing
+        }
+        for future in as_completed(futures):
+            episode_path, key = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # Keep caching the other shards so a retry only redoes this one.
+                _LOG.exception(f"Failed to convert {episode_path}")
+                error = error or e
+                continue
+            cache.save_shard(key, tmp_dirs[key], result)
+            _LOG.info(
+                f"Converted {episode_path} "
+                f"({time.monotonic() - start_time:.1f}s since start)"
+            )
+    if error is not None:
+        raise error
+    return result
+
+
+def precompute_shards(
+    data_dir: str,
+    episode_paths: list[Path],
+    cache_dir: str,
+    convert_config: dict,
+    convert_episode: Callable[[str, str, str], dict],
+) -> list[str]:
+    """
+    Converts episode_paths into the cache ahead of convert_episodes_cached.
+
+    Nothing is pruned and no out_dir is written, so this can run for each
+    episode as soon as it is recorded.
+
+    Returns:
+        The cache keys of episode_paths
+    """
+    data_path = Path(data_dir)
+    cache = ConvertCache(Path(cache_dir))
+    keys = [cache.get_key(p, data_path, convert_config) for p in episode_paths]
+    cache.save_index()
+    missing = [
+        (episode_path, key)
+        for episode_path, key in zip(episode_paths, keys)
+        if not cache.has_shard(key)
+    ]
+    _convert_shards(cache, str(data_path), missing, convert_episode, max_workers=1)
+    return keys
+
+
+def convert_episodes_cached(
+    data_dir: str,
+    data_glob: str,
+    out_dir: str,
+    cache_dir: str,
+    convert_config: dict,
+    convert_episode: Callable[[str, str, str], dict],
+    max_workers: int = 1,
+    exclude_keys: Collection[str] = (),
+) -> dict:
+    """
+    Converts the episodes matching data_glob, reusing cached shards.
+
+    Args:
+        data_dir: Root the episode paths are taken relative to
+        data_glob: Recursive glob of the episode files to convert
+        out_dir: Directory the combined RLlib JSON files are written to
+        cache_dir: Directory holding the converted shards
+        convert_config: Convert settings that affect the output; part of the key
+        convert_episode: Called as convert_episode(data_dir, episode_fname,
+            shard_out_dir) to convert a single episode. Returns the converter
+            result, which must include "mbag_config". Must be picklable
+            when max_workers > 1
+        max_workers: Number of processes converting episodes in parallel
+        exclude_keys: Keys of episodes to leave out of out_dir, e.g. ones a
+            model was already trained on
+
+    Returns:
+        The converter result with out_dir and session_count set, plus
+        episode_keys, the keys of every matched episode. mbag_config is
+        missing if every episode was excluded and none was ever converted
+    """
+    data_path = Path(data_dir)
+    episode_paths = sorted(Path(p) for p in glob.glob(data_glob, recursive=True))
+    if not episode_paths:
+        raise FileNotFoundError(f"No episode files found matching {data_glob}.")
+
+    cache = ConvertCache(Path(cache_dir))
+    keys = [cache.get_key(p, data_path, convert_config) for p in episode_paths]
+
+    selected = [
+        (episode_path, key)
+        for episode_path, key in zip(episode_paths, keys)
+        if key not in exclude_keys
+    ]
+    missing = [(path, key) for path, key in selected if not cache.has_shard(key)]
+    reused = len(selected) - len(missing)
+    result = _convert_shards(
+        cache, str(data_path), missing, convert_episode, max_workers
+    )
+    if result is None:
+        cached_keys = [key for key in keys if cache.has_shard(key)]
+        result = cache.load_shard_result(cached_keys[-1]) if cached_keys else {}
+
+    # Excluded shards stay cached, they are just not part of this output.
+    cache.prune(set(keys))
+    link_shards(cache, [key for _, key in selected], Path(out_dir))
+    _LOG.info(
+        f"Converted {len(selected)} episodes into {out_dir} "
+        f"({reused} reused from the cache, {len(keys) - len(selected)} excluded)"
+    )
+    return {
+        **result,
+        "out_dir": out_dir,
+        "session_count": len(selected),
+        "episode_keys": keys,
+    }
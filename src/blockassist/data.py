@@ -1,13 +1,28 @@
 import shutil
+import threading
 import time
 import zipfile
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable
 
-from blockassist.distributed.s3 import upload_zip_to_s3
+from blockassist.distributed.s3 import S3MultipartWriter, upload_zip_to_s3
 from blockassist.globals import get_logger
+from blockassist.linking import link_copytree
+from blockassist.manifest import UploadManifest, get_upload_name
+from blockassist.readiness import (
+    AbandonedRunError,
+    get_abandoned_run_dirs,
+    is_evaluate_dir_ready,
+    wait_for_evaluate_dir,
+)
+from blockassist.sessions import SessionIndex
 
 _LOG = get_logger()
 
+_UPLOAD_MANIFEST_NAME = "upload_manifest.json"
+
 ## Evaluate data utilities.
 
 
@@ -32,54 +47,270 @@ def check_checkpoint_dir(checkpoint_dir):
     return checkpoint_path
 
 
-def backup_evaluate_dirs(checkpoint_dir: str) -> None:
+def _run_timed(
+    action: str, fn: Callable[[Path], None], paths: list[Path], max_workers: int
+) -> dict[Path, float]:
+    """Applies fn to every path on a thread pool and logs how long each took."""
+
+    def timed(path: Path) -> float:
+        start = time.perf_counter()
+        fn(path)
+        elapsed = time.perf_counter() - start
+        _LOG.info(f"{action} {path} took {elapsed:.3f}s")
+        return elapsed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max(1, max_workers), thread_name_prefix="fs") as pool:
+        timings = dict(zip(paths, pool.map(timed, paths)))
+    if paths:
+        _LOG.info(
+            f"{action} {len(paths)} paths took {time.perf_counter() - start:.3f}s "
+            f"({max_workers} workers)"
+        )
+    return timings
+
+
+def _copy_evaluate_dir(src: Path, dst: Path, copy_strategy: str) -> None:
+    if copy_strategy == "copy":
+        shutil.copytree(src, dst)
+    elif copy_strategy == "link":
+        stats = link_copytree(src, dst)
+        _LOG.info(f"Copied {src} to {dst} ({dict(stats)})")
+    else:
+        raise ValueError(f"Unknown copy strategy: {copy_strategy}")
+
+
+def backup_evaluate_dirs(
+    checkpoint_dir: str, copy_strategy: str = "link", max_workers: int = 1
+) -> dict[Path, float]:
+    """
+    Backs up evaluate directories to <checkpoint_dir>/evaluate.
+
+    Args:
+        checkpoint_dir: Checkpoint directory containing evaluate_ directories
+        copy_strategy: "link" reflinks files, or hard-links those of finished
+            runs, and only deep-copies as a fallback. "copy" always deep-copies
+        max_workers: Number of directories backed up concurrently
+
+    Returns:
+        Seconds spent backing up each directory
+    """
     checkpoint_path = check_checkpoint_dir(checkpoint_dir)
-    for d in get_all_evaluate_dirs(checkpoint_path):
-        evaluate_dir = checkpoint_path / "evaluate"
-        backup_path = evaluate_dir / d.name
-        if not backup_path.exists():
-            _LOG.info(f"Backing up {d} to {backup_path}")
-            shutil.copytree(d, backup_path)
+    backup_dir = checkpoint_path / "evaluate"
 
+    def backup(d: Path) -> None:
+        _LOG.info(f"Backing up {d} to {backup_dir / d.name}")
+        _copy_evaluate_dir(d, backup_dir / d.name, copy_strategy)
 
-def delete_evaluate_dirs(checkpoint_dir: str) -> None:
+    to_backup = [
+        d
+        for d in get_all_evaluate_dirs(checkpoint_path)
+        if not (backup_dir / d.name).exists()
+    ]
+    return _run_timed("Backing up", backup, to_backup, max_workers)
+
+
+def delete_evaluate_dirs(checkpoint_dir: str, max_workers: int = 1) -> dict[Path, float]:
     checkpoint_path = check_checkpoint_dir(checkpoint_dir)
     evaluate_dirs = get_all_evaluate_dirs(checkpoint_path)
-    for d in evaluate_dirs:
+
+    def delete(d: Path) -> None:
         _LOG.info(f"Deleting evaluation directory: {d}")
         shutil.rmtree(d)
 
+    return _run_timed("Deleting", delete, evaluate_dirs, max_workers)
+
 
-def delete_evaluate_zips(checkpoint_dir: str) -> None:
+def delete_evaluate_zips(checkpoint_dir: str, max_workers: int = 1) -> dict[Path, float]:
     checkpoint_path = check_checkpoint_dir(checkpoint_dir)
     evaluate_zips_dir = checkpoint_path / "evaluate_zips"
     if not evaluate_zips_dir.exists():
         _LOG.info(f"No evaluate_zips directory found at {evaluate_zips_dir}")
-        return
+        return {}
 
-    for zip_file in evaluate_zips_dir.glob("*.zip"):
+    def delete(zip_file: Path) -> None:
         _LOG.info(f"Deleting zip file: {zip_file}")
         zip_file.unlink()
 
+    return _run_timed(
+        "Deleting", delete, list(evaluate_zips_dir.glob("*.zip")), max_workers
+    )
 
-def restore_evaluate_dirs_from_backup(checkpoint_dir: str) -> None:
+
+def restore_evaluate_dirs_from_backup(
+    checkpoint_dir: str, copy_strategy: str = "link", max_workers: int = 1
+) -> dict[Path, float]:
     checkpoint_path = check_checkpoint_dir(checkpoint_dir)
     backup_dir = checkpoint_path / "evaluate"
     if not backup_dir.exists():
         raise FileNotFoundError(f"No backup directory found: {backup_dir}")
 
-    for d in backup_dir.iterdir():
-        dest = checkpoint_path / d.name
-        if not dest.exists() and d.is_dir():
-            _LOG.info(f"Restoring evaluation directory from backup: {d}")
-            shutil.copytree(d, dest)
+    def restore(d: Path) -> None:
+        _LOG.info(f"Restoring evaluation directory from backup: {d}")
+        _copy_evaluate_dir(d, checkpoint_path / d.name, copy_strategy)
+
+    to_restore = [
+        d
+        for d in backup_dir.iterdir()
+        if not (checkpoint_path / d.name).exists() and d.is_dir()
+    ]
+    return _run_timed("Restoring", restore, to_restore, max_workers)
+
+
+def _get_s3_key(identifier: str, evaluate_dir: Path) -> str:
+    return f"{identifier}/{get_upload_name(evaluate_dir)}.zip"
+
+
+# Formats that are already compressed; DEFLATE-ing them again costs CPU for
+# next to no size gain.
+_STORED_SUFFIXES = {
+    ".zip", ".gz", ".bz2", ".xz", ".zst", ".npz", ".png", ".jpg", ".jpeg", ".mp4"
+}
+_DEFLATED_SUFFIXES = {".json", ".txt", ".log", ".csv", ".yaml", ".yml"}
+_ENTROPY_SAMPLE_BYTES = 64 * 1024
+_MIN_DEFLATE_RATIO = 0.9
+
+
+def get_compress_type(file_path: Path) -> int:
+    """Picks ZIP_STORED for already-compressed or high-entropy files, else ZIP_DEFLATED."""
+    suffix = file_path.suffix.lower()
+    if suffix in _STORED_SUFFIXES:
+        return zipfile.ZIP_STORED
+    if suffix in _DEFLATED_SUFFIXES:
+        return zipfile.ZIP_DEFLATED
+
+    # Unknown format: sniff a sample and store it if a fast DEFLATE barely shrinks it.
+    with open(file_path, "rb") as f:
+        sample = f.read(_ENTROPY_SAMPLE_BYTES)
+    if sample and len(zlib.compress(sample, 1)) > _MIN_DEFLATE_RATIO * len(sample):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def _write_evaluate_zip(
+    evaluate_dir: Path, file, compresslevel: int | None
+) -> tuple[dict[int, int], dict[int, float]]:
+    """Zips evaluate_dir into file; returns raw bytes and seconds per compress type."""
+    raw_bytes = {zipfile.ZIP_STORED: 0, zipfile.ZIP_DEFLATED: 0}
+    seconds = {zipfile.ZIP_STORED: 0.0, zipfile.ZIP_DEFLATED: 0.0}
+    with zipfile.ZipFile(
+        file, "w", zipfile.ZIP_DEFLATED, compresslevel=compresslevel
+    ) as zipf:
+        for file_path in evaluate_dir.rglob("*"):
+            if file_path.is_file():
+                # Calculate relative path for the zip
+                arcname = file_path.relative_to(evaluate_dir)
+                compress_type = get_compress_type(file_path)
+                start = time.perf_counter()
+                zipf.write(file_path, arcname, compress_type=compress_type)
+                seconds[compress_type] += time.perf_counter() - start
+                raw_bytes[compress_type] += file_path.stat().st_size
+    return raw_bytes, seconds
+
+
+def _log_zip_stats(
+    target: str, zip_size: int, raw_bytes: dict[int, int], seconds: dict[int, float]
+) -> None:
+    saved_bytes = sum(raw_bytes.values()) - zip_size
+    stored_bytes = raw_bytes[zipfile.ZIP_STORED]
+
+    # Estimate what DEFLATE-ing the stored files would have cost from the
+    # throughput measured on the files that were deflated.
+    saved_seconds = 0.0
+    if raw_bytes[zipfile.ZIP_DEFLATED] and seconds[zipfile.ZIP_DEFLATED]:
+        deflate_rate = raw_bytes[zipfile.ZIP_DEFLATED] / seconds[zipfile.ZIP_DEFLATED]
+        saved_seconds = max(
+            0.0, stored_bytes / deflate_rate - seconds[zipfile.ZIP_STORED]
+        )
+
+    _LOG.info(
+        f"Created zip file: {target} (size: {zip_size / 1024 / 1024:.2f} MB, "
+        f"saved {saved_bytes / 1024 / 1024:.2f} MB by compression, "
+        f"stored {stored_bytes / 1024 / 1024:.2f} MB without recompression, "
+        f"~{saved_seconds:.2f}s saved, took {sum(seconds.values()):.2f}s)"
+    )
+
+
+def _zip_evaluate_dir(
+    evaluate_dir: Path, checkpoint_path: Path, compresslevel: int | None = None
+) -> Path:
+    wait_for_evaluate_dir(evaluate_dir)
+    _LOG.info(f"Processing evaluation directory: {evaluate_dir}")
+
+    # Create zip file of the directory
+    zip_path = checkpoint_path / "evaluate_zips" / f"{get_upload_name(evaluate_dir)}.zip"
+    zip_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Remove existing zip if it exists
+    if zip_path.exists():
+        zip_path.unlink()
+
+    raw_bytes, seconds = _write_evaluate_zip(evaluate_dir, zip_path, compresslevel)
+    _log_zip_stats(str(zip_path), zip_path.stat().st_size, raw_bytes, seconds)
+    return zip_path
+
+
+def _stream_evaluate_dir_to_s3(
+    evaluate_dir: Path, bucket_name: str, s3_key: str, compresslevel: int | None
+) -> str:
+    wait_for_evaluate_dir(evaluate_dir)
+    _LOG.info(f"Streaming evaluation directory to S3: {evaluate_dir}")
+
+    with S3MultipartWriter(bucket_name, s3_key) as writer:
+        raw_bytes, seconds = _write_evaluate_zip(evaluate_dir, writer, compresslevel)
+        zip_size = writer.tell()
+
+    _log_zip_stats(writer.s3_uri, zip_size, raw_bytes, seconds)
+    return writer.s3_uri
+
+
+def _zip_and_upload_pipelined(
+    checkpoint_path: Path,
+    evaluate_dirs: list[Path],
+    upload: Callable[[Path, Path], str],
+    max_workers: int,
+    max_pending_zips: int,
+    compresslevel: int | None,
+) -> list[str]:
+    # Each slot covers one archive from the start of compression until its
+    # upload finishes, so at most max_pending_zips archives sit on disk at once.
+    slots = threading.BoundedSemaphore(max_pending_zips)
+
+    def upload_and_release(evaluate_dir: Path, zip_path: Path) -> str:
+        try:
+            return upload(evaluate_dir, zip_path)
+        finally:
+            slots.release()
+
+    def zip_then_queue_upload(evaluate_dir: Path) -> Future:
+        try:
+            zip_path = _zip_evaluate_dir(evaluate_dir, checkpoint_path, compresslevel)
+        except BaseException:
+            slots.release()
+            raise
+        return upload_pool.submit(upload_and_release, evaluate_dir, zip_path)
+
+    # The zip pool is shut down first so it never submits to a closed upload pool.
+    with ThreadPoolExecutor(max_workers, thread_name_prefix="upload") as upload_pool, \
+         ThreadPoolExecutor(max_workers, thread_name_prefix="zip") as zip_pool:
+        zip_futures = []
+        for evaluate_dir in evaluate_dirs:
+            slots.acquire()
+            zip_futures.append(zip_pool.submit(zip_then_queue_upload, evaluate_dir))
+
+        return [f.result().result() for f in zip_futures]
 
 
 def zip_and_upload_episodes(
     identifier: str,
     checkpoint_dir: str,
     bucket_name: str,
-    evaluate_dirs: list[Path]
+    evaluate_dirs: list[Path],
+    max_workers: int = 1,
+    max_pending_zips: int | None = None,
+    compresslevel: int | None = None,
+    skip_unchanged: bool = True,
+    stream_to_s3: bool = False,
 ) -> list[str]:
     """
     Zip specific episode directories and upload them to S3.
@@ -89,62 +320,128 @@ def zip_and_upload_episodes(
         checkpoint_dir: Checkpoint directory containing evaluate_ directories
         bucket_name: S3 bucket name for upload
         evaluate_dirs: List of specific evaluate directory paths to process
+        max_workers: Number of directories compressed (and archives uploaded)
+            concurrently. With 1, directories are processed serially
+        max_pending_zips: Maximum number of archives that are being compressed
+            or waiting for upload at once. Defaults to twice max_workers
+        compresslevel: DEFLATE level (1-9) for compressible files. Lower is
+            faster. Already-compressed files are always stored as-is
+        skip_unchanged: Skip directories whose files match the ones recorded in
+            the local upload manifest for the same S3 key
+        stream_to_s3: Stream each zip straight into a multipart upload instead
+            of writing it under evaluate_zips first. A directory whose stream
+            fails is zipped to disk and uploaded from the file instead
 
     Returns:
-        List of uploaded zip file S3 URIs
+        List of zip file S3 URIs, in the order of evaluate_dirs. Skipped
+        directories report the URI of their earlier upload. Directories with
+        a run that will never finish are left out
+
+    Raises:
+        AbandonedRunError: If a run is abandoned while its directory is
+            being waited for
     """
     checkpoint_path = check_checkpoint_dir(checkpoint_dir)
 
     if not evaluate_dirs:
         raise ValueError("No evaluation directories provided")
 
-    s3_uris = []
+    manifest = None
+    if skip_unchanged:
+        manifest = UploadManifest(
+            checkpoint_path / "evaluate_zips" / _UPLOAD_MANIFEST_NAME
+        )
+
+    s3_uris: dict[Path, str] = {}
+    dir_files: dict[Path, dict] = {}
+    pending_dirs = []
     for evaluate_dir in evaluate_dirs:
-        # Wait for the directory to be fully created (race condition fix)
-        max_wait_seconds = 180
-        wait_interval = 0.5
-        waited = 0
-        
-        while not evaluate_dir.exists() and waited < max_wait_seconds:
-            _LOG.info(f"Waiting for evaluation directory to be created: {evaluate_dir} (waited {waited:.1f}s/{max_wait_seconds}s)")
-            time.sleep(wait_interval)
-            waited += wait_interval
-        
-        if not evaluate_dir.exists():
-            raise FileNotFoundError(f"Evaluation directory does not exist after waiting {max_wait_seconds}s: {evaluate_dir}")
-        
-        _LOG.info(f"Processing evaluation directory: {evaluate_dir}")
-
-        # Create zip file of the directory
-        zip_filename = f"{evaluate_dir.name}.zip"
-        zip_path = checkpoint_path / "evaluate_zips" / zip_filename
-        zip_path.parent.mkdir(parents=True, exist_ok=True)
-
-        # Remove existing zip if it exists
-        if zip_path.exists():
-            zip_path.unlink()
-
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for file_path in evaluate_dir.rglob("*"):
-                if file_path.is_file():
-                    # Calculate relative path for the zip
-                    arcname = file_path.relative_to(evaluate_dir)
-                    zipf.write(file_path, arcname)
-
-        zip_size_mb = zip_path.stat().st_size / 1024 / 1024
-        _LOG.info(f"Created zip file: {zip_path} (size: {zip_size_mb:.2f} MB)")
-
-        # Upload to S3
-        s3_uri = upload_zip_to_s3(
-            str(zip_path), bucket_name, f"{identifier}/{zip_filename}"
+        # A crashed or incomplete session may have a partial episodes.zip.
+        abandoned = get_abandoned_run_dirs(evaluate_dir)
+        if abandoned:
+            reasons = ", ".join(f"run {d.name} {reason}" for d, reason in abandoned.items())
+            _LOG.warning(f"Skipping incomplete evaluation directory {evaluate_dir}: {reasons}")
+            continue
+        # Directories still being written are waited for while zipping.
+        if manifest and is_evaluate_dir_ready(evaluate_dir):
+            files = manifest.hash_files(evaluate_dir)
+            s3_uri = manifest.get_uploaded_uri(
+                evaluate_dir, bucket_name, _get_s3_key(identifier, evaluate_dir), files
+            )
+            if s3_uri:
+                _LOG.info(f"Skipping unchanged evaluation directory: {evaluate_dir}")
+                s3_uris[evaluate_dir] = s3_uri
+                continue
+            dir_files[evaluate_dir] = files
+        pending_dirs.append(evaluate_dir)
+
+    def record(evaluate_dir: Path, s3_key: str, s3_uri: str) -> None:
+        if manifest:
+            files = dir_files.get(evaluate_dir) or manifest.hash_files(evaluate_dir)
+            manifest.record_upload(evaluate_dir, bucket_name, s3_key, s3_uri, files)
+
+    def upload(evaluate_dir: Path, zip_path: Path) -> str:
+        s3_key = _get_s3_key(identifier, evaluate_dir)
+        s3_uri = upload_zip_to_s3(str(zip_path), bucket_name, s3_key)
+        record(evaluate_dir, s3_key, s3_uri)
+        return s3_uri
+
+    def stream_upload(evaluate_dir: Path) -> str:
+        s3_key = _get_s3_key(identifier, evaluate_dir)
+        try:
+            s3_uri = _stream_evaluate_dir_to_s3(
+                evaluate_dir, bucket_name, s3_key, compresslevel
+            )
+        except (FileNotFoundError, AbandonedRunError):
+            raise
+        except Exception as e:
+            _LOG.warning(
+                f"Streaming upload of {evaluate_dir} failed, retrying from a zip file: {e}"
+            )
+            zip_path = _zip_evaluate_dir(evaluate_dir, checkpoint_path, compresslevel)
+            return upload(evaluate_dir, zip_path)
+        record(evaluate_dir, s3_key, s3_uri)
+        return s3_uri
+
+    if stream_to_s3:
+        # Each worker only holds one part in memory, so no extra backpressure is needed.
+        with ThreadPoolExecutor(max_workers, thread_name_prefix="stream") as pool:
+            uploaded = list(pool.map(stream_upload, pending_dirs))
+    elif max_workers > 1:
+        uploaded = _zip_and_upload_pipelined(
+            checkpoint_path,
+            pending_dirs,
+            upload,
+            max_workers,
+            max_pending_zips or 2 * max_workers,
+            compresslevel,
         )
-        s3_uris.append(s3_uri)
+    else:
+        uploaded = []
+        for evaluate_dir in pending_dirs:
+            zip_path = _zip_evaluate_dir(evaluate_dir, checkpoint_path, compresslevel)
 
-    return s3_uris
+            # Upload to S3
+            uploaded.append(upload(evaluate_dir, zip_path))
+
+    s3_uris.update(zip(pending_dirs, uploaded))
+    _LOG.info(
+        f"Uploaded {len(pending_dirs)} evaluation directories, "
+        f"skipped {len(s3_uris) - len(pending_dirs)} unchanged and "
+        f"{len(evaluate_dirs) - len(s3_uris)} incomplete"
+    )
+    return [s3_uris[d] for d in evaluate_dirs if d in s3_uris]
 
 
 def zip_and_upload_all_episodes(
-    identifier: str, checkpoint_dir: str, bucket_name: str
+    identifier: str,
+    checkpoint_dir: str,
+    bucket_name: str,
+    max_workers: int = 1,
+    max_pending_zips: int | None = None,
+    compresslevel: int | None = None,
+    skip_unchanged: bool = True,
+    stream_to_s3: bool = False,
 ) -> list[str]:
     checkpoint_path = check_checkpoint_dir(checkpoint_dir)
 
@@ -155,31 +452,28 @@ def zip_and_upload_all_episodes(
             f"No timestamped evaluation directories found in {checkpoint_path}"
         )
 
-    return zip_and_upload_episodes(identifier, checkpoint_dir, bucket_name, evaluate_dirs)
-
-
-def get_total_episodes(checkpoint_dir: str) -> int:
+    return zip_and_upload_episodes(
+        identifier,
+        checkpoint_dir,
+        bucket_name,
+        evaluate_dirs,
+        max_workers=max_workers,
+        max_pending_zips=max_pending_zips,
+        compresslevel=compresslevel,
+        skip_unchanged=skip_unchanged,
+        stream_to_s3=stream_to_s3,
+    )
+
+
+def get_session_index(checkpoint_dir: str) -> SessionIndex:
+    """Returns the up-to-date session index, rescanning only changed directories."""
     checkpoint_path = check_checkpoint_dir(checkpoint_dir)
+    return SessionIndex(checkpoint_path).refresh(get_all_evaluate_dirs(checkpoint_path))
 
-    episode_counts = []
-    evaluate_dirs = get_all_evaluate_dirs(checkpoint_path)
-    for evaluate_dir in evaluate_dirs:
-        # Count valid episode directories as sessions.
-        session_count = 0
-        try:
-            for item in evaluate_dir.iterdir():
-                if not (item.is_dir() and item.name.isdigit()):
-                    # Not a valid run directory.
-                    continue
 
-                required_files = ['config.json', 'episodes.zip', 'metrics.json', 'run.json']
-                if all((item / file).exists() for file in required_files):
-                    session_count += 1
-
-        except (OSError, PermissionError) as e:
-            _LOG.warning(f"Could not access evaluate directory {evaluate_dir}: {e}")
-
-        episode_counts.append(session_count)
-        _LOG.debug(f"Found {session_count} sessions in {evaluate_dir.name}")
+def get_total_episodes(checkpoint_dir: str) -> int:
+    session_index = get_session_index(checkpoint_dir)
+    for name, session_count in session_index.sessions_per_evaluate_dir().items():
+        _LOG.debug(f"Found {session_count} sessions in {name}")
 
-    return sum(episode_counts)
+    return session_index.total_sessions()
@@ -1,14 +1,95 @@
-import io
 import json
+import os
 from pathlib import Path
 
-from huggingface_hub import HfApi
+from huggingface_hub import CommitOperationAdd, HfApi
+from huggingface_hub.hf_api import RepoFile
 
 from blockassist import telemetry
 from blockassist.globals import get_identifier, get_logger
+from blockassist.manifest import hash_file
 
 _LOG = get_logger()
 
+_UPLOAD_RECORD_VERSION = 1
+
+
+class HfUploadRecord:
+    """Local record of the model files last uploaded to each HuggingFace repo.
+
+    For every repo, the record keeps the SHA-256 of each uploaded file and
+    the blob ID HuggingFace stored it under. A file is unchanged if its hash
+    still matches and the repo still holds that blob.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._repos: dict[str, dict] = {}
+        if path.exists():
+            try:
+                data = json.loads(path.read_text())
+                if data.get("version") == _UPLOAD_RECORD_VERSION:
+                    self._repos = data["repos"]
+            except (OSError, ValueError, KeyError) as e:
+                _LOG.warning(f"Ignoring unreadable HuggingFace upload record {path}: {e}")
+
+    def get_files(self, repo_id: str) -> dict[str, dict]:
+        """Returns {path in repo: {"sha256", "blob_id"}} of the last upload."""
+        return self._repos.get(repo_id, {}).get("files", {})
+
+    def record_upload(self, repo_id: str, commit: str, files: dict[str, dict]) -> None:
+        self._repos[repo_id] = {"commit": commit, "files": files}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(
+            json.dumps({"version": _UPLOAD_RECORD_VERSION, "repos": self._repos})
+        )
+        os.replace(tmp_path, self.path)
+
+
+def _list_remote_files(
+    api: HfApi, repo_id: str, revision: str | None = None
+) -> dict[str, RepoFile]:
+    return {
+        entry.path: entry
+        for entry in api.list_repo_tree(
+            repo_id, recursive=True, repo_type="model", revision=revision
+        )
+        if isinstance(entry, RepoFile)
+    }
+
+
+def _is_unchanged(sha256: str, remote: RepoFile | None, recorded: dict | None) -> bool:
+    if remote is None:
+        return False
+    # LFS files carry their SHA-256, so they can be compared without a record.
+    if remote.lfs is not None and remote.lfs.sha256 == sha256:
+        return True
+    return recorded == {"sha256": sha256, "blob_id": remote.blob_id}
+
+
+def _record_upload(
+    api: HfApi,
+    record: HfUploadRecord,
+    repo_id: str,
+    commit: str,
+    local_hashes: dict[str, str],
+) -> None:
+    # Blob IDs are only known once HuggingFace has stored the files.
+    try:
+        remote_files = _list_remote_files(api, repo_id, revision=commit)
+        record.record_upload(
+            repo_id,
+            commit,
+            {
+                path: {"sha256": sha256, "blob_id": remote_files[path].blob_id}
+                for path, sha256 in local_hashes.items()
+                if path in remote_files
+            },
+        )
+    except Exception as e:
+        _LOG.warning(f"Could not record upload to {repo_id} in {record.path}: {e}")
+
 
 def _create_readme(model_path: Path, user_id: str | None = None) -> None:
     readme_path = model_path / "README.md"
@@ -46,8 +127,12 @@ def upload_to_huggingface(
     hf_token: str | None = None,
     chain_metadata_dict: dict | None = None,
     address_eoa: str | None = None,
+    record_path: Path | None = None,
 ) -> str:
     """Uploads the model directory to HuggingFace.
+
+    Files that the repo already holds are skipped, and the changed files are
+    pushed in one commit together with the metadata.
     Args:
         model_path (Path): Path to the model directory.
         user_id (str): Identifier for the user (e.g., address).
@@ -55,6 +140,8 @@ def upload_to_huggingface(
         hf_token (str | None): HuggingFace authentication token.
         chain_metadata_dict (dict | None): Optional metadata dictionary to upload.
         address_eoa (str | None): Optional EOA address for additional context.
+        record_path (Path | None): Optional HfUploadRecord file; without one,
+            only LFS files are compared with the repo.
     Returns:
         str: The git reference of the uploaded model.
     Raises:
@@ -68,24 +155,56 @@ def upload_to_huggingface(
         _create_readme(model_path, user_id=user_id)
         api = HfApi(token=hf_token)
         api.create_repo(repo_id=repo_id, repo_type="model", exist_ok=True)
-        api.upload_folder(repo_id=repo_id, repo_type="model", folder_path=model_path)
-        ret = None
 
+        local_hashes = {
+            f.relative_to(model_path).as_posix(): hash_file(f)
+            for f in sorted(model_path.rglob("*"))
+            if f.is_file()
+        }
+        record = HfUploadRecord(record_path) if record_path else None
+        recorded = record.get_files(repo_id) if record else {}
+        try:
+            remote_files = _list_remote_files(api, repo_id)
+        except Exception as e:
+            _LOG.warning(f"Could not list files of {repo_id}, uploading all of them: {e}")
+            remote_files = {}
+        changed = [
+            path
+            for path, sha256 in local_hashes.items()
+            if not _is_unchanged(sha256, remote_files.get(path), recorded.get(path))
+        ]
+
+        operations = [
+            CommitOperationAdd(path_in_repo=path, path_or_fileobj=model_path / path)
+            for path in changed
+        ]
         if chain_metadata_dict:
             metadata_json = json.dumps(chain_metadata_dict, indent=2)
-            metadata_bytes = io.BytesIO(metadata_json.encode("utf-8"))
-            ret = api.upload_file(
-                path_or_fileobj=metadata_bytes,
-                path_in_repo="gensyn.json",
+            operations.append(
+                CommitOperationAdd(
+                    path_in_repo="gensyn.json",
+                    path_or_fileobj=metadata_json.encode("utf-8"),
+                )
+            )
+
+        ret = None
+        if operations:
+            ret = api.create_commit(
                 repo_id=repo_id,
                 repo_type="model",
+                operations=operations,
+                commit_message=f"Upload model ({len(changed)} changed files)",
             )
-            _LOG.info("Uploaded metadata dictionary")
+        if record and ret:
+            _record_upload(api, record, repo_id, ret.oid, local_hashes)
 
         # Calculate total size
         total_size = sum(f.stat().st_size for f in model_path.rglob("*") if f.is_file())
+        uploaded_size = sum((model_path / path).stat().st_size for path in changed)
         _LOG.info(
-            f"Successfully uploaded model to HuggingFace: {repo_id} with size {total_size / 1024 / 1024:.2f} MB ({ret.oid})"
+            f"Successfully uploaded model to HuggingFace: {repo_id} with size {total_size / 1024 / 1024:.2f} MB, "
+            f"{len(changed)} of {len(local_hashes)} files ({uploaded_size / 1024 / 1024:.2f} MB) changed "
+            f"({ret.oid if ret else 'no commit'})"
         )
         telemetry.push_telemetry_event_uploaded(total_size, user_id, repo_id)
 
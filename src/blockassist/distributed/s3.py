@@ -1,6 +1,13 @@
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore import UNSIGNED
 from botocore.client import Config
 
@@ -8,6 +15,247 @@ from blockassist.globals import get_logger
 
 _LOG = get_logger()
 
+_MB = 1024 * 1024
+
+_S3_CLIENTS = {}
+_S3_CLIENTS_LOCK = threading.Lock()
+_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=64 * _MB, multipart_chunksize=16 * _MB, max_concurrency=8
+)
+_MAX_PART_ATTEMPTS = 5
+
+
+def configure_s3_transfer(
+    multipart_threshold_mb: int = 64,
+    multipart_chunksize_mb: int = 16,
+    max_concurrency: int = 8,
+    max_part_attempts: int = 5,
+) -> None:
+    """Sets the multipart transfer settings used by upload_zip_to_s3."""
+    global _TRANSFER_CONFIG, _MAX_PART_ATTEMPTS
+    _TRANSFER_CONFIG = TransferConfig(
+        multipart_threshold=multipart_threshold_mb * _MB,
+        multipart_chunksize=multipart_chunksize_mb * _MB,
+        max_concurrency=max_concurrency,
+    )
+    _MAX_PART_ATTEMPTS = max_part_attempts
+    with _S3_CLIENTS_LOCK:
+        # Clients size their connection pool from max_concurrency.
+        _S3_CLIENTS.clear()
+
+
+def get_s3_client():
+    """Returns the S3 client shared by every upload in this process."""
+    # Keyed by pid since boto3 clients must not be shared across forked processes.
+    pid = os.getpid()
+    with _S3_CLIENTS_LOCK:
+        if pid not in _S3_CLIENTS:
+            _S3_CLIENTS[pid] = boto3.client(
+                "s3",
+                config=Config(
+                    signature_version=UNSIGNED,
+                    max_pool_connections=max(10, _TRANSFER_CONFIG.max_request_concurrency),
+                    # Every call made by the upload functions is retried by _retry;
+                    # retrying here too would multiply the attempts and backoff.
+                    retries={"total_max_attempts": 1, "mode": "standard"},
+                ),
+            )
+        return _S3_CLIENTS[pid]
+
+
+def _retry(description: str, fn: Callable):
+    for attempt in range(1, _MAX_PART_ATTEMPTS + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == _MAX_PART_ATTEMPTS:
+                raise
+            _LOG.warning(
+                f"Retrying {description} (attempt {attempt}/{_MAX_PART_ATTEMPTS}): {e}"
+            )
+            time.sleep(min(2**attempt, 30))
+
+
+def _upload_part(
+    s3_client,
+    bucket_name: str,
+    s3_key: str,
+    upload_id: str,
+    part_number: int,
+    read_body: Callable[[], bytes],
+) -> dict:
+    # Retried on its own, so a dropped connection only resends this part.
+    response = _retry(
+        f"part {part_number} of s3://{bucket_name}/{s3_key}",
+        lambda: s3_client.upload_part(
+            Bucket=bucket_name,
+            Key=s3_key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=read_body(),
+        ),
+    )
+    return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+
+def _create_multipart_upload(s3_client, bucket_name: str, s3_key: str) -> str:
+    response = _retry(
+        f"starting multipart upload to s3://{bucket_name}/{s3_key}",
+        lambda: s3_client.create_multipart_upload(Bucket=bucket_name, Key=s3_key),
+    )
+    return response["UploadId"]
+
+
+def _complete_multipart_upload(
+    s3_client, bucket_name: str, s3_key: str, upload_id: str, parts: list[dict]
+) -> None:
+    _retry(
+        f"completing multipart upload to s3://{bucket_name}/{s3_key}",
+        lambda: s3_client.complete_multipart_upload(
+            Bucket=bucket_name,
+            Key=s3_key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        ),
+    )
+
+
+def _abort_multipart_upload(
+    s3_client, bucket_name: str, s3_key: str, upload_id: str
+) -> None:
+    # Called while another exception is in flight, which must not be replaced.
+    try:
+        s3_client.abort_multipart_upload(
+            Bucket=bucket_name, Key=s3_key, UploadId=upload_id
+        )
+    except Exception as e:
+        _LOG.warning(f"Could not abort multipart upload to s3://{bucket_name}/{s3_key}: {e}")
+
+
+def _read_file_range(path: Path, offset: int, size: int) -> Callable[[], bytes]:
+    def read_body() -> bytes:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return f.read(size)
+
+    return read_body
+
+
+def _upload_multipart(s3_client, zip_path: Path, bucket_name: str, s3_key: str) -> None:
+    file_size = zip_path.stat().st_size
+    chunk_size = _TRANSFER_CONFIG.multipart_chunksize
+    upload_id = _create_multipart_upload(s3_client, bucket_name, s3_key)
+    try:
+        with ThreadPoolExecutor(_TRANSFER_CONFIG.max_request_concurrency) as pool:
+            futures = [
+                pool.submit(
+                    _upload_part,
+                    s3_client,
+                    bucket_name,
+                    s3_key,
+                    upload_id,
+                    part_number,
+                    _read_file_range(
+                        zip_path, offset, min(chunk_size, file_size - offset)
+                    ),
+                )
+                for part_number, offset in enumerate(range(0, file_size, chunk_size), 1)
+            ]
+            parts = [f.result() for f in futures]
+
+        _complete_multipart_upload(s3_client, bucket_name, s3_key, upload_id, parts)
+    except Exception:
+        _abort_multipart_upload(s3_client, bucket_name, s3_key, upload_id)
+        raise
+
+
+class S3MultipartWriter(io.RawIOBase):
+    """Write-only stream that uploads its bytes to S3 as a multipart upload.
+
+    Bytes are buffered until a full part is available, which is then uploaded
+    before write() returns, so memory use is bounded by the part size. Closing
+    the writer uploads the remaining bytes and completes the upload; leaving a
+    ``with`` block through an exception aborts it instead.
+    """
+
+    def __init__(self, bucket_name: str, s3_key: str, part_size: int | None = None):
+        super().__init__()
+        self.bucket_name = bucket_name
+        self.s3_key = s3_key
+        self.part_size = part_size or _TRANSFER_CONFIG.multipart_chunksize
+
+        self._s3_client = get_s3_client()
+        self._buffer = bytearray()
+        self._parts = []
+        self._position = 0
+        self._upload_id = _create_multipart_upload(self._s3_client, bucket_name, s3_key)
+
+    @property
+    def s3_uri(self) -> str:
+        return f"s3://{self.bucket_name}/{self.s3_key}"
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def write(self, b) -> int:
+        if self.closed:
+            raise ValueError("write to closed S3MultipartWriter")
+        self._buffer += b
+        self._position += len(b)
+        while len(self._buffer) >= self.part_size:
+            self._upload_buffered(self.part_size)
+        return len(b)
+
+    def _upload_buffered(self, size: int) -> None:
+        body = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self._parts.append(
+            _upload_part(
+                self._s3_client,
+                self.bucket_name,
+                self.s3_key,
+                self._upload_id,
+                len(self._parts) + 1,
+                lambda: body,
+            )
+        )
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._buffer or not self._parts:
+                self._upload_buffered(len(self._buffer))
+            _complete_multipart_upload(
+                self._s3_client,
+                self.bucket_name,
+                self.s3_key,
+                self._upload_id,
+                self._parts,
+            )
+        except Exception:
+            self.abort()
+            raise
+        super().close()
+
+    def abort(self) -> None:
+        if self.closed:
+            return
+        self._buffer.clear()
+        _abort_multipart_upload(
+            self._s3_client, self.bucket_name, self.s3_key, self._upload_id
+        )
+        super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
 
 def upload_zip_to_s3(
     zip_file_path: str, bucket_name: str, s3_key: str | None = None
@@ -21,11 +269,19 @@ def upload_zip_to_s3(
         s3_key = zip_path.name
 
     try:
-        s3_client = boto3.client("s3", config=Config(signature_version=UNSIGNED))
-        s3_client.upload_file(str(zip_path), bucket_name, s3_key)
+        s3_client = get_s3_client()
+        if zip_path.stat().st_size >= _TRANSFER_CONFIG.multipart_threshold:
+            _upload_multipart(s3_client, zip_path, bucket_name, s3_key)
+        else:
+            _retry(
+                f"upload of {zip_path}",
+                lambda: s3_client.upload_file(
+                    str(zip_path), bucket_name, s3_key, Config=_TRANSFER_CONFIG
+                ),
+            )
         s3_uri = f"s3://{bucket_name}/{s3_key}"
         _LOG.info(f"Successfully uploaded to {s3_uri}")
         return s3_uri
     except Exception as e:
         _LOG.error(f"Failed to upload {zip_path} to S3: {e}")
-
+        raise
@@ -0,0 +1,159 @@
+"""Bounds bc_human training by wall time and by validation loss.
+
+mbag trains for a fixed num_training_iters. While a TrainingStopper is
+active, the trainer hands it the result of every iteration:
+
+- With a validation_prop, mbag holds that share of episodes out of every
+  batch and reports their cross-entropy. Each new best is saved as a
+  checkpoint, and training stops once ``patience`` iterations pass without
+  improvement.
+- With a time budget, training stops once the next iteration would not
+  finish within it. An iteration in progress is never cut short.
+
+mbag's loop cannot be broken out of, so stopping replaces the trainer's
+train() with one returning the last result and its save() with one that
+writes a checkpoint only once. The loop then runs out its remaining
+iterations without training or writing anything, and its final save returns
+the checkpoint saved at the stop. Its per-iteration log lines are dropped
+once training stopped.
+"""
+
+import logging
+import math
+import shutil
+import time
+from contextlib import contextmanager
+
+from mbag.rllib.callbacks import MbagCallbacks
+from ray.rllib.algorithms.algorithm import Algorithm
+
+from blockassist.globals import get_logger
+
+_LOG = get_logger()
+
+_ACTIVE_STOPPER: "TrainingStopper | None" = None
+
+# Logger of mbag's train experiment, which logs every loop iteration.
+_MBAG_TRAIN_LOGGER = "train_mbag"
+
+
+def get_validation_loss(result: dict) -> float | None:
+    """The held-out cross-entropy of a training result, averaged over policies."""
+    learner_info = result.get("info", {}).get("learner", {})
+    losses = [
+        policy_info["validation"]["cross_entropy"]
+        for policy_info in learner_info.values()
+        if isinstance(policy_info, dict)
+        and "cross_entropy" in policy_info.get("validation", {})
+    ]
+    losses = [loss for loss in losses if not math.isnan(loss)]
+    if not losses:
+        return None
+    return sum(losses) / len(losses)
+
+
+class TrainingStopper:
+    """Decides when to stop training and keeps the best checkpoint."""
+
+    def __init__(
+        self,
+        time_budget_s: float | None = None,
+        patience: int = 0,
+        min_delta: float = 0.0,
+    ):
+        self.time_budget_s = time_budget_s
+        self.patience = patience
+        self.min_delta = min_delta
+
+        self.best_loss = None
+        self.best_iteration = None
+        self.best_checkpoint = None
+        self.stop_reason = None
+        self._iterations_since_best = 0
+        self._start_time = time.monotonic()
+
+    @contextmanager
+    def activate(self):
+        """Applies to trainers built in the enclosed block; the budget starts now."""
+        global _ACTIVE_STOPPER
+        self._start_time = time.monotonic()
+        previous, _ACTIVE_STOPPER = _ACTIVE_STOPPER, self
+        mbag_logger = logging.getLogger(_MBAG_TRAIN_LOGGER)
+        mbag_logger.addFilter(self._filter_log)
+        try:
+            yield self
+        finally:
+            mbag_logger.removeFilter(self._filter_log)
+            _ACTIVE_STOPPER = previous
+
+    def _filter_log(self, record: logging.LogRecord) -> bool:
+        return not (
+            self.stop_reason and record.getMessage().startswith("Starting training iteration")
+        )
+
+    def on_train_result(self, algorithm: Algorithm, result: dict) -> None:
+        loss = get_validation_loss(result)
+        if loss is not None:
+            self._update_best(algorithm, result, loss)
+
+        self.stop_reason = self._get_stop_reason(result)
+        if self.stop_reason:
+            _LOG.info(
+                f"Stopping training after iteration {result.get('training_iteration')}: "
+                f"{self.stop_reason}"
+            )
+            self._stop(algorithm, result)
+
+    def _stop(self, algorithm: Algorithm, result: dict) -> None:
+        save = algorithm.save
+        saved = []
+
+        def save_once(*args, **kwargs):
+            if not saved:
+                saved.append(save(*args, **kwargs))
+            return saved[0]
+
+        algorithm.train = lambda: result
+        algorithm.save = save_once
+
+    def _update_best(self, algorithm: Algorithm, result: dict, loss: float) -> None:
+        if self.best_loss is not None and loss >= self.best_loss - self.min_delta:
+            self._iterations_since_best += 1
+            return
+
+        previous_checkpoint = self.best_checkpoint
+        self.best_checkpoint = algorithm.save()
+        self.best_loss = loss
+        self.best_iteration = result.get("training_iteration")
+        self._iterations_since_best = 0
+        _LOG.info(f"Validation loss {loss:.4f} is the best so far, saved {self.best_checkpoint}")
+        if previous_checkpoint and previous_checkpoint != self.best_checkpoint:
+            shutil.rmtree(previous_checkpoint, ignore_errors=True)
+
+    def _get_stop_reason(self, result: dict) -> str | None:
+        if self.patience and self._iterations_since_best >= self.patience:
+            return "early_stopping"
+        if self.time_budget_s is not None:
+            elapsed_s = time.monotonic() - self._start_time
+            # Assumes the next iteration takes as long as the last one.
+            next_iter_s = result.get("time_this_iter_s") or 0.0
+            if elapsed_s + next_iter_s > self.time_budget_s:
+                return "time_budget"
+        return None
+
+    def summary(self) -> dict:
+        return {
+            "stop_reason": self.stop_reason,
+            "best_iteration": self.best_iteration,
+            "best_validation_loss": self.best_loss,
+            "best_checkpoint": self.best_checkpoint,
+        }
+
+
+class StoppingCallbacks(MbagCallbacks):
+    """MbagCallbacks that also report results to the active TrainingStopper."""
+
+    def on_train_result(self, *, algorithm: Algorithm, result: dict, **kwargs) -> None:
+        super().on_train_result(algorithm=algorithm, result=result, **kwargs)
+        if _ACTIVE_STOPPER is not None:
+            _ACTIVE_STOPPER.on_train_result(algorithm, result)
@@ -1,6 +1,7 @@
 import asyncio
 import time
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from mbag.environment.goals import ALL_GOAL_GENERATORS
 from mbag.scripts.evaluate import ex
@@ -17,6 +18,10 @@ from blockassist.goals.diamond_quest import DiamondQuestGenerator
 from blockassist.goals.emerald_quest import EmeraldQuestGenerator
 from blockassist.goals.generator import BlockAssistGoalGenerator
 from blockassist.goals.obsidian_quest import ObsidianQuestGenerator
+from blockassist.sessions import get_last_goal_percentage_min
+
+if TYPE_CHECKING:
+    from blockassist.train import BackgroundConverter
 
 _LOG = get_logger()
 
@@ -91,8 +96,10 @@ class EpisodeRunner:
         episode_count: int = _MAX_EPISODE_COUNT,
         human_alone: bool = True,
         goal_generator: str = "blockassist",
+        background_converter: "BackgroundConverter | None" = None,
     ):
         self.address_eoa = address_eoa
+        self.background_converter = background_converter
 
         self.human_alone = human_alone
         self.checkpoint_dir = checkpoint_dir
@@ -115,19 +122,16 @@ class EpisodeRunner:
         return asyncio.wait_for(self.building_ended.wait(), timeout)
 
     def get_last_goal_percentage_min(self, result):
-        # Find the highest numbered goal_percentage_x_min key
-        goal_percentage_keys = [
-            key for key in result.keys() if key.startswith("goal_percentage_")
-        ]
-        if not goal_percentage_keys:
-            return 0.0
-
-        # Extract the minute values and find the maximum
-        max_x = max(int(key.split("_")[-2]) for key in goal_percentage_keys)
-        return result[f"goal_percentage_{max_x}_min"]
-
-    def after_episode(self, result):
+        return get_last_goal_percentage_min(result)
+
+    def after_episode(self, result, evaluate_dir: Path | None = None):
         self.completed_episode_count += 1
+        if self.background_converter and evaluate_dir:
+            try:
+                self.background_converter.submit(evaluate_dir)
+            except Exception:
+                # Training converts anything the background converter missed.
+                _LOG.exception(f"Could not queue {evaluate_dir} for conversion")
 
         duration_ms = int((time.time() - self.start_time) * 1000)
         telemetry.push_telemetry_event_session(
@@ -152,7 +156,7 @@ class EpisodeRunner:
                 evaluate_dir = getattr(run_main, "evaluate_dir", None)
                 if evaluate_dir:
                     self.evaluate_dirs.append(evaluate_dir)
-                self.after_episode(result)
+                self.after_episode(result, evaluate_dir)
             except KeyboardInterrupt:
                 _LOG.info(f"Episode {i} recording stopped!")
             # except
@@ -0,0 +1,198 @@
+"""Random-access episode store used in place of the recorded episodes.zip files.
+
+Every episode is kept in its own directory, mirroring the evaluate_ layout of
+the checkpoint::
+
+    <checkpoint>/episode_store/
+        manifest.json
+        evaluate_<time>/<run>/
+            episode_meta.pkl    # MbagEpisode without obs_history
+            obs_world.npy       # (length, num_players, *world_obs_shape)
+            obs_inventory.npy   # (length, num_players, *inventory_obs_shape)
+            obs_timestep.npy    # (length, num_players)
+
+The observation arrays are memory-mapped on load, so reading an episode only
+pages in the steps that are accessed instead of decompressing and unpickling
+the whole zip.
+
+Run ``python -m blockassist.episode_store <checkpoint_dir>`` to migrate the
+episodes of an existing checkpoint.
+"""
+
+import dataclasses
+import json
+import os
+import pickle
+import shutil
+import sys
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+from mbag.evaluation.episode import MbagEpisode
+from mbag.rllib.human_data import load_episode as load_episode_zip
+
+from blockassist.globals import get_logger
+
+_LOG = get_logger()
+
+EPISODE_STORE_NAME = "episode_store"
+EPISODE_META_NAME = "episode_meta.pkl"
+
+_MANIFEST_NAME = "manifest.json"
+_MANIFEST_VERSION = 1
+_OBS_FIELDS = ("world", "inventory", "timestep")
+
+
+class _StoredObsHistory(Sequence):
+    """Lazy obs_history backed by copy-on-write memory maps.
+
+    Indexing returns the same per-player (world, inventory, timestep) tuples
+    as MbagEpisode.obs_history, as views into the mapped arrays.
+    """
+
+    def __init__(self, episode_dir: Path):
+        self._episode_dir = episode_dir
+        # mmap_mode="c" lets callers modify observations in place, as
+        # repair_missing_player_locations does, without touching the files.
+        self._world, self._inventory, self._timestep = (
+            np.load(episode_dir / f"obs_{field}.npy", mmap_mode="c")
+            for field in _OBS_FIELDS
+        )
+
+    def __len__(self) -> int:
+        return len(self._world)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return [
+            (
+                self._world[index, p],
+                self._inventory[index, p],
+                self._timestep[index, p, ...],
+            )
+            for p in range(self._world.shape[1])
+        ]
+
+    def __deepcopy__(self, memo) -> "_StoredObsHistory":
+        # A fresh mapping is an independent copy-on-write view of the same data.
+        return _StoredObsHistory(self._episode_dir)
+
+
+def write_stored_episode(episode: MbagEpisode, episode_dir: Path) -> None:
+    """Writes episode to episode_dir, replacing anything already there."""
+    tmp_dir = episode_dir.with_name(episode_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    obs_history = episode.obs_history
+    if len(obs_history) > 0:
+        for field_index, field in enumerate(_OBS_FIELDS):
+            stacked = np.stack(
+                [np.stack([obs[field_index] for obs in step]) for step in obs_history]
+            )
+            np.save(tmp_dir / f"obs_{field}.npy", stacked)
+        obs_history = []
+
+    with open(tmp_dir / EPISODE_META_NAME, "wb") as f:
+        pickle.dump(dataclasses.replace(episode, obs_history=obs_history), f)
+
+    shutil.rmtree(episode_dir, ignore_errors=True)
+    os.replace(tmp_dir, episode_dir)
+
+
+def load_stored_episode(episode_dir: Path) -> MbagEpisode:
+    with open(episode_dir / EPISODE_META_NAME, "rb") as f:
+        episode = pickle.load(f)
+    if (episode_dir / "obs_world.npy").exists():
+        episode.obs_history = _StoredObsHistory(episode_dir)
+    return episode
+
+
+def load_episode(episode_fname: str) -> MbagEpisode:
+    """Drop-in for mbag's load_episode that also reads stored episodes."""
+    path = Path(episode_fname)
+    if path.name == EPISODE_META_NAME:
+        return load_stored_episode(path.parent)
+    return load_episode_zip(episode_fname)
+
+
+def _load_manifest(store_path: Path) -> dict:
+    try:
+        data = json.loads((store_path / _MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != _MANIFEST_VERSION:
+        return {}
+    return data["episodes"]
+
+
+def _save_manifest(store_path: Path, episodes: dict) -> None:
+    tmp_path = store_path / (_MANIFEST_NAME + ".tmp")
+    tmp_path.write_text(
+        json.dumps({"version": _MANIFEST_VERSION, "episodes": episodes})
+    )
+    os.replace(tmp_path, store_path / _MANIFEST_NAME)
+
+
+def migrate_checkpoint(checkpoint_dir: str) -> list[Path]:
+    """Syncs the store with the checkpoint's evaluate_*/**/episodes.zip files.
+
+    Episodes whose source zip is unchanged since it was stored are skipped,
+    so this is cheap to run before every conversion. Episodes whose source
+    zip was removed, e.g. by the clean_evaluate stage, are dropped so the
+    store always holds the same episodes as the checkpoint.
+
+    Returns:
+        The directories of the newly stored episodes
+    """
+    checkpoint_path = Path(checkpoint_dir)
+    store_path = checkpoint_path / EPISODE_STORE_NAME
+    store_path.mkdir(parents=True, exist_ok=True)
+    episodes = _load_manifest(store_path)
+
+    zip_paths = {
+        zip_path.parent.relative_to(checkpoint_path).as_posix(): zip_path
+        for zip_path in checkpoint_path.glob("evaluate_*/**/episodes.zip")
+    }
+    for rel_dir in set(episodes) - set(zip_paths):
+        _LOG.info(f"Removing {rel_dir} from the episode store, its source is gone")
+        shutil.rmtree(store_path / rel_dir, ignore_errors=True)
+        del episodes[rel_dir]
+    _save_manifest(store_path, episodes)
+
+    # Leftovers of interrupted writes would otherwise match the converter's glob.
+    for meta_path in store_path.glob(f"evaluate_*/**/{EPISODE_META_NAME}"):
+        rel_dir = meta_path.parent.relative_to(store_path).as_posix()
+        if rel_dir not in episodes:
+            shutil.rmtree(meta_path.parent, ignore_errors=True)
+
+    stored = []
+    for rel_dir, zip_path in sorted(zip_paths.items()):
+        stat = zip_path.stat()
+        source = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if episodes.get(rel_dir, {}).get("source") == source:
+            continue
+
+        try:
+            episode = load_episode_zip(str(zip_path))
+        except Exception:
+            _LOG.exception(f"Failed to read {zip_path}, not adding it to the store")
+            continue
+
+        episode_dir = store_path / rel_dir
+        write_stored_episode(episode, episode_dir)
+        episodes[rel_dir] = {"source": source, "length": episode.length}
+        _save_manifest(store_path, episodes)
+        _LOG.info(f"Stored {zip_path} in {episode_dir}")
+        stored.append(episode_dir)
+
+    return stored
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit(f"Usage: python -m {__spec__.name} <checkpoint_dir>")
+    migrated = migrate_checkpoint(sys.argv[1])
+    print(f"Migrated {len(migrated)} episodes")
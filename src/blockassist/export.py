@@ -0,0 +1,251 @@
+"""Compacts trained RLlib checkpoints before they are uploaded.
+
+A checkpoint written by training holds the whole algorithm: its state, every
+policy and each policy's optimizer state. An export keeps a single policy as
+an RLlib policy checkpoint under ``policies/<policy_id>/`` without optimizer
+state, which is all ``Policy.from_checkpoint`` needs to run it.
+
+Export formats:
+
+- ``rllib``: the weights stay in policy_state.pkl as float32.
+- ``safetensors``: the weights move to model.safetensors, optionally
+  quantized. ``fp16`` stores floating point weights as float16. ``int8``
+  stores weight matrices as int8 with a float32 scale per output row;
+  vectors such as biases stay float32. load_exported_policy dequantizes them.
+
+Every export is checked by running the original and the exported policy on
+the same random observations and comparing their action distribution inputs.
+"""
+
+import json
+import os
+import pickle
+import shutil
+from pathlib import Path
+
+import numpy as np
+import torch
+from ray.rllib.policy.policy import Policy
+from ray.rllib.policy.sample_batch import SampleBatch
+from ray.rllib.utils.spaces.space_utils import get_dummy_batch_for_space
+from safetensors.torch import load_file, save_file
+
+from blockassist.globals import get_logger
+
+_LOG = get_logger()
+
+EXPORT_FORMATS = ("rllib", "safetensors")
+EXPORT_QUANTIZATIONS = ("none", "fp16", "int8")
+
+# Largest difference in action distribution inputs an export may introduce.
+DEFAULT_TOLERANCES = {"none": 1e-5, "fp16": 1e-2, "int8": 1e-1}
+
+# Written by RLlib in every policy checkpoint directory.
+POLICY_CHECKPOINT_NAME = "rllib_checkpoint.json"
+
+_POLICY_STATE_NAME = "policy_state.pkl"
+_SAFETENSORS_NAME = "model.safetensors"
+_EXPORT_INFO_NAME = "export.json"
+_SCALE_SUFFIX = ".int8_scale"
+# Only needed to continue training.
+_TRAINING_ONLY_KEYS = ("_optimizer_variables",)
+
+
+def _get_policy_dir(checkpoint_dir: Path, policy_id: str) -> Path:
+    policy_dir = checkpoint_dir / "policies" / policy_id
+    if not policy_dir.is_dir():
+        available = sorted(p.name for p in (checkpoint_dir / "policies").glob("*"))
+        raise FileNotFoundError(
+            f"No policy {policy_id!r} in {checkpoint_dir}, found {available}"
+        )
+    return policy_dir
+
+
+def load_policy_state(policy_dir: Path) -> dict:
+    info = json.loads((policy_dir / POLICY_CHECKPOINT_NAME).read_text())
+    with open(policy_dir / info.get("state_file", _POLICY_STATE_NAME), "rb") as f:
+        return pickle.load(f)
+
+
+def quantize_weights(weights: dict, quantization: str) -> dict[str, torch.Tensor]:
+    """Converts RLlib policy weights into the tensors stored in model.safetensors."""
+    tensors = {}
+    for name, weight in weights.items():
+        tensor = torch.from_numpy(np.ascontiguousarray(weight))
+        if not tensor.is_floating_point() or quantization == "none":
+            tensors[name] = tensor
+        elif quantization == "fp16":
+            tensors[name] = tensor.half()
+        elif tensor.dim() < 2:
+            # Biases and norms are small and sensitive to rounding.
+            tensors[name] = tensor.float()
+        else:
+            rows = tensor.float().reshape(tensor.shape[0], -1)
+            scale = rows.abs().amax(dim=1).clamp(min=1e-12) / 127
+            quantized = torch.round(rows / scale[:, None]).clamp(-127, 127)
+            tensors[name] = quantized.to(torch.int8).reshape(tensor.shape)
+            tensors[name + _SCALE_SUFFIX] = scale
+    return tensors
+
+
+def dequantize_weights(tensors: dict[str, torch.Tensor]) -> dict[str, np.ndarray]:
+    weights = {}
+    for name, tensor in tensors.items():
+        if name.endswith(_SCALE_SUFFIX):
+            continue
+        scale = tensors.get(name + _SCALE_SUFFIX)
+        if scale is not None:
+            rows = tensor.float().reshape(tensor.shape[0], -1) * scale[:, None]
+            tensor = rows.reshape(tensor.shape)
+        elif tensor.dtype == torch.float16:
+            tensor = tensor.float()
+        weights[name] = tensor.numpy()
+    return weights
+
+
+def _load_weights(policy_dir: Path, state: dict) -> dict[str, np.ndarray]:
+    if (policy_dir / _SAFETENSORS_NAME).exists():
+        return dequantize_weights(load_file(policy_dir / _SAFETENSORS_NAME))
+    return state["weights"]
+
+
+def load_policy_weights(checkpoint_dir: Path, policy_id: str) -> dict[str, np.ndarray]:
+    """The float weights of a policy in a training checkpoint or an export."""
+    policy_dir = _get_policy_dir(checkpoint_dir, policy_id)
+    return _load_weights(policy_dir, load_policy_state(policy_dir))
+
+
+def load_exported_policy(export_dir: Path, policy_id: str) -> Policy:
+    """Builds the RLlib policy of an export, dequantizing its weights if needed."""
+    policy_dir = _get_policy_dir(export_dir, policy_id)
+    state = load_policy_state(policy_dir)
+    state["weights"] = _load_weights(policy_dir, state)
+    return Policy.from_state(state)
+
+
+def _get_action_dist_inputs(policy: Policy, batch: SampleBatch) -> np.ndarray:
+    actions, _, extra = policy.compute_actions_from_input_dict(batch.copy(), explore=False)
+    return np.asarray(extra.get(SampleBatch.ACTION_DIST_INPUTS, actions), dtype=np.float64)
+
+
+def verify_export(
+    original_state: dict,
+    export_dir: Path,
+    policy_id: str,
+    tolerance: float,
+    batch_size: int = 32,
+) -> float:
+    """
+    Compares the original and exported policy on the same random observations.
+
+    Returns:
+        The largest absolute difference in action distribution inputs
+
+    Raises:
+        ValueError: If the difference is above tolerance
+    """
+    original = Policy.from_state(original_state)
+    exported = load_exported_policy(export_dir, policy_id)
+
+    batch = original._get_dummy_batch_from_view_requirements(batch_size)
+    original.observation_space.seed(0)
+    batch[SampleBatch.OBS] = get_dummy_batch_for_space(
+        original.observation_space, batch_size=batch_size, fill_value="random"
+    )
+    expected = _get_action_dist_inputs(original, batch)
+    actual = _get_action_dist_inputs(exported, batch)
+
+    # Masked actions come out as -inf in both.
+    finite = np.isfinite(expected) & np.isfinite(actual)
+    if not np.array_equal(expected[~finite], actual[~finite]):
+        raise ValueError(f"Exported policy {policy_id!r} masks different actions")
+    max_diff = float(np.abs(expected[finite] - actual[finite]).max(initial=0.0))
+    if max_diff > tolerance:
+        raise ValueError(
+            f"Exported policy {policy_id!r} differs by {max_diff:.3g}, "
+            f"more than the tolerance of {tolerance:.3g}"
+        )
+    return max_diff
+
+
+def export_checkpoint(
+    checkpoint_dir: Path,
+    export_dir: Path,
+    policy_id: str = "human",
+    export_format: str = "safetensors",
+    quantization: str = "none",
+    tolerance: float | None = None,
+) -> Path:
+    """
+    Writes a verified, upload-ready export of one policy of a training checkpoint.
+
+    Args:
+        checkpoint_dir: RLlib algorithm checkpoint written by training
+        export_dir: Directory to write the export to; replaced if it exists
+        policy_id: Policy to keep
+        export_format: One of EXPORT_FORMATS
+        quantization: One of EXPORT_QUANTIZATIONS; only used for safetensors
+        tolerance: Allowed difference in action distribution inputs, by
+            default DEFAULT_TOLERANCES[quantization]
+
+    Returns:
+        export_dir
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r}, expected one of {EXPORT_FORMATS}")
+    if quantization not in EXPORT_QUANTIZATIONS:
+        raise ValueError(
+            f"Unknown quantization {quantization!r}, expected one of {EXPORT_QUANTIZATIONS}"
+        )
+    if export_format == "rllib":
+        quantization = "none"
+    if tolerance is None:
+        tolerance = DEFAULT_TOLERANCES[quantization]
+
+    policy_dir = _get_policy_dir(checkpoint_dir, policy_id)
+    state = load_policy_state(policy_dir)
+    compact_state = {k: v for k, v in state.items() if k not in _TRAINING_ONLY_KEYS}
+
+    tmp_dir = export_dir.with_name(export_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_policy_dir = tmp_dir / "policies" / policy_id
+    tmp_policy_dir.mkdir(parents=True)
+    shutil.copy2(policy_dir / POLICY_CHECKPOINT_NAME, tmp_policy_dir)
+    if export_format == "safetensors":
+        save_file(
+            quantize_weights(compact_state["weights"], quantization),
+            tmp_policy_dir / _SAFETENSORS_NAME,
+            metadata={"quantization": quantization},
+        )
+        compact_state["weights"] = {}
+    with open(tmp_policy_dir / _POLICY_STATE_NAME, "wb") as f:
+        pickle.dump(compact_state, f)
+
+    try:
+        max_diff = verify_export(state, tmp_dir, policy_id, tolerance)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    size = sum(f.stat().st_size for f in tmp_dir.rglob("*") if f.is_file())
+    source_size = sum(f.stat().st_size for f in checkpoint_dir.rglob("*") if f.is_file())
+    (tmp_dir / _EXPORT_INFO_NAME).write_text(
+        json.dumps(
+            {
+                "policy_id": policy_id,
+                "format": export_format,
+                "quantization": quantization,
+                "max_abs_diff": max_diff,
+                "tolerance": tolerance,
+            },
+            indent=2,
+        )
+    )
+    shutil.rmtree(export_dir, ignore_errors=True)
+    os.replace(tmp_dir, export_dir)
+    _LOG.info(
+        f"Exported policy {policy_id!r} of {checkpoint_dir} to {export_dir}: "
+        f"{size / 1024 / 1024:.2f} MB from {source_size / 1024 / 1024:.2f} MB, "
+        f"max difference {max_diff:.3g}"
+    )
+    return export_dir
@@ -26,6 +26,7 @@ from blockassist.data import (
     zip_and_upload_episodes,
 )
 from blockassist.distributed.hf import upload_to_huggingface
+from blockassist.distributed.s3 import configure_s3_transfer
 from blockassist.episode import EpisodeRunner
 from blockassist.globals import (
     _DEFAULT_CHECKPOINT,
@@ -34,7 +35,7 @@ from blockassist.globals import (
     get_logger,
     get_training_id,
 )
-from blockassist.train import TrainingRunner
+from blockassist.train import BackgroundConverter, TrainingRunner
 
 _LOG = get_logger()
 
@@ -82,6 +83,27 @@ def get_hf_repo_id(hf_token: str, training_id: str):
     return f"{username}/blockassist"
 
 
+def export_model(cfg: DictConfig, model_dir: Path) -> Path:
+    """Returns the directory to upload for model_dir, exported if configured."""
+    export_format = cfg.get("export_format", None)
+    if not export_format:
+        return model_dir
+    try:
+        # Imported here so that safetensors is only needed when exporting.
+        from blockassist.export import export_checkpoint
+
+        return export_checkpoint(
+            model_dir,
+            model_dir.with_name(model_dir.name + "_export"),
+            policy_id=cfg.get("export_policy_id", "human"),
+            export_format=export_format,
+            quantization=cfg.get("export_quantization", "none"),
+        )
+    except Exception as e:
+        _LOG.error("Model export failed, uploading the full checkpoint", exc_info=e)
+        return model_dir
+
+
 async def _main(cfg: DictConfig):
     try:
         logging.basicConfig(
@@ -109,21 +131,55 @@ async def _main(cfg: DictConfig):
         model_dir = cfg.get("model_dir", "")
         num_training_iters = cfg.get("num_training_iters", 0)
         upload_session_episodes_only = cfg.get("upload_session_episodes_only", True)
+        upload_workers = cfg.get("upload_workers", 1)
+        upload_max_pending = cfg.get("upload_max_pending", None)
+        upload_compresslevel = cfg.get("upload_compresslevel", None)
+        upload_skip_unchanged = cfg.get("upload_skip_unchanged", True)
+        upload_stream_to_s3 = cfg.get("upload_stream_to_s3", False)
+        backup_copy_strategy = cfg.get("backup_copy_strategy", "link")
+        fs_workers = cfg.get("fs_workers", 1)
+        use_episode_store = cfg.get("use_episode_store", False)
+        use_convert_cache = cfg.get("use_convert_cache", False)
+        convert_workers = cfg.get("convert_workers", 1)
+        continual_training = cfg.get("continual_training", False)
+        training_metrics_path = cfg.get("training_metrics_path", None)
+        train_autotune = cfg.get("train_autotune", "off")
+        background_convert = cfg.get("background_convert", False)
+        binary_shards = cfg.get("binary_shards", False)
+        train_time_budget_min = cfg.get("train_time_budget_min", None)
+        validation_prop = cfg.get("validation_prop", 0.0)
+        early_stopping_patience = cfg.get("early_stopping_patience", 0)
+        # Background conversion only pays off if training reads its cache.
+        use_convert_cache = use_convert_cache or background_convert
+        background_converter = None
+        if background_convert:
+            background_converter = BackgroundConverter(checkpoint_dir, use_episode_store)
+
+        configure_s3_transfer(
+            multipart_threshold_mb=cfg.get("s3_multipart_threshold_mb", 64),
+            multipart_chunksize_mb=cfg.get("s3_multipart_chunksize_mb", 16),
+            max_concurrency=cfg.get("s3_max_concurrency", 8),
+            max_part_attempts=cfg.get("s3_max_part_attempts", 5),
+        )
 
         stages = get_stages(cfg)
         for stage in stages:
             if stage == Stage.BACKUP_EVALUATE:
                 _LOG.info("Backing up existing evaluation directories!!")
-                backup_evaluate_dirs(checkpoint_dir)
+                backup_evaluate_dirs(
+                    checkpoint_dir, backup_copy_strategy, max_workers=fs_workers
+                )
 
             elif stage == Stage.CLEAN_EVALUATE:
                 _LOG.info("Cleaning up evaluation directories and zip files!!")
-                delete_evaluate_dirs(checkpoint_dir)
-                delete_evaluate_zips(checkpoint_dir)
+                delete_evaluate_dirs(checkpoint_dir, max_workers=fs_workers)
+                delete_evaluate_zips(checkpoint_dir, max_workers=fs_workers)
 
             elif stage == Stage.RESTORE_BACKUP:
                 _LOG.info("Restoring backup evaluation directories!!")
-                restore_evaluate_dirs_from_backup(checkpoint_dir)
+                restore_evaluate_dirs_from_backup(
+                    checkpoint_dir, backup_copy_strategy, max_workers=fs_workers
+                )
 
             elif stage == Stage.EPISODE:
                 _LOG.info("Starting episode recording!!")
@@ -132,33 +188,64 @@ async def _main(cfg: DictConfig):
                     checkpoint_dir,
                     human_alone=num_instances == 1,
                     goal_generator=cfg.get("goal_generator", "blockassist"),
+                    background_converter=background_converter,
                 )
                 episode_runner.start()
                 await episode_runner.wait_for_end()
 
             elif stage == Stage.UPLOAD_EPISODES:
-                if upload_session_episodes_only:
-                    _LOG.info("Uploading session episode zips!")
-                    s3_uris = zip_and_upload_episodes(
-                        get_identifier(address_eoa),
-                        checkpoint_dir,
-                        _DEFAULT_EPISODES_S3_BUCKET,
-                        episode_runner.evaluate_dirs,
-                    )
-                else:
-                    _LOG.info("Uploading all episode zips!")
-                    s3_uris = zip_and_upload_all_episodes(
-                        get_identifier(address_eoa),
-                        checkpoint_dir,
-                        _DEFAULT_EPISODES_S3_BUCKET,
+                try:
+                    if upload_session_episodes_only:
+                        _LOG.info("Uploading session episode zips!")
+                        s3_uris = zip_and_upload_episodes(
+                            get_identifier(address_eoa),
+                            checkpoint_dir,
+                            _DEFAULT_EPISODES_S3_BUCKET,
+                            episode_runner.evaluate_dirs,
+                            max_workers=upload_workers,
+                            max_pending_zips=upload_max_pending,
+                            compresslevel=upload_compresslevel,
+                            skip_unchanged=upload_skip_unchanged,
+                            stream_to_s3=upload_stream_to_s3,
+                        )
+                    else:
+                        _LOG.info("Uploading all episode zips!")
+                        s3_uris = zip_and_upload_all_episodes(
+                            get_identifier(address_eoa),
+                            checkpoint_dir,
+                            _DEFAULT_EPISODES_S3_BUCKET,
+                            max_workers=upload_workers,
+                            max_pending_zips=upload_max_pending,
+                            compresslevel=upload_compresslevel,
+                            skip_unchanged=upload_skip_unchanged,
+                            stream_to_s3=upload_stream_to_s3,
+                        )
+                    _LOG.info(
+                        f"Episode data uploaded successfully! Uploaded {len(s3_uris)} files."
                     )
-                _LOG.info(
-                    f"Episode data uploaded successfully! Uploaded {len(s3_uris)} files."
-                )
+                except Exception as e:
+                    # Keep going so the session can still be trained and uploaded.
+                    _LOG.error("Episode upload failed, continuing", exc_info=e)
 
             elif stage == Stage.TRAIN:
+                if background_converter:
+                    _LOG.info("Waiting for background conversion to finish")
+                    background_converter.wait()
                 _LOG.info("Starting model training!!")
-                training_runner = TrainingRunner(address_eoa, num_training_iters)
+                training_runner = TrainingRunner(
+                    address_eoa,
+                    num_training_iters,
+                    use_episode_store=use_episode_store,
+                    use_convert_cache=use_convert_cache,
+                    convert_workers=convert_workers,
+                    continual=continual_training,
+                    metrics_path=training_metrics_path,
+                    train_autotune=train_autotune,
+                    binary_shards=binary_shards,
+                    time_budget_min=train_time_budget_min,
+                    validation_prop=validation_prop,
+                    early_stopping_patience=early_stopping_patience,
+                )
                 training_runner.start()
                 model_dir = training_runner.model_dir
                 await training_runner.wait_for_end()
@@ -171,7 +258,7 @@ async def _main(cfg: DictConfig):
                     num_sessions = get_total_episodes(checkpoint_dir)
                     is_telemetry_enabled = not telemetry.is_telemetry_disabled()
                     git_ref = upload_to_huggingface(
-                        model_path=Path(model_dir),
+                        model_path=export_model(cfg, Path(model_dir)),
                         user_id=get_identifier(address_eoa),
                         repo_id=hf_repo_id,
                         hf_token=hf_token,
@@ -181,6 +268,7 @@ async def _main(cfg: DictConfig):
                             "numSessions": num_sessions,
                             "telemetryEnabled": is_telemetry_enabled,
                         },
+                        record_path=Path(checkpoint_dir) / "hf_upload_record.json",
                     )
                     coordinator.submit_hf_upload(
                         training_id=training_id,
@@ -193,6 +281,10 @@ async def _main(cfg: DictConfig):
                     _LOG.warning("No model directory specified, skipping upload.")
                     continue
 
+        if background_converter:
+            # A separate train process reads the cache, so finish it first.
+            background_converter.shutdown()
+
     except Exception as e:
         _LOG.error("Recording session was stopped with exception", exc_info=e)
         sys.exit(1)
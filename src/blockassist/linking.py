@@ -0,0 +1,89 @@
+import ctypes
+import ctypes.util
+import os
+import shutil
+import sys
+from collections import Counter
+from pathlib import Path
+
+from blockassist.globals import get_logger
+from blockassist.readiness import is_evaluate_dir_ready
+
+_LOG = get_logger()
+
+# ioctl(2) request that makes dst share src's extents (Linux btrfs/XFS/bcachefs).
+_FICLONE = 0x40049409
+
+
+def _reflink_linux(src: str, dst: str) -> None:
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+
+
+def _reflink_darwin(src: str, dst: str) -> None:
+    # clonefile(2) on APFS.
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+if sys.platform.startswith("linux"):
+    _reflink = _reflink_linux
+elif sys.platform == "darwin":
+    _reflink = _reflink_darwin
+else:
+    _reflink = None
+
+
+class LinkingCopier:
+    """copytree copy_function that avoids duplicating file data where possible.
+
+    Files are reflinked (copy-on-write clones) if the filesystem supports it.
+    Otherwise, when allow_hardlinks is set, they are hard-linked, which is
+    only safe for files nobody will modify in place again. Anything else is
+    deep-copied. Counts per method are kept in ``stats``.
+    """
+
+    def __init__(self, allow_hardlinks: bool):
+        self.allow_hardlinks = allow_hardlinks
+        self.reflink_supported = _reflink is not None
+        self.stats = Counter()
+
+    def __call__(self, src: str, dst: str) -> str:
+        if self.reflink_supported:
+            try:
+                _reflink(src, dst)
+                shutil.copystat(src, dst)
+                self.stats["reflinked"] += 1
+                return dst
+            except (OSError, AttributeError) as e:
+                # Unsupported on this filesystem; stop trying for this tree.
+                _LOG.debug(f"Reflink unavailable, falling back: {e}")
+                self.reflink_supported = False
+                Path(dst).unlink(missing_ok=True)
+
+        if self.allow_hardlinks:
+            try:
+                os.link(src, dst)
+                self.stats["hard-linked"] += 1
+                return dst
+            except OSError as e:
+                _LOG.debug(f"Hard link of {src} failed, copying: {e}")
+
+        shutil.copy2(src, dst)
+        self.stats["copied"] += 1
+        return dst
+
+
+def link_copytree(src: Path, dst: Path) -> Counter:
+    """Copies an evaluate directory tree, sharing file data where it is safe.
+
+    Hard links are only used once every run in src has finished, because
+    sacred rewrites run.json in place while a run is in progress.
+    """
+    copier = LinkingCopier(allow_hardlinks=is_evaluate_dir_ready(src))
+    shutil.copytree(src, dst, copy_function=copier)
+    return copier.stats
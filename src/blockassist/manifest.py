@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from blockassist.globals import get_logger
+
+_LOG = get_logger()
+
+_MANIFEST_VERSION = 1
+_HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def hash_file(file_path: Path) -> str:
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_BYTES), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def get_upload_name(evaluate_dir: Path) -> str:
+    """Name of an evaluate directory's zip, unique within a checkpoint.
+
+    Session run directories are all named after their sacred run ID (usually
+    ``1``), so they are prefixed with their parent ``evaluate_<time>`` directory.
+    """
+    if evaluate_dir.name.startswith("evaluate_"):
+        return evaluate_dir.name
+    return f"{evaluate_dir.parent.name}_{evaluate_dir.name}"
+
+
+class UploadManifest:
+    """Local record of the evaluate directories already uploaded to S3.
+
+    For every evaluate directory the manifest keeps the size, mtime and SHA-256
+    of each file, plus the S3 location of the uploaded zip. A directory whose
+    files still hash the same and whose target key is unchanged does not need
+    to be zipped or uploaded again. Files whose size and mtime are unchanged
+    reuse their recorded hash, so checking an unchanged directory only costs
+    a stat per file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+
+        if path.exists():
+            try:
+                data = json.loads(path.read_text())
+                if data.get("version") == _MANIFEST_VERSION:
+                    self._entries = data["evaluate_dirs"]
+            except (OSError, ValueError, KeyError) as e:
+                _LOG.warning(f"Ignoring unreadable upload manifest {path}: {e}")
+
+    def hash_files(self, evaluate_dir: Path) -> dict[str, list]:
+        """Returns {relative path: [size, mtime_ns, sha256]} for every file."""
+        with self._lock:
+            previous = self._entries.get(get_upload_name(evaluate_dir), {}).get("files", {})
+
+        files = {}
+        for file_path in sorted(evaluate_dir.rglob("*")):
+            if not file_path.is_file():
+                continue
+            rel_path = file_path.relative_to(evaluate_dir).as_posix()
+            stat = file_path.stat()
+            old = previous.get(rel_path)
+            if old and old[0] == stat.st_size and old[1] == stat.st_mtime_ns:
+                files[rel_path] = old
+            else:
+                files[rel_path] = [stat.st_size, stat.st_mtime_ns, hash_file(file_path)]
+        return files
+
+    def get_uploaded_uri(
+        self,
+        evaluate_dir: Path,
+        bucket_name: str,
+        s3_key: str,
+        files: dict[str, list],
+    ) -> str | None:
+        """Returns the S3 URI if these exact files were already uploaded to s3_key."""
+        with self._lock:
+            entry = self._entries.get(get_upload_name(evaluate_dir))
+        if not entry or entry["bucket"] != bucket_name or entry["s3_key"] != s3_key:
+            return None
+
+        def hashes(f):
+            return {rel_path: v[2] for rel_path, v in f.items()}
+
+        if hashes(entry["files"]) != hashes(files):
+            return None
+        return entry["s3_uri"]
+
+    def record_upload(
+        self,
+        evaluate_dir: Path,
+        bucket_name: str,
+        s3_key: str,
+        s3_uri: str,
+        files: dict[str, list],
+    ) -> None:
+        with self._lock:
+            self._entries[get_upload_name(evaluate_dir)] = {
+                "bucket": bucket_name,
+                "s3_key": s3_key,
+                "s3_uri": s3_uri,
+                "files": files,
+            }
+            self._save()
+
+    def _save(self) -> None:
+        # Saved after every upload so an interrupted run keeps its progress.
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(
+            json.dumps({"version": _MANIFEST_VERSION, "evaluate_dirs": self._entries})
+        )
+        os.replace(tmp_path, self.path)
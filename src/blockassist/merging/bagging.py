@@ -1,13 +1,77 @@
+import copy
 from typing import Callable, List, Sequence
 
 import torch
 import torch.nn as nn
+from torch.func import functional_call, stack_module_state, vmap
+
+
+def check_same_architecture(models: Sequence[nn.Module]) -> None:
+    def signature(model: nn.Module):
+        return type(model), [
+            (name, tensor.shape, tensor.dtype)
+            for name, tensor in [*model.named_parameters(), *model.named_buffers()]
+        ]
+
+    expected = signature(models[0])
+    for i, model in enumerate(models[1:], start=1):
+        if signature(model) != expected:
+            raise ValueError(f"Model {i} does not share the architecture of model 0")
+
+
+def _vectorized_forward(models: Sequence[nn.Module]) -> Callable:
+    """
+    Runs all models as one batched forward over their stacked parameters.
+
+    Returns:
+        A callable returning the outputs of all models stacked along dim 0
+    """
+    check_same_architecture(models)
+    for model in models:
+        model.eval()
+    params, buffers = stack_module_state(list(models))
+    # Only the structure of the base model is used; its weights come from params.
+    base_model = copy.deepcopy(models[0]).to("meta")
+
+    def forward(*args, **kwargs):
+        def call_model(model_params, model_buffers):
+            return functional_call(base_model, (model_params, model_buffers), args, kwargs)
+
+        with torch.no_grad():
+            return vmap(call_model)(params, buffers)
+
+    return forward
+
+
+def get_weights_tensor(
+    models: Sequence[nn.Module], weights: Sequence[float] | None
+) -> torch.Tensor:
+    """Checks the bagging weights, defaulting to equal weights."""
+    if not models:
+        raise ValueError("At least one model must be provided")
+
+    if weights is None:
+        weights = [1.0 / len(models)] * len(models)
+    elif len(weights) != len(models):
+        raise ValueError(
+            f"Number of weights ({len(weights)}) must match number of models ({len(models)})"
+        )
+    return torch.tensor(weights)
+
+
+def weighted_sum(stacked: torch.Tensor, weights_tensor: torch.Tensor) -> torch.Tensor:
+    """Sums model outputs stacked along dim 0, weighting each model."""
+    weighted = stacked * weights_tensor.view(-1, *[1] * (stacked.dim() - 1)).to(
+        stacked.device, stacked.dtype
+    )
+    return weighted.sum(dim=0)
 
 
 def bag_models(
     models: Sequence[nn.Module],
     aggregation_fn: Callable | None = None,
     weights: Sequence[float] | None = None,
+    vectorize: bool = False,
 ) -> Callable:
     """
     Creates a function that aggregates (bags) the outputs of multiple PyTorch models.
@@ -16,31 +80,34 @@ def bag_models(
         models: List of nn.Module instances to ensemble
         aggregation_fn: Optional custom aggregation function. If None, uses weighted mean
         weights: Optional weights for each model. If None, equal weights are used
+        vectorize: If True, the models' parameters are stacked and all models run
+            as one batched forward with torch.func.vmap. The models must share an
+            architecture, and later changes to their parameters are not seen.
 
     Returns:
         A callable that takes the same inputs as the models and returns aggregated outputs
     """
-    if not models:
-        raise ValueError("At least one model must be provided")
+    weights_tensor = get_weights_tensor(models, weights)
 
-    if weights is None:
-        weights = [1.0 / len(models)] * len(models)
-    elif len(weights) != len(models):
-        raise ValueError(
-            f"Number of weights ({len(weights)}) must match number of models ({len(models)})"
-        )
+    def weighted_mean(stacked: torch.Tensor) -> torch.Tensor:
+        return weighted_sum(stacked, weights_tensor)
+
+    if vectorize:
+        forward = _vectorized_forward(models)
 
-    weights_tensor = torch.tensor(weights)
+        def vectorized_bagged_forward(*args, **kwargs):
+            stacked = forward(*args, **kwargs)
+            if aggregation_fn is None:
+                return weighted_mean(stacked)
+            return aggregation_fn(list(stacked.unbind(0)))
+
+        return vectorized_bagged_forward
 
     # Default aggregation is weighted average
     if aggregation_fn is None:
 
         def default_aggregation(outputs: List[torch.Tensor]) -> torch.Tensor:
-            stacked = torch.stack(outputs, dim=-1)
-            weighted = stacked * weights_tensor.view(-1, *[1] * (stacked.dim() - 1)).to(
-                stacked.device
-            )
-            return weighted.sum(dim=-1)
+            return weighted_mean(torch.stack(outputs, dim=0))
 
         aggregation_fn = default_aggregation
 
@@ -54,3 +121,120 @@ def bag_models(
         return aggregation_fn(outputs)
 
     return bagged_forward
+
+
+CASCADE_VOTES = ("soft", "hard")
+
+
+class CascadeBagging:
+    """
+    Picks the bagged action with as few model forwards as possible.
+
+    Models are evaluated in order of decreasing weight. Each adds its weighted
+    vote over actions, the softmax of its output ("soft") or a one-hot of its
+    argmax ("hard"), along the last dimension. Every vote lies in [0, 1], so
+    once the leading action of each row is ahead of the runner-up by more
+    than the weight of the models not yet evaluated, no remaining model can
+    change it and they are skipped.
+
+    Every audit_every calls, all models are evaluated and the decision is
+    compared with the argmax of bag_models' weighted mean of the outputs.
+    """
+
+    def __init__(
+        self,
+        models: Sequence[nn.Module],
+        weights: Sequence[float] | None = None,
+        vote: str = "soft",
+        audit_every: int = 0,
+    ):
+        """
+        Args:
+            models: List of nn.Module instances returning per-action scores
+            weights: Optional weights for each model. If None, equal weights are used
+            vote: One of CASCADE_VOTES
+            audit_every: Compare with full bagging every this many calls; 0 never does
+        """
+        if vote not in CASCADE_VOTES:
+            raise ValueError(f"Unknown vote {vote!r}, expected one of {CASCADE_VOTES}")
+        self.models = list(models)
+        self.weights_tensor = get_weights_tensor(models, weights)
+        if (self.weights_tensor < 0).any():
+            raise ValueError("Cascade weights must not be negative")
+        self.vote = vote
+        self.audit_every = audit_every
+
+        self._order = self.weights_tensor.argsort(descending=True).tolist()
+        ordered_weights = self.weights_tensor[self._order]
+        # Weight of the models after each position in the order.
+        self._remaining = (ordered_weights.sum() - ordered_weights.cumsum(0)).tolist()
+        for model in self.models:
+            model.eval()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.calls = 0
+        self.models_evaluated = 0
+        self.audited_calls = 0
+        self.audited_matches = 0
+
+    def _get_vote(self, output: torch.Tensor) -> torch.Tensor:
+        if self.vote == "soft":
+            return torch.softmax(output.float(), dim=-1)
+        return nn.functional.one_hot(output.argmax(dim=-1), output.shape[-1]).float()
+
+    @staticmethod
+    def _is_decided(votes: torch.Tensor, remaining_weight: float) -> bool:
+        if votes.shape[-1] < 2:
+            return True
+        top_two = votes.topk(2, dim=-1).values
+        return bool((top_two[..., 0] - top_two[..., 1] > remaining_weight).all())
+
+    def __call__(self, *args, **kwargs) -> torch.Tensor:
+        """Returns the chosen action of each row, like argmax over the last dimension."""
+        audit = self.audit_every > 0 and self.calls % self.audit_every == 0
+        votes, weighted_outputs, num_evaluated = None, None, None
+        with torch.no_grad():
+            for position, i in enumerate(self._order):
+                output = self.models[i](*args, **kwargs)
+                weight = self.weights_tensor[i]
+                vote = self._get_vote(output) * weight
+                votes = vote if votes is None else votes + vote
+                if audit:
+                    weighted_output = output * weight.to(output.dtype)
+                    weighted_outputs = (
+                        weighted_output
+                        if weighted_outputs is None
+                        else weighted_outputs + weighted_output
+                    )
+                if num_evaluated is None and self._is_decided(
+                    votes, self._remaining[position]
+                ):
+                    num_evaluated = position + 1
+                    # The decision is final, so later votes cannot change it.
+                    actions = votes.argmax(dim=-1)
+                    if not audit:
+                        break
+
+        self.calls += 1
+        self.models_evaluated += num_evaluated or len(self.models)
+        if num_evaluated is None:
+            actions = votes.argmax(dim=-1)
+        if audit:
+            self.audited_calls += 1
+            self.audited_matches += int(
+                torch.equal(actions, weighted_outputs.argmax(dim=-1))
+            )
+        return actions
+
+    def stats(self) -> dict:
+        """Average models evaluated per call and agreement with full bagging."""
+        return {
+            "calls": self.calls,
+            "mean_models_evaluated": self.models_evaluated / self.calls if self.calls else 0.0,
+            "num_models": len(self.models),
+            "audited_calls": self.audited_calls,
+            "full_bagging_agreement": self.audited_matches / self.audited_calls
+            if self.audited_calls
+            else None,
+        }
@@ -0,0 +1,180 @@
+"""Runs the models of a bagged ensemble in parallel worker processes.
+
+Each worker process owns a fixed share of the models and runs their forwards
+with its own torch thread count, pinned to its own cores where the platform
+allows. Tensors cross process boundaries through shared memory: the models'
+parameters are moved there before the workers start, inputs are copied there
+once per call, and workers return their stacked outputs there too. Pipes only
+carry torch's shared memory handles, never tensor data.
+"""
+
+import multiprocessing
+import os
+from typing import Callable, Sequence
+
+import torch
+import torch.multiprocessing  # noqa: F401 - registers shared memory pickling
+import torch.nn as nn
+
+from blockassist.globals import get_logger
+from blockassist.merging.bagging import get_weights_tensor, weighted_sum
+
+_LOG = get_logger()
+
+
+def _share(value):
+    if isinstance(value, torch.Tensor):
+        # Tensors already in shared memory are sent as is.
+        return value if value.is_shared() else value.clone().share_memory_()
+    if isinstance(value, (list, tuple)):
+        return type(value)(_share(v) for v in value)
+    if isinstance(value, dict):
+        return {k: _share(v) for k, v in value.items()}
+    return value
+
+
+def _worker_main(conn, models: list[nn.Module], num_threads: int, cpus: list[int]) -> None:
+    torch.set_num_threads(num_threads)
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    for model in models:
+        model.eval()
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        args, kwargs = message
+        try:
+            with torch.no_grad():
+                outputs = torch.stack([model(*args, **kwargs) for model in models])
+            conn.send((True, outputs.share_memory_()))
+        except Exception as e:
+            conn.send((False, e))
+
+
+class ParallelEnsemble:
+    """
+    Bags the outputs of multiple PyTorch models computed across processes.
+
+    Unlike bag_models(vectorize=True), the models may have any architecture,
+    but each must be picklable and return tensors of the same shape. The
+    models' parameters are moved to shared memory, so workers see in-place
+    updates to them.
+    Use as a context manager or call close() to stop the workers.
+    """
+
+    def __init__(
+        self,
+        models: Sequence[nn.Module],
+        aggregation_fn: Callable | None = None,
+        weights: Sequence[float] | None = None,
+        num_workers: int | None = None,
+        threads_per_worker: int | None = None,
+    ):
+        """
+        Args:
+            models: List of nn.Module instances to ensemble
+            aggregation_fn: Optional custom aggregation function. If None, uses weighted mean
+            weights: Optional weights for each model. If None, equal weights are used
+            num_workers: Number of worker processes, by default one per
+                available core up to the number of models
+            threads_per_worker: Torch threads per worker, by default the
+                available cores split evenly between the workers
+        """
+        self.weights_tensor = get_weights_tensor(models, weights)
+        self.aggregation_fn = aggregation_fn
+
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+        num_cores = len(cpus) or os.cpu_count() or 1
+        self.num_workers = max(1, min(num_workers or num_cores, len(models)))
+        self.threads_per_worker = threads_per_worker or max(1, num_cores // self.num_workers)
+
+        # Worker i runs models i, i + num_workers, ...
+        self._model_indices = [
+            list(range(i, len(models), self.num_workers)) for i in range(self.num_workers)
+        ]
+        self._order = torch.tensor(
+            [i for indices in self._model_indices for i in indices]
+        ).argsort()
+        for model in models:
+            model.share_memory()
+
+        # spawn, since forking a process that already runs threads (asyncio, S3
+        # uploads, torch) can deadlock the children.
+        context = multiprocessing.get_context("spawn")
+        self._connections = []
+        self._processes = []
+        for i, indices in enumerate(self._model_indices):
+            start = i * self.threads_per_worker
+            worker_cpus = cpus[start : start + self.threads_per_worker]
+            if len(worker_cpus) < self.threads_per_worker:
+                # More threads than cores; leave placement to the OS.
+                worker_cpus = []
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_worker_main,
+                args=(
+                    child_conn,
+                    [models[j] for j in indices],
+                    self.threads_per_worker,
+                    worker_cpus,
+                ),
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            self._connections.append(parent_conn)
+            self._processes.append(process)
+        _LOG.info(
+            f"Started {self.num_workers} ensemble workers for {len(models)} models "
+            f"with {self.threads_per_worker} torch threads each"
+        )
+
+    def __call__(self, *args, **kwargs):
+        if not self._processes:
+            raise RuntimeError("ParallelEnsemble is closed")
+        message = (_share(args), _share(kwargs))
+        for conn in self._connections:
+            conn.send(message)
+
+        worker_outputs, error = [], None
+        for conn in self._connections:
+            try:
+                ok, result = conn.recv()
+            except EOFError:
+                ok, result = False, RuntimeError("An ensemble worker exited unexpectedly")
+            if ok:
+                worker_outputs.append(result)
+            else:
+                # Keep receiving so every worker is ready for the next call.
+                error = error or result
+        if error is not None:
+            raise error
+
+        stacked = torch.cat(worker_outputs)[self._order]
+        if self.aggregation_fn is None:
+            return weighted_sum(stacked, self.weights_tensor)
+        return self.aggregation_fn(list(stacked.unbind(0)))
+
+    def close(self) -> None:
+        for conn in self._connections:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            conn.close()
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._connections, self._processes = [], []
+
+    def __enter__(self) -> "ParallelEnsemble":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,177 @@
+from pathlib import Path
+from typing import Iterable, Iterator, Mapping
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from blockassist.export import POLICY_CHECKPOINT_NAME, load_policy_weights
+
+
+class RunningWeightedMean:
+    """
+    Weighted mean of named tensors that are added one set at a time.
+
+    Only the running mean is kept, so memory does not grow with the number of
+    sets added. Floating tensors are averaged in at least float32; other
+    tensors, such as step counters, are taken from the first set.
+    """
+
+    def __init__(self):
+        self.mean: dict[str, torch.Tensor] | None = None
+        self.total_weight = 0.0
+        self.count = 0
+        self._dtypes: dict[str, torch.dtype] = {}
+
+    def add(self, tensors: Mapping[str, torch.Tensor | np.ndarray], weight: float = 1.0) -> None:
+        if weight < 0:
+            raise ValueError(f"Weights must not be negative, got {weight}")
+        tensors = {name: torch.as_tensor(value) for name, value in tensors.items()}
+        if self.mean is None:
+            self._dtypes = {name: value.dtype for name, value in tensors.items()}
+            self.mean = {
+                name: value.to(torch.promote_types(value.dtype, torch.float32), copy=True)
+                if value.is_floating_point()
+                else value.clone()
+                for name, value in tensors.items()
+            }
+            self.total_weight = weight
+            self.count = 1
+            return
+
+        if tensors.keys() != self.mean.keys():
+            missing = sorted(self.mean.keys() ^ tensors.keys())
+            raise ValueError(f"Set {self.count} does not match the first set: {missing}")
+        self.total_weight += weight
+        self.count += 1
+        if self.total_weight == 0:
+            return
+        fraction = weight / self.total_weight
+        for name, value in tensors.items():
+            mean = self.mean[name]
+            if value.shape != mean.shape:
+                raise ValueError(
+                    f"Set {self.count - 1} has shape {tuple(value.shape)} for {name!r}, "
+                    f"expected {tuple(mean.shape)}"
+                )
+            if mean.is_floating_point():
+                mean.add_(value.to(mean.dtype) - mean, alpha=fraction)
+
+    def result(self) -> dict[str, torch.Tensor]:
+        """The weighted mean, in the dtypes of the first set."""
+        if self.mean is None:
+            raise ValueError("No tensors were added")
+        if self.total_weight == 0:
+            raise ValueError("Weights must sum to a positive value")
+        return {name: mean.to(self._dtypes[name]) for name, mean in self.mean.items()}
+
+
+def _iter_weights(weights: Iterable[float] | None) -> Iterator[float]:
+    if weights is None:
+        while True:
+            yield 1.0
+    yield from weights
+
+
+def _zip_weights(items: Iterable, weights: Iterable[float] | None):
+    weights_iter = _iter_weights(weights)
+    for item in items:
+        try:
+            weight = next(weights_iter)
+        except StopIteration:
+            raise ValueError("Fewer weights than models were provided") from None
+        yield item, weight
+        del item
+
+
+def stream_average_state_dicts(
+    state_dicts: Iterable[Mapping[str, torch.Tensor | np.ndarray]],
+    weights: Iterable[float] | None = None,
+) -> dict[str, torch.Tensor]:
+    """
+    Averages the parameters of models loaded one at a time.
+
+    Args:
+        state_dicts: State dicts, typically a generator loading each one on
+            demand, so only one is held at a time
+        weights: Optional weight for each state dict. If None, equal weights are used
+
+    Returns:
+        The weighted average state dict
+    """
+    mean = RunningWeightedMean()
+    for state_dict, weight in _zip_weights(state_dicts, weights):
+        mean.add(state_dict, weight)
+    return mean.result()
+
+
+def stream_bagged_outputs(
+    models: Iterable[nn.Module],
+    *args,
+    weights: Iterable[float] | None = None,
+    **kwargs,
+) -> torch.Tensor:
+    """
+    Bags model outputs like bag_models, but with one model in memory at a time.
+
+    Args:
+        models: Models, typically a generator loading each one on demand
+        *args, **kwargs: Inputs passed to every model
+        weights: Optional weight for each model. If None, equal weights are used
+
+    Returns:
+        The weighted mean of the models' outputs
+    """
+    mean = RunningWeightedMean()
+    with torch.no_grad():
+        for model, weight in _zip_weights(models, weights):
+            model.eval()
+            mean.add({"output": model(*args, **kwargs)}, weight)
+            # Let the model be freed before the next one is loaded.
+            del model
+    return mean.result()["output"]
+
+
+def find_policy_checkpoints(root: Path, policy_id: str = "human") -> list[Path]:
+    """
+    Finds checkpoints or exports of a policy under root, such as a directory
+    of downloaded HuggingFace snapshots.
+    """
+    return sorted(
+        path.parents[2]
+        for path in root.rglob(f"policies/{policy_id}/{POLICY_CHECKPOINT_NAME}")
+    )
+
+
+def iter_policy_weights(
+    checkpoint_dirs: Iterable[Path], policy_id: str = "human"
+) -> Iterator[dict[str, np.ndarray]]:
+    """Loads the weights of a policy from each checkpoint, one at a time."""
+    for checkpoint_dir in checkpoint_dirs:
+        yield load_policy_weights(checkpoint_dir, policy_id)
+
+
+def stream_merge_policy_checkpoints(
+    root: Path,
+    policy_id: str = "human",
+    weights: Mapping[Path, float] | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Averages a policy's weights over all checkpoints under root.
+
+    Args:
+        root: Directory searched with find_policy_checkpoints
+        policy_id: Policy to merge
+        weights: Optional weight per checkpoint directory; missing ones get 1
+
+    Returns:
+        Weights that can be set with Policy.set_weights
+    """
+    checkpoint_dirs = find_policy_checkpoints(root, policy_id)
+    if not checkpoint_dirs:
+        raise FileNotFoundError(f"No checkpoints of policy {policy_id!r} under {root}")
+    merged = stream_average_state_dicts(
+        iter_policy_weights(checkpoint_dirs, policy_id),
+        [weights.get(d, 1.0) for d in checkpoint_dirs] if weights else None,
+    )
+    return {name: tensor.numpy() for name, tensor in merged.items()}
@@ -0,0 +1,155 @@
+import copy
+from typing import Sequence
+
+import torch
+import torch.nn as nn
+
+from blockassist.merging.bagging import bag_models, check_same_architecture
+
+MERGE_METHODS = ("average", "task_arithmetic", "ties")
+
+
+def _normalize_weights(weights: Sequence[float] | None, num_models: int) -> list[float]:
+    if weights is None:
+        return [1.0 / num_models] * num_models
+    if len(weights) != num_models:
+        raise ValueError(
+            f"Number of weights ({len(weights)}) must match number of models ({num_models})"
+        )
+    total = sum(weights)
+    if total <= 0:
+        raise ValueError("Weights must sum to a positive value")
+    return [w / total for w in weights]
+
+
+def _ties_merge(
+    task_vectors: torch.Tensor, weights: torch.Tensor, density: float
+) -> torch.Tensor:
+    """
+    Merges stacked task vectors as in TIES-Merging (Yadav et al., 2023).
+
+    Each task vector keeps only its top-density fraction of entries by
+    magnitude. Per entry, the sign with the larger total mass wins, and the
+    kept entries agreeing with it are averaged.
+    """
+    flat = task_vectors.reshape(task_vectors.shape[0], -1)
+    k = max(1, int(round(density * flat.shape[1])))
+    if k < flat.shape[1]:
+        threshold = flat.abs().kthvalue(flat.shape[1] - k + 1, dim=1, keepdim=True).values
+        flat = torch.where(flat.abs() >= threshold, flat, torch.zeros_like(flat))
+
+    weighted = flat * weights[:, None]
+    elected_sign = torch.sign(weighted.sum(dim=0))
+    agrees = (torch.sign(flat) == elected_sign) & (flat != 0)
+    agreeing_weight = (weights[:, None] * agrees).sum(dim=0)
+    merged = (weighted * agrees).sum(dim=0) / agreeing_weight.clamp(min=1e-12)
+    return merged.reshape(task_vectors.shape[1:])
+
+
+def merge_models(
+    models: Sequence[nn.Module],
+    method: str = "average",
+    weights: Sequence[float] | None = None,
+    base_model: nn.Module | None = None,
+    scaling: float = 1.0,
+    density: float = 0.2,
+) -> nn.Module:
+    """
+    Merges the parameters of models sharing an architecture into one model.
+
+    Unlike bag_models, the result costs a single model's memory and compute.
+
+    Args:
+        models: List of nn.Module instances to merge
+        method: One of MERGE_METHODS:
+            - "average": weighted average of the parameters
+            - "task_arithmetic": base_model plus scaling times the weighted
+              average of each model's difference from base_model
+            - "ties": like task_arithmetic, but the differences are trimmed to
+              their top density fraction and sign conflicts are resolved first
+        weights: Optional weights for each model, normalized to sum to 1. If
+            None, equal weights are used
+        base_model: Model the others were fine-tuned from; required for
+            task_arithmetic and ties
+        scaling: Scale of the merged task vector
+        density: Fraction of each task vector kept by ties
+
+    Returns:
+        A new model with the merged parameters; the inputs are not modified
+    """
+    if not models:
+        raise ValueError("At least one model must be provided")
+    if method not in MERGE_METHODS:
+        raise ValueError(f"Unknown merge method {method!r}, expected one of {MERGE_METHODS}")
+    if method != "average" and base_model is None:
+        raise ValueError(f"Merge method {method!r} requires a base_model")
+    if not 0 < density <= 1:
+        raise ValueError(f"density must be in (0, 1], got {density}")
+
+    check_same_architecture([*models, base_model] if base_model is not None else models)
+    weights_tensor = torch.tensor(_normalize_weights(weights, len(models)))
+
+    merged_model = copy.deepcopy(base_model if base_model is not None else models[0])
+    state_dicts = [model.state_dict() for model in models]
+    base_state = merged_model.state_dict()
+    merged_state = {}
+    for name, base_tensor in base_state.items():
+        if not base_tensor.is_floating_point():
+            # Counters such as BatchNorm's num_batches_tracked.
+            merged_state[name] = base_tensor
+            continue
+        stacked = torch.stack([sd[name].to(torch.float32) for sd in state_dicts])
+        weights_view = weights_tensor.view(-1, *[1] * (stacked.dim() - 1))
+        if method == "average":
+            merged = (stacked * weights_view).sum(dim=0)
+        else:
+            task_vectors = stacked - base_tensor.to(torch.float32)
+            if method == "task_arithmetic":
+                task_vector = (task_vectors * weights_view).sum(dim=0)
+            else:
+                task_vector = _ties_merge(task_vectors, weights_tensor, density)
+            merged = base_tensor.to(torch.float32) + scaling * task_vector
+        merged_state[name] = merged.to(base_tensor.dtype)
+
+    merged_model.load_state_dict(merged_state)
+    return merged_model.eval()
+
+
+def compare_with_bagging(
+    merged_model: nn.Module,
+    models: Sequence[nn.Module],
+    sample_inputs: Sequence,
+    weights: Sequence[float] | None = None,
+    tolerance: float | None = None,
+) -> float:
+    """
+    Compares a merged model with bagging the models it was merged from.
+
+    Args:
+        merged_model: Result of merge_models
+        models: The merged models
+        sample_inputs: Inputs, such as batches of observations, to compare on;
+            tuples are unpacked into positional arguments
+        weights: Weights the models were merged with
+        tolerance: If given, the largest allowed difference
+
+    Returns:
+        The largest absolute difference between the outputs
+
+    Raises:
+        ValueError: If the difference is above tolerance
+    """
+    bagged = bag_models(models, weights=_normalize_weights(weights, len(models)))
+    merged_model.eval()
+    max_diff = 0.0
+    with torch.no_grad():
+        for inputs in sample_inputs:
+            args = inputs if isinstance(inputs, tuple) else (inputs,)
+            diff = (merged_model(*args) - bagged(*args)).abs().max().item()
+            max_diff = max(max_diff, diff)
+    if tolerance is not None and max_diff > tolerance:
+        raise ValueError(
+            f"Merged model differs from bagging by {max_diff:.3g}, "
+            f"more than the tolerance of {tolerance:.3g}"
+        )
+    return max_diff
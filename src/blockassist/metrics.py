@@ -0,0 +1,221 @@
+"""Training throughput metrics, written as one JSON object per line.
+
+Every TrainingRunner run appends a ``start`` event followed by:
+
+- ``phase`` events for conversion, trainer_setup (ray workers and the offline
+  input reader) and checkpoint_write, each with its duration, CPU use and
+  memory;
+- an ``iteration`` event per training iteration with samples/sec;
+- a ``stopping`` event with the best validation loss and why training
+  stopped, when a time budget or validation_prop is set;
+- a closing ``summary`` event.
+
+``phase_start`` events are written as phases begin, so the file doubles as a
+live progress feed that run.py renders while training runs.
+
+cpu_percent follows top's convention: 100 means one core fully busy. CPU time
+and memory cover this process and its child processes, not ray's workers.
+"""
+
+import datetime
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import psutil
+from ray.tune.logger import DEFAULT_LOGGERS, Logger, UnifiedLogger
+
+from blockassist.globals import get_logger
+
+_LOG = get_logger()
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+_MAXRSS_TO_MB = 1 / 1024 / 1024 if sys.platform == "darwin" else 1 / 1024
+
+_ACTIVE_METRICS: "TrainingMetrics | None" = None
+
+
+def _cpu_seconds(process: psutil.Process) -> float:
+    times = process.cpu_times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _rss_mb(process: psutil.Process) -> float:
+    rss = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            rss += child.memory_info().rss
+        except psutil.Error:
+            continue
+    return rss / 1024 / 1024
+
+
+def _peak_rss_mb() -> float:
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return peak * _MAXRSS_TO_MB
+
+
+class TrainingMetrics:
+    """Collects per-phase and per-iteration metrics of one training run.
+
+    Events are appended to path as they happen. Without a path they are only
+    kept in ``events``.
+    """
+
+    def __init__(self, path: Path | None = None):
+        self.path = path
+        self.events: list[dict] = []
+        self._process = psutil.Process()
+        self._start_time = time.monotonic()
+        self._trainer_created_time = None
+        self._last_result_time = None
+        self._samples = 0
+        self._train_seconds = 0.0
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+    def record(self, event: str, **fields) -> dict:
+        entry = {
+            "event": event,
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            **fields,
+        }
+        self.events.append(entry)
+        if self.path is not None:
+            try:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(entry) + "\n")
+            except OSError as e:
+                _LOG.warning(f"Could not write training metrics to {self.path}: {e}")
+        return entry
+
+    def _resources(self, wall_seconds: float, cpu_start: float) -> dict:
+        cpu_seconds = _cpu_seconds(self._process) - cpu_start
+        return {
+            "duration_s": round(wall_seconds, 3),
+            "cpu_percent": round(100 * cpu_seconds / wall_seconds, 1)
+            if wall_seconds > 0
+            else 0.0,
+            "rss_mb": round(_rss_mb(self._process), 1),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+        }
+
+    @contextmanager
+    def phase(self, name: str):
+        """Times the enclosed block as phase name."""
+        self.record("phase_start", phase=name)
+        start = time.monotonic()
+        cpu_start = _cpu_seconds(self._process)
+        try:
+            yield
+        finally:
+            self.record(
+                "phase", phase=name, **self._resources(time.monotonic() - start, cpu_start)
+            )
+
+    @contextmanager
+    def activate(self):
+        """Routes results of RLlib trainers built in the enclosed block here."""
+        global _ACTIVE_METRICS
+        previous, _ACTIVE_METRICS = _ACTIVE_METRICS, self
+        try:
+            yield self
+        finally:
+            _ACTIVE_METRICS = previous
+
+    def on_trainer_created(self) -> None:
+        self._trainer_created_time = time.monotonic()
+        self.record("phase_start", phase="trainer_setup")
+
+    def on_train_result(self, result: dict) -> None:
+        now = time.monotonic()
+        iter_seconds = result.get("time_this_iter_s") or 0.0
+        if self._last_result_time is None and self._trainer_created_time is not None:
+            # Everything between building the trainer and the first iteration.
+            setup_seconds = max(now - iter_seconds - self._trainer_created_time, 0.0)
+            self.record(
+                "phase",
+                phase="trainer_setup",
+                duration_s=round(setup_seconds, 3),
+                rss_mb=round(_rss_mb(self._process), 1),
+                peak_rss_mb=round(_peak_rss_mb(), 1),
+            )
+        self._last_result_time = now
+        self._cpu_at_last_result = _cpu_seconds(self._process)
+
+        samples = (
+            result.get("num_env_steps_trained_this_iter")
+            or result.get("num_agent_steps_trained_this_iter")
+            or 0
+        )
+        self._samples += samples
+        self._train_seconds += iter_seconds
+        self.record(
+            "iteration",
+            iteration=result.get("training_iteration"),
+            duration_s=round(iter_seconds, 3),
+            samples=samples,
+            samples_per_s=round(samples / iter_seconds, 1) if iter_seconds > 0 else 0.0,
+            rss_mb=round(_rss_mb(self._process), 1),
+            peak_rss_mb=round(_peak_rss_mb(), 1),
+        )
+
+    def on_trainer_closed(self) -> None:
+        # RLlib closes its loggers when the trainer stops, right after mbag
+        # saves the final checkpoint.
+        if self._last_result_time is None:
+            return
+        self.record(
+            "phase",
+            phase="checkpoint_write",
+            **self._resources(
+                time.monotonic() - self._last_result_time, self._cpu_at_last_result
+            ),
+        )
+
+    def summary(self, **fields) -> dict:
+        return self.record(
+            "summary",
+            duration_s=round(time.monotonic() - self._start_time, 3),
+            samples=self._samples,
+            samples_per_s=round(self._samples / self._train_seconds, 1)
+            if self._train_seconds > 0
+            else 0.0,
+            peak_rss_mb=round(_peak_rss_mb(), 1),
+            **fields,
+        )
+
+
+class _MetricsLogger(Logger):
+    """RLlib logger forwarding trainer results to the active TrainingMetrics."""
+
+    def _init(self):
+        if _ACTIVE_METRICS is not None:
+            _ACTIVE_METRICS.on_trainer_created()
+
+    def on_result(self, result: dict):
+        if _ACTIVE_METRICS is not None:
+            _ACTIVE_METRICS.on_train_result(result)
+
+    def close(self):
+        if _ACTIVE_METRICS is not None:
+            _ACTIVE_METRICS.on_trainer_closed()
+
+
+def build_logger_creator(experiment_dir: str):
+    """Drop-in for mbag's build_logger_creator that also reports to metrics."""
+
+    def logger_creator(config):
+        os.makedirs(experiment_dir, exist_ok=True)
+        return UnifiedLogger(
+            config, experiment_dir, loggers=[*DEFAULT_LOGGERS, _MetricsLogger]
+        )
+
+    return logger_creator
@@ -0,0 +1,204 @@
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import sys
+import time
+from pathlib import Path
+
+from blockassist.globals import get_logger
+
+_LOG = get_logger()
+
+# Files the sacred FileStorageObserver and mbag's evaluate script leave in a
+# finished run directory.
+REQUIRED_RUN_FILES = ["config.json", "episodes.zip", "metrics.json", "run.json"]
+
+# Sacred statuses after which nothing else is written to the run directory.
+_FINISHED_STATUSES = {"COMPLETED", "FAILED", "INTERRUPTED", "TIMEOUT"}
+
+# Sacred rewrites run.json on every heartbeat (10s by default), so a RUNNING
+# run that has not been touched for this long belongs to a dead process.
+_STALE_RUN_SECONDS = 120
+
+_POLL_INTERVAL_SECONDS = 0.5
+
+# inotify(7) event mask: anything that can turn a run directory complete.
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_INOTIFY_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+
+
+class AbandonedRunError(RuntimeError):
+    """Raised when a run in an evaluate directory will never finish."""
+
+
+def get_run_dirs(evaluate_dir: Path) -> list[Path]:
+    """Returns the sacred run directories in evaluate_dir.
+
+    evaluate_dir is either an ``evaluate_*`` directory holding numbered runs,
+    or one of those numbered run directories itself.
+    """
+    if (evaluate_dir / "run.json").exists() or evaluate_dir.name.isdigit():
+        return [evaluate_dir]
+    return [d for d in evaluate_dir.iterdir() if d.is_dir() and d.name.isdigit()]
+
+
+def _read_run_status(run_dir: Path) -> tuple[str | None, float]:
+    run_json = run_dir / "run.json"
+    try:
+        # A run.json caught mid-write fails to parse and is simply not ready yet.
+        status = json.loads(run_json.read_text()).get("status")
+        mtime = run_json.stat().st_mtime
+    except (OSError, ValueError):
+        return None, 0.0
+    return status, mtime
+
+
+def get_abandoned_reason(run_dir: Path) -> str | None:
+    """Why run_dir will never become finished, or None if it still may.
+
+    That is a RUNNING run whose process stopped heartbeating, or a finished
+    run missing files that are written before sacred records its status.
+    """
+    status, mtime = _read_run_status(run_dir)
+    if status == "RUNNING" and time.time() - mtime > _STALE_RUN_SECONDS:
+        return "stopped heartbeating"
+    if status in _FINISHED_STATUSES:
+        missing = [f for f in REQUIRED_RUN_FILES if not (run_dir / f).exists()]
+        if missing:
+            return f"{status.lower()} without {missing}"
+    return None
+
+
+def is_run_dir_finished(run_dir: Path) -> bool:
+    """True once run_dir has a finished run.json and all REQUIRED_RUN_FILES."""
+    status, _ = _read_run_status(run_dir)
+    if status not in _FINISHED_STATUSES:
+        return False
+    return all((run_dir / f).exists() for f in REQUIRED_RUN_FILES)
+
+
+def get_abandoned_run_dirs(evaluate_dir: Path) -> dict[Path, str]:
+    """Runs of evaluate_dir that will never finish, with the reason for each."""
+    try:
+        run_dirs = get_run_dirs(evaluate_dir)
+    except OSError:
+        return {}
+    reasons = {d: get_abandoned_reason(d) for d in run_dirs}
+    return {d: reason for d, reason in reasons.items() if reason}
+
+
+def is_evaluate_dir_ready(evaluate_dir: Path) -> bool:
+    """True once evaluate_dir has at least one run and every run has finished."""
+    try:
+        run_dirs = get_run_dirs(evaluate_dir)
+    except OSError:
+        return False
+    return bool(run_dirs) and all(is_run_dir_finished(d) for d in run_dirs)
+
+
+class _Inotify:
+    """Minimal inotify(7) wrapper used only to wake up when files change."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def watch(self, path: Path) -> None:
+        # Re-adding an existing watch is a no-op; vanished paths are ignored.
+        self._libc.inotify_add_watch(self.fd, os.fsencode(path), _INOTIFY_MASK)
+
+    def wait(self, timeout: float) -> None:
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if readable:
+            try:
+                while os.read(self.fd, 64 * 1024):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def _get_watch_paths(evaluate_dir: Path) -> list[Path]:
+    # Until evaluate_dir exists, watch its nearest existing ancestor.
+    if not evaluate_dir.exists():
+        parent = evaluate_dir.parent
+        while not parent.exists() and parent != parent.parent:
+            parent = parent.parent
+        return [parent]
+    try:
+        return [evaluate_dir, *get_run_dirs(evaluate_dir)]
+    except OSError:
+        return [evaluate_dir]
+
+
+def _open_inotify() -> _Inotify | None:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        return _Inotify()
+    except (OSError, AttributeError) as e:
+        _LOG.debug(f"inotify unavailable, polling instead: {e}")
+        return None
+
+
+def wait_for_evaluate_dir(evaluate_dir: Path, timeout: float = 180) -> None:
+    """Blocks until every sacred run in evaluate_dir has finished writing.
+
+    Uses inotify on Linux to re-check as soon as anything under evaluate_dir
+    changes, and polls elsewhere.
+
+    Raises:
+        FileNotFoundError: If evaluate_dir was not created within timeout.
+        TimeoutError: If evaluate_dir exists but its runs did not finish in time.
+        AbandonedRunError: As soon as a run is found that will never finish.
+    """
+    deadline = time.monotonic() + timeout
+    inotify = _open_inotify()
+    try:
+        while not is_evaluate_dir_ready(evaluate_dir):
+            abandoned = get_abandoned_run_dirs(evaluate_dir)
+            if abandoned:
+                reasons = ", ".join(f"run {d.name} {r}" for d, r in abandoned.items())
+                raise AbandonedRunError(
+                    f"Evaluation directory will never be ready: {evaluate_dir} ({reasons})"
+                )
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                if not evaluate_dir.exists():
+                    raise FileNotFoundError(
+                        f"Evaluation directory does not exist after waiting {timeout}s: {evaluate_dir}"
+                    )
+                raise TimeoutError(
+                    f"Evaluation directory runs did not finish after waiting {timeout}s: {evaluate_dir}"
+                )
+
+            _LOG.info(
+                f"Waiting for evaluation directory to be ready: {evaluate_dir} "
+                f"({timeout - remaining:.1f}s/{timeout}s)"
+            )
+            if inotify:
+                for path in _get_watch_paths(evaluate_dir):
+                    inotify.watch(path)
+                # Re-check once after adding watches to close the race with
+                # changes that happened before they existed.
+                if is_evaluate_dir_ready(evaluate_dir):
+                    break
+                inotify.wait(min(remaining, _POLL_INTERVAL_SECONDS * 10))
+            else:
+                time.sleep(min(remaining, _POLL_INTERVAL_SECONDS))
+    finally:
+        if inotify:
+            inotify.close()
@@ -0,0 +1,146 @@
+import json
+import os
+from collections import Counter
+from pathlib import Path
+
+from blockassist.globals import get_logger
+from blockassist.readiness import REQUIRED_RUN_FILES
+
+_LOG = get_logger()
+
+_INDEX_VERSION = 1
+_SESSION_INDEX_NAME = "session_index.json"
+
+
+def get_last_goal_percentage_min(result: dict) -> float:
+    # Find the highest numbered goal_percentage_x_min key
+    goal_percentage_keys = [key for key in result if key.startswith("goal_percentage_")]
+    if not goal_percentage_keys:
+        return 0.0
+
+    # Extract the minute values and find the maximum
+    max_x = max(int(key.split("_")[-2]) for key in goal_percentage_keys)
+    return result[f"goal_percentage_{max_x}_min"]
+
+
+def _read_json(path: Path) -> dict:
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _index_run_dir(run_dir: Path) -> dict:
+    valid = all((run_dir / file).exists() for file in REQUIRED_RUN_FILES)
+    entry = {"mtime_ns": run_dir.stat().st_mtime_ns, "valid": valid}
+    if not valid:
+        return entry
+
+    config = _read_json(run_dir / "config.json")
+    run = _read_json(run_dir / "run.json")
+    metrics = _read_json(run_dir / "metrics.json")
+    entry["quest"] = config.get("goal_generator_name") or "unknown"
+    entry["date"] = (run.get("start_time") or "unknown")[:10]
+    entry["goal_percentage"] = get_last_goal_percentage_min(
+        metrics.get("mean_metrics") or {}
+    )
+    return entry
+
+
+class SessionIndex:
+    """Persisted index of the recorded sessions in a checkpoint directory.
+
+    Each evaluate_ directory is cached with its mtime and its numbered run
+    directories. refresh() only rescans directories whose mtime changed or
+    which still had incomplete runs, since finished runs are never modified.
+    """
+
+    def __init__(self, checkpoint_path: Path):
+        self.checkpoint_path = checkpoint_path
+        self.path = checkpoint_path / _SESSION_INDEX_NAME
+        self._evaluate_dirs: dict[str, dict] = {}
+
+        if self.path.exists():
+            data = _read_json(self.path)
+            if data.get("version") == _INDEX_VERSION:
+                self._evaluate_dirs = data.get("evaluate_dirs", {})
+
+    def _is_current(self, evaluate_dir: Path, entry: dict | None) -> bool:
+        return (
+            entry is not None
+            and entry["mtime_ns"] == evaluate_dir.stat().st_mtime_ns
+            and all(run["valid"] for run in entry["runs"].values())
+        )
+
+    def _index_evaluate_dir(self, evaluate_dir: Path, entry: dict | None) -> dict:
+        cached_runs = entry["runs"] if entry else {}
+        runs = {}
+        for item in evaluate_dir.iterdir():
+            if not (item.is_dir() and item.name.isdigit()):
+                # Not a valid run directory.
+                continue
+            cached = cached_runs.get(item.name)
+            if cached and cached["mtime_ns"] == item.stat().st_mtime_ns:
+                runs[item.name] = cached
+            else:
+                runs[item.name] = _index_run_dir(item)
+        return {"mtime_ns": evaluate_dir.stat().st_mtime_ns, "runs": runs}
+
+    def refresh(self, evaluate_dirs: list[Path]) -> "SessionIndex":
+        """Brings the index up to date with evaluate_dirs and saves it."""
+        refreshed = {}
+        changed = set(self._evaluate_dirs) != {d.name for d in evaluate_dirs}
+        for evaluate_dir in evaluate_dirs:
+            entry = self._evaluate_dirs.get(evaluate_dir.name)
+            try:
+                if not self._is_current(evaluate_dir, entry):
+                    entry = self._index_evaluate_dir(evaluate_dir, entry)
+                    changed = True
+            except (OSError, PermissionError) as e:
+                _LOG.warning(f"Could not access evaluate directory {evaluate_dir}: {e}")
+                continue
+            refreshed[evaluate_dir.name] = entry
+
+        self._evaluate_dirs = refreshed
+        if changed:
+            self._save()
+        return self
+
+    def _save(self) -> None:
+        tmp_path = self.path.with_suffix(".tmp")
+        try:
+            tmp_path.write_text(
+                json.dumps(
+                    {"version": _INDEX_VERSION, "evaluate_dirs": self._evaluate_dirs}
+                )
+            )
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            _LOG.warning(f"Could not save session index {self.path}: {e}")
+
+    def _sessions(self) -> list[dict]:
+        return [
+            run
+            for entry in self._evaluate_dirs.values()
+            for run in entry["runs"].values()
+            if run["valid"]
+        ]
+
+    def total_sessions(self) -> int:
+        return len(self._sessions())
+
+    def sessions_per_evaluate_dir(self) -> dict[str, int]:
+        return {
+            name: sum(run["valid"] for run in entry["runs"].values())
+            for name, entry in self._evaluate_dirs.items()
+        }
+
+    def sessions_per_quest(self) -> dict[str, int]:
+        return dict(Counter(run["quest"] for run in self._sessions()))
+
+    def sessions_per_date(self) -> dict[str, int]:
+        return dict(Counter(run["date"] for run in self._sessions()))
+
+    def total_goal_percentage(self) -> float:
+        return sum(run["goal_percentage"] for run in self._sessions())
@@ -1,15 +1,29 @@
 import asyncio
+import dataclasses
+import functools
+import multiprocessing
 import os
 import shutil
+import signal
+import tempfile
 import time
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
+from typing import Collection
 
+import mbag.scripts.convert_human_data_to_rllib as convert_script
+import mbag.scripts.train as train_script
+import torch
 from mbag.environment.goals import ALL_GOAL_GENERATORS
 from mbag.scripts.convert_human_data_to_rllib import ex as convert_ex
 from mbag.scripts.train import ex as train_ex
 from sacred.observers import FileStorageObserver
 
-from blockassist import telemetry
+from blockassist import early_stopping, episode_store, metrics, telemetry
+from blockassist.autotune import TrainSettings, tune_train_settings
+from blockassist.binary_shards import register_binary_input, write_binary_shards
+from blockassist.continual import CONTINUAL_STATE_NAME, ContinualTrainingState
+from blockassist.convert_cache import convert_episodes_cached, precompute_shards
 from blockassist.globals import (
     _DEFAULT_CHECKPOINT,
     get_identifier,
@@ -20,40 +34,251 @@ from blockassist.goals.generator import BlockAssistGoalGenerator
 _LOG = get_logger()
 
 convert_ex.observers.append(FileStorageObserver.create("convert_runs"))
+# Lets the converter read stored episodes; zip files are still loaded by mbag.
+convert_script.load_episode = episode_store.load_episode
 train_ex.observers.append(FileStorageObserver.create("train_runs"))
 
+# Calibration runs are kept short: a couple of small iterations, timing the last.
+_CALIBRATION_ITERS = 2
+_CALIBRATION_BATCH_SIZE = 1024
+# Reports every training iteration to the active TrainingMetrics.
+train_script.build_logger_creator = metrics.build_logger_creator
+# Lets the active TrainingStopper end training early and keep the best checkpoint.
+train_script.MbagCallbacks = early_stopping.StoppingCallbacks
 
-def run_train_main(mbag_config: dict, rllib_path: str, num_training_iters: int):
+
+def run_train_main(
+    mbag_config: dict,
+    rllib_path: str,
+    num_training_iters: int,
+    checkpoint_path: str | None = None,
+    train_settings: TrainSettings | None = None,
+    binary_shards: bool = False,
+    validation_prop: float = 0.0,
+):
     ALL_GOAL_GENERATORS["blockassist"] = BlockAssistGoalGenerator
+    # rllib_path holds either the converter's JSON files or binary shards.
+    rllib_input = register_binary_input(rllib_path) if binary_shards else rllib_path
+    config_updates = {
+        "data_split": "human_with_assistant",
+        "goal_generator": "blockassist",
+        "input": rllib_input,
+        "num_training_iters": num_training_iters,
+    }
+    if checkpoint_path:
+        # Resumes weights and trainer state from a previous run.
+        config_updates["checkpoint_path"] = checkpoint_path
+    if train_settings:
+        # bc_human learns in this process, so its threads are set here.
+        torch.set_num_threads(train_settings.torch_threads)
+        config_updates.update(train_settings.config_updates())
+    if validation_prop:
+        # mbag holds this share of the episodes in every batch out of training.
+        config_updates["validation_prop"] = validation_prop
     result = train_ex.run(
         named_configs=["bc_human"],
-        config_updates={
-            "data_split": "human_with_assistant",
-            "goal_generator": "blockassist",
-            "input": rllib_path,
-            "num_training_iters": num_training_iters,
-        },
+        config_updates=config_updates,
     ).result
     assert result
     return result
 
 
+# Convert settings shared by the named configs below. They are also part of
+# the conversion cache key, so changing them reconverts every episode.
+_BLOCKASSIST_CONVERT_CONFIG = {"max_seq_len": 32, "inventory_player_indices": [0, 1]}
+
+
 @convert_ex.named_config
 def blockassist_convert():
-    max_seq_len = 32  # noqa: F841
-    inventory_player_indices = [0, 1]  # noqa: F841
+    max_seq_len = _BLOCKASSIST_CONVERT_CONFIG["max_seq_len"]  # noqa: F841
+    inventory_player_indices = _BLOCKASSIST_CONVERT_CONFIG["inventory_player_indices"]  # noqa: F841
 
     data_dir = _DEFAULT_CHECKPOINT
     data_glob = os.path.join(data_dir, "evaluate_*", "**", "episodes.zip")  # noqa: F841
     out_dir = os.path.join(data_dir, "..", "rllib")  # noqa: F841
 
 
-def run_convert_main():
-    result = convert_ex.run(named_configs=["blockassist_convert"]).result
+@convert_ex.named_config
+def blockassist_convert_store():
+    max_seq_len = _BLOCKASSIST_CONVERT_CONFIG["max_seq_len"]  # noqa: F841
+    inventory_player_indices = _BLOCKASSIST_CONVERT_CONFIG["inventory_player_indices"]  # noqa: F841
+
+    data_dir = os.path.join(_DEFAULT_CHECKPOINT, episode_store.EPISODE_STORE_NAME)
+    data_glob = os.path.join(  # noqa: F841
+        data_dir, "evaluate_*", "**", episode_store.EPISODE_META_NAME
+    )
+    out_dir = os.path.join(_DEFAULT_CHECKPOINT, "..", "rllib")  # noqa: F841
+
+
+def _get_convert_named_config(use_episode_store: bool) -> str:
+    if use_episode_store:
+        return "blockassist_convert_store"
+    return "blockassist_convert"
+
+
+def run_convert_main(use_episode_store: bool = False):
+    result = convert_ex.run(
+        named_configs=[_get_convert_named_config(use_episode_store)]
+    ).result
+    assert result
+    return result
+
+
+def _convert_episode(
+    named_config: str, data_dir: str, episode_fname: str, out_dir: str
+) -> dict:
+    # Module level so it can be sent to worker processes.
+    result = convert_ex.run(
+        named_configs=[named_config],
+        config_updates={
+            "data_dir": data_dir,
+            "data_glob": episode_fname,
+            "out_dir": out_dir,
+        },
+    ).result
     assert result
     return result
 
 
+def _get_episode_file_name(use_episode_store: bool) -> str:
+    if use_episode_store:
+        return episode_store.EPISODE_META_NAME
+    return "episodes.zip"
+
+
+def _get_convert_data(checkpoint_dir: str, use_episode_store: bool) -> tuple[str, str]:
+    """Returns the data_dir and data_glob the converter reads episodes from."""
+    data_dir = checkpoint_dir
+    if use_episode_store:
+        data_dir = os.path.join(checkpoint_dir, episode_store.EPISODE_STORE_NAME)
+    data_glob = os.path.join(
+        data_dir, "evaluate_*", "**", _get_episode_file_name(use_episode_store)
+    )
+    return data_dir, data_glob
+
+
+def _get_convert_cache_dir(checkpoint_dir: str) -> str:
+    return os.path.join(checkpoint_dir, "..", "rllib_cache")
+
+
+def _get_binary_shard_dir(checkpoint_dir: str) -> str:
+    return os.path.join(checkpoint_dir, "..", "rllib_binary")
+
+
+def run_sharded_convert_main(
+    checkpoint_dir: str,
+    use_episode_store: bool = False,
+    max_workers: int = 1,
+    use_cache: bool = True,
+    exclude_keys: Collection[str] = (),
+):
+    """Like run_convert_main, but converts every episode separately.
+
+    The episodes are converted across max_workers processes and merged into
+    the same out_dir. With use_cache, converted episodes are kept between
+    runs in rllib_cache/ and only new or changed episodes are converted.
+    Episodes whose conversion cache key is in exclude_keys are left out.
+    """
+    data_dir, data_glob = _get_convert_data(checkpoint_dir, use_episode_store)
+    out_dir = os.path.join(checkpoint_dir, "..", "rllib")
+    convert_episode = functools.partial(
+        _convert_episode, _get_convert_named_config(use_episode_store)
+    )
+
+    def convert(cache_dir: str) -> dict:
+        return convert_episodes_cached(
+            data_dir=data_dir,
+            data_glob=data_glob,
+            out_dir=out_dir,
+            cache_dir=cache_dir,
+            convert_config=_BLOCKASSIST_CONVERT_CONFIG,
+            convert_episode=convert_episode,
+            max_workers=max_workers,
+            exclude_keys=exclude_keys,
+        )
+
+    if use_cache:
+        return convert(_get_convert_cache_dir(checkpoint_dir))
+    # The shards are hard-linked into out_dir, so they outlive the directory.
+    with tempfile.TemporaryDirectory(dir=os.path.join(checkpoint_dir, "..")) as cache_dir:
+        return convert(cache_dir)
+
+
+def _ignore_sigint():
+    # run.py stops recording by sending SIGINT to every python process under
+    # the launcher, which must not kill a conversion in progress.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _precompute_evaluate_dir(
+    checkpoint_dir: str, evaluate_dir: str, use_episode_store: bool
+) -> list[str]:
+    # Runs in the background converter's process.
+    if use_episode_store:
+        episode_store.migrate_checkpoint(checkpoint_dir)
+    data_dir, _ = _get_convert_data(checkpoint_dir, use_episode_store)
+    # The cache keys use paths relative to data_dir, the same as in training.
+    rel_dir = Path(evaluate_dir).resolve().relative_to(Path(checkpoint_dir).resolve())
+    episode_paths = sorted(
+        (Path(data_dir) / rel_dir).glob(f"**/{_get_episode_file_name(use_episode_store)}")
+    )
+    return precompute_shards(
+        data_dir,
+        episode_paths,
+        _get_convert_cache_dir(checkpoint_dir),
+        _BLOCKASSIST_CONVERT_CONFIG,
+        functools.partial(_convert_episode, _get_convert_named_config(use_episode_store)),
+    )
+
+
+class BackgroundConverter:
+    """Converts recorded episodes into the conversion cache while recording continues.
+
+    Episodes are converted one at a time in a separate process, so conversion
+    does not compete with the game for this process. The train stage then
+    finds every episode already converted in rllib_cache/.
+    """
+
+    def __init__(self, checkpoint_dir: str, use_episode_store: bool = False):
+        self.checkpoint_dir = checkpoint_dir
+        self.use_episode_store = use_episode_store
+        self._executor = None
+        self._futures: dict[Future, Path] = {}
+
+    def submit(self, evaluate_dir: Path) -> Future:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_ignore_sigint,
+            )
+        _LOG.info(f"Converting {evaluate_dir} in the background")
+        future = self._executor.submit(
+            _precompute_evaluate_dir,
+            self.checkpoint_dir,
+            str(evaluate_dir),
+            self.use_episode_store,
+        )
+        self._futures[future] = evaluate_dir
+        return future
+
+    def wait(self) -> None:
+        """Waits for the submitted episodes; failures are left to the train stage."""
+        for future, evaluate_dir in list(self._futures.items()):
+            try:
+                keys = future.result()
+                _LOG.info(f"Converted {len(keys)} episodes of {evaluate_dir} in the background")
+            except Exception:
+                _LOG.exception(f"Background conversion of {evaluate_dir} failed")
+        self._futures.clear()
+
+    def shutdown(self) -> None:
+        self.wait()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
 class TrainingRunner:
     """Class for managing a Minecraft bot training session."""
 
@@ -62,8 +287,31 @@ class TrainingRunner:
         address_eoa: str,
         num_training_iters: int = 1,
         checkpoint_dir=_DEFAULT_CHECKPOINT,
+        use_episode_store: bool = False,
+        use_convert_cache: bool = False,
+        convert_workers: int = 1,
+        continual: bool = False,
+        metrics_path: str | None = None,
+        train_autotune: str = "off",
+        binary_shards: bool = False,
+        time_budget_min: float | None = None,
+        validation_prop: float = 0.0,
+        early_stopping_patience: int = 0,
     ):
         self.address_eoa = address_eoa
+        self.use_episode_store = use_episode_store
+        self.use_convert_cache = use_convert_cache
+        self.convert_workers = convert_workers
+        self.continual = continual
+        self.resume_checkpoint = None
+        self.train_autotune = train_autotune
+        self.binary_shards = binary_shards
+        self.time_budget_min = time_budget_min
+        self.validation_prop = validation_prop
+        self.early_stopping_patience = early_stopping_patience
+        self.metrics = metrics.TrainingMetrics(
+            Path(metrics_path) if metrics_path else None
+        )
 
         self.num_training_iters = num_training_iters
         self.checkpoint_dir = checkpoint_dir
@@ -85,10 +333,119 @@ class TrainingRunner:
         _LOG.info("Training started.")
         self.training_started.set()
 
+        self.metrics.record("start", num_training_iters=self.num_training_iters)
         _LOG.info("Conversion started!")
+        with self.metrics.phase("conversion"):
+            self._convert()
+            if self.binary_shards:
+                self.convert_result["binary_dir"] = write_binary_shards(
+                    self.convert_result["out_dir"],
+                    _get_binary_shard_dir(self.checkpoint_dir),
+                )
+
+    def _convert(self):
+        if self.use_episode_store:
+            episode_store.migrate_checkpoint(self.checkpoint_dir)
+        if self.continual:
+            # Episodes are told apart by their conversion cache keys, so
+            # continual training always converts them separately.
+            identifier = get_identifier(self.address_eoa)
+            state = self._get_continual_state()
+            self.resume_checkpoint = state.get_last_checkpoint(identifier)
+            self.convert_result = run_sharded_convert_main(
+                self.checkpoint_dir,
+                self.use_episode_store,
+                max_workers=self.convert_workers,
+                use_cache=self.use_convert_cache,
+                exclude_keys=state.get_trained_episodes(identifier),
+            )
+            return
+        if self.use_convert_cache or self.convert_workers > 1:
+            self.convert_result = run_sharded_convert_main(
+                self.checkpoint_dir,
+                self.use_episode_store,
+                max_workers=self.convert_workers,
+                use_cache=self.use_convert_cache,
+            )
+            return
+
         rllib_path = Path(self.checkpoint_dir) / ".." / "rllib"
         shutil.rmtree(rllib_path, ignore_errors=True)
-        self.convert_result = run_convert_main()
+        self.convert_result = run_convert_main(self.use_episode_store)
+
+    def _get_continual_state(self) -> ContinualTrainingState:
+        return ContinualTrainingState(
+            Path(self.checkpoint_dir) / ".." / CONTINUAL_STATE_NAME
+        )
+
+    def _train(self):
+        if self.continual and self.convert_result["session_count"] == 0:
+            _LOG.info("No sessions added since the last training run, skipping training.")
+            return
+
+        rllib_path, train_kwargs = self._get_train_input()
+        if self.train_autotune != "off":
+            with self.metrics.phase("autotune"):
+                train_kwargs["train_settings"] = tune_train_settings(
+                    self.train_autotune,
+                    Path(self.checkpoint_dir) / ".." / "train_autotune.json",
+                    self._calibrate,
+                )
+        if self.resume_checkpoint:
+            _LOG.info(f"Resuming training from {self.resume_checkpoint}")
+            train_kwargs["checkpoint_path"] = self.resume_checkpoint
+        if self.validation_prop:
+            train_kwargs["validation_prop"] = self.validation_prop
+        stopper = early_stopping.TrainingStopper(
+            time_budget_s=self.time_budget_min * 60 if self.time_budget_min else None,
+            patience=self.early_stopping_patience if self.validation_prop else 0,
+        )
+        with self.metrics.activate(), stopper.activate(), self.metrics.phase("training"):
+            result = run_train_main(
+                mbag_config=self.convert_result["mbag_config"],
+                rllib_path=rllib_path,
+                num_training_iters=self.num_training_iters,
+                **train_kwargs,
+            )
+        self.model_dir = stopper.best_checkpoint or result["final_checkpoint"]
+        if self.time_budget_min or self.validation_prop:
+            self.metrics.record("stopping", **stopper.summary())
+        if self.continual:
+            self._get_continual_state().record(
+                get_identifier(self.address_eoa),
+                self.model_dir,
+                self.convert_result["episode_keys"],
+            )
+
+    def _get_train_input(self) -> tuple[str, dict]:
+        """Returns the rllib_path and input kwargs for run_train_main."""
+        if self.binary_shards:
+            return self.convert_result["binary_dir"], {"binary_shards": True}
+        return self.convert_result["out_dir"], {}
+
+    def _calibrate(self, train_settings: TrainSettings) -> float:
+        """Returns the samples/sec of a short training run with train_settings."""
+        rllib_path, train_kwargs = self._get_train_input()
+        calibration_metrics = metrics.TrainingMetrics()
+        with calibration_metrics.activate():
+            result = run_train_main(
+                mbag_config=self.convert_result["mbag_config"],
+                rllib_path=rllib_path,
+                num_training_iters=_CALIBRATION_ITERS,
+                train_settings=dataclasses.replace(
+                    train_settings, train_batch_size=_CALIBRATION_BATCH_SIZE
+                ),
+                **train_kwargs,
+            )
+        shutil.rmtree(result["final_checkpoint"], ignore_errors=True)
+
+        iterations = [
+            e for e in calibration_metrics.events if e["event"] == "iteration"
+        ]
+        if not iterations:
+            raise RuntimeError("Calibration run reported no training iterations")
+        # The first iteration also pays for warm-up.
+        return iterations[-1]["samples_per_s"]
 
     def after_training(self):
         _LOG.info("Training ended.")
@@ -97,6 +454,7 @@ class TrainingRunner:
         session_count = 1
         if hasattr(self, "convert_result") and isinstance(self.convert_result, dict):
             session_count = self.convert_result.get("session_count", 1)
+        self.metrics.summary(session_count=session_count, model_dir=self.model_dir)
         telemetry.push_telemetry_event_trained(
             duration_ms,
             get_identifier(self.address_eoa),
@@ -108,12 +466,7 @@ class TrainingRunner:
         self.before_training()
         try:
             _LOG.info("Training started!")
-            result = run_train_main(
-                mbag_config=self.convert_result["mbag_config"],
-                rllib_path=self.convert_result["out_dir"],
-                num_training_iters=self.num_training_iters,
-            )
-            self.model_dir = result["final_checkpoint"]
+            self._train()
         except KeyboardInterrupt:
             _LOG.info("Training stopped!")
 
@@ -0,0 +1,17 @@
+import pytest
+import torch
+import torch.nn as nn
+
+
+@pytest.fixture
+def make_mlps():
+    """Builds small MLPs sharing an architecture, seeded for reproducibility."""
+
+    def make(num_models: int) -> list[nn.Module]:
+        torch.manual_seed(0)
+        return [
+            nn.Sequential(nn.Linear(8, 16), nn.ReLU(), nn.Linear(16, 4))
+            for _ in range(num_models)
+        ]
+
+    return make
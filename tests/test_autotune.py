@@ -0,0 +1,108 @@
+import dataclasses
+from unittest.mock import patch
+
+import pytest
+
+from blockassist.autotune import (
+    TrainSettings,
+    calibration_candidates,
+    heuristic_settings,
+    tune_train_settings,
+)
+
+
+def make_hardware(cores=8, ram_gb=16.0):
+    return {
+        "physical_cores": cores,
+        "logical_cores": cores * 2,
+        "total_ram_gb": ram_gb,
+        "available_ram_gb": ram_gb,
+    }
+
+
+class TestHeuristicSettings:
+    def test_small_laptop_trains_in_process(self):
+        """Test that a 4-core machine uses no rollout workers and one thread per core."""
+        settings = heuristic_settings(make_hardware(cores=4, ram_gb=8))
+        assert settings == TrainSettings(num_workers=0, torch_threads=4, sgd_minibatch_size=128)
+
+    def test_large_machine_adds_workers(self):
+        """Test that spare cores and memory are used for rollout workers."""
+        settings = heuristic_settings(make_hardware(cores=16, ram_gb=64))
+        assert settings.num_workers == 3
+        assert settings.torch_threads == 16
+
+    def test_workers_limited_by_memory(self):
+        """Test that workers are not added without the RAM to hold them."""
+        settings = heuristic_settings(make_hardware(cores=16, ram_gb=6))
+        assert settings.num_workers == 0
+
+    def test_low_memory_halves_minibatch(self):
+        """Test that the minibatch shrinks on machines with little free RAM."""
+        settings = heuristic_settings(make_hardware(cores=2, ram_gb=3))
+        assert settings.sgd_minibatch_size == 64
+
+    def test_config_updates_keep_default_train_batch_size(self):
+        """Test that train_batch_size is only overridden when set."""
+        settings = TrainSettings(num_workers=1, torch_threads=2, sgd_minibatch_size=128)
+        assert settings.config_updates() == {"num_workers": 1, "sgd_minibatch_size": 128}
+        updates = dataclasses.replace(settings, train_batch_size=1024).config_updates()
+        assert updates["train_batch_size"] == 1024
+
+
+class TestTuneTrainSettings:
+    @pytest.fixture
+    def hardware(self):
+        with patch("blockassist.autotune.probe_hardware", return_value=make_hardware()):
+            yield make_hardware()
+
+    def test_off_returns_none(self, tmp_path):
+        """Test that off mode leaves the bc_human defaults alone."""
+        assert tune_train_settings("off", tmp_path / "cache.json", calibrate=None) is None
+
+    def test_unknown_mode_raises(self, tmp_path):
+        """Test that a misspelled mode is rejected."""
+        with pytest.raises(ValueError):
+            tune_train_settings("fast", tmp_path / "cache.json", calibrate=None)
+
+    def test_calibrate_picks_fastest_and_caches(self, tmp_path, hardware):
+        """Test that the fastest candidate wins and later runs skip calibration."""
+        candidates = calibration_candidates(hardware)
+        rates = {candidate: float(i) for i, candidate in enumerate(candidates)}
+        calibrated = []
+
+        def calibrate(settings):
+            calibrated.append(settings)
+            return rates[settings]
+
+        cache_path = tmp_path / "train_autotune.json"
+        settings = tune_train_settings("calibrate", cache_path, calibrate)
+        assert settings == candidates[-1]
+        assert calibrated == candidates
+
+        calibrated.clear()
+        assert tune_train_settings("calibrate", cache_path, calibrate) == candidates[-1]
+        assert calibrated == []
+
+    def test_failed_calibration_runs_are_skipped(self, tmp_path, hardware):
+        """Test that a failing candidate does not stop calibration."""
+        candidates = calibration_candidates(hardware)
+
+        def calibrate(settings):
+            if settings == candidates[0]:
+                raise RuntimeError("out of memory")
+            return 1.0
+
+        settings = tune_train_settings("calibrate", tmp_path / "cache.json", calibrate)
+        assert settings == candidates[1]
+
+    def test_all_failed_falls_back_to_heuristic_uncached(self, tmp_path, hardware):
+        """Test that the heuristic is used, and not cached, when every run fails."""
+        cache_path = tmp_path / "cache.json"
+
+        def calibrate(settings):
+            raise RuntimeError("broken")
+
+        settings = tune_train_settings("calibrate", cache_path, calibrate)
+        assert settings == heuristic_settings(hardware)
+        assert not cache_path.exists()
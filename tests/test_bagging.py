@@ -1,9 +1,10 @@
 from typing import Sequence
 
+import pytest
 import torch
 import torch.nn as nn
 
-from blockassist.merging.bagging import bag_models
+from blockassist.merging.bagging import CascadeBagging, bag_models
 
 
 class TestBagging:
@@ -24,3 +25,102 @@ class TestBagging:
         assert torch.allclose(
             bagged_max_model(x), models[0](x)
         )  # All models are identical, so any one will do
+
+
+class TestVectorizedBagging:
+    def test_matches_loop(self, make_mlps):
+        """Test that the vectorized forward gives the same weighted mean as the loop."""
+        models = make_mlps(3)
+        weights = [0.5, 0.3, 0.2]
+        x = torch.randn(5, 8)
+
+        expected = sum(w * model(x) for w, model in zip(weights, models))
+        looped = bag_models(models, weights=weights)(x)
+        vectorized = bag_models(models, weights=weights, vectorize=True)(x)
+
+        assert torch.allclose(looped, expected, atol=1e-6)
+        assert torch.allclose(vectorized, expected, atol=1e-6)
+
+    def test_custom_aggregation_gets_per_model_outputs(self, make_mlps):
+        """Test that custom aggregation receives one output per model."""
+        models = make_mlps(4)
+        x = torch.randn(2, 8)
+
+        outputs = bag_models(models, aggregation_fn=list, vectorize=True)(x)
+
+        assert len(outputs) == 4
+        for model, output in zip(models, outputs):
+            assert torch.allclose(output, model(x), atol=1e-6)
+
+    def test_different_architectures_raise(self):
+        """Test that models with different parameter shapes cannot be vectorized."""
+        models = [nn.Linear(8, 4), nn.Linear(8, 2)]
+        with pytest.raises(ValueError):
+            bag_models(models, vectorize=True)
+
+
+class CountingModel(nn.Module):
+    def __init__(self, output: list[float]):
+        super().__init__()
+        self.output = torch.tensor(output)
+        self.calls = 0
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        self.calls += 1
+        return self.output.expand(x.shape[0], -1)
+
+
+class TestCascadeBagging:
+    def test_skips_models_that_cannot_change_the_action(self):
+        """Test that a decisive heavy model is the only one evaluated."""
+        models = [CountingModel([0.0, 0.0, 1.0]), CountingModel([20.0, 0.0, 0.0])]
+        cascade = CascadeBagging(models, weights=[0.2, 0.8])
+
+        actions = cascade(torch.zeros(2, 1))
+
+        assert actions.tolist() == [0, 0]
+        assert models[1].calls == 1
+        assert models[0].calls == 0
+        assert cascade.stats()["mean_models_evaluated"] == 1
+
+    def test_close_votes_evaluate_every_model(self):
+        """Test that all models run while the leading action could still change."""
+        models = [CountingModel([1.0, 0.0]), CountingModel([0.0, 1.0]), CountingModel([0.0, 1.0])]
+        cascade = CascadeBagging(models, vote="hard")
+
+        assert cascade(torch.zeros(1, 1)).tolist() == [1]
+        assert all(model.calls == 1 for model in models)
+
+    @pytest.mark.parametrize("vote", ["soft", "hard"])
+    def test_matches_full_vote(self, make_mlps, vote):
+        """Test that early exit never changes the voted action."""
+        models = make_mlps(8)
+        weights = torch.rand(8).tolist()
+        cascade = CascadeBagging(models, weights=weights, vote=vote)
+
+        for _ in range(20):
+            x = torch.randn(1, 8)
+            outputs = torch.stack([m(x) for m in models]).detach()
+            if vote == "soft":
+                full_votes = outputs.softmax(dim=-1)
+            else:
+                full_votes = nn.functional.one_hot(outputs.argmax(dim=-1), 4).float()
+            expected = (full_votes * torch.tensor(weights)[:, None, None]).sum(0).argmax(-1)
+            assert torch.equal(cascade(x), expected)
+        assert cascade.stats()["mean_models_evaluated"] <= 8
+
+    def test_audit_reports_agreement_with_bagging(self, make_mlps):
+        """Test that audited calls compare the action with bag_models' argmax."""
+        models = make_mlps(4)
+        cascade = CascadeBagging(models, audit_every=2)
+        bagged = bag_models(models)
+
+        inputs = [torch.randn(1, 8) for _ in range(10)]
+        actions = [cascade(x) for x in inputs]
+
+        audited = range(0, 10, 2)
+        expected = sum(torch.equal(actions[i], bagged(inputs[i]).argmax(-1)) for i in audited)
+        stats = cascade.stats()
+        assert stats["calls"] == 10
+        assert stats["audited_calls"] == 5
+        assert stats["full_bagging_agreement"] == expected / 5
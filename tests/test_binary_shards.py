@@ -0,0 +1,114 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from ray.rllib.offline.io_context import IOContext
+from ray.rllib.offline.json_reader import JsonReader
+from ray.rllib.offline.json_writer import JsonWriter
+from ray.rllib.policy.sample_batch import MultiAgentBatch, SampleBatch
+
+from blockassist.binary_shards import BinaryShardReader, write_binary_shards
+
+
+def make_batch(length: int) -> MultiAgentBatch:
+    seq_lens = [32] * (length // 32) + ([length % 32] if length % 32 else [])
+    sample_batch = SampleBatch(
+        {
+            SampleBatch.OBS: np.random.rand(length, 6).astype(np.float32),
+            SampleBatch.ACTIONS: np.arange(length),
+            SampleBatch.REWARDS: np.zeros(length, dtype=np.float32),
+            SampleBatch.DONES: np.zeros(length, dtype=bool),
+            "episode_dir": np.array([f"evaluate_{length}/1"] * length),
+            SampleBatch.SEQ_LENS: np.array(seq_lens),
+        }
+    )
+    return MultiAgentBatch({"human": sample_batch}, length)
+
+
+@pytest.fixture
+def json_dir(tmp_path):
+    out_dir = tmp_path / "rllib"
+    writer = JsonWriter(str(out_dir))
+    for length in (40, 10):
+        writer.write(make_batch(length))
+    return out_dir
+
+
+class TestBinaryShards:
+    def test_reader_matches_json_reader(self, tmp_path, json_dir):
+        """Test that batches read from shards equal those RLlib reads from JSON."""
+        shard_dir = write_binary_shards(str(json_dir), str(tmp_path / "rllib_binary"))
+        ioctx = IOContext(config={"train_batch_size": 45})
+
+        expected = JsonReader(str(json_dir), ioctx).next().policy_batches["human"]
+        actual = BinaryShardReader(shard_dir, ioctx).next().policy_batches["human"]
+
+        assert set(actual.keys()) == set(expected.keys())
+        for column in expected.keys():
+            assert actual[column].dtype == expected[column].dtype
+            np.testing.assert_array_equal(actual[column], expected[column])
+        np.testing.assert_array_equal(actual[SampleBatch.SEQ_LENS], [32, 8, 10])
+        # Copied out of the memory map, so training may modify them.
+        assert actual[SampleBatch.OBS].flags.writeable
+
+    def test_columns_are_memory_mapped_arrays(self, tmp_path, json_dir):
+        """Test that observations are stored unpacked as one array per shard."""
+        shard_dir = tmp_path / "rllib_binary"
+        write_binary_shards(str(json_dir), str(shard_dir))
+
+        (shard_path,) = shard_dir.iterdir()
+        meta = json.loads((shard_path / "meta.json").read_text())
+        obs = np.load(shard_path / meta["files"]["human/obs"], mmap_mode="r")
+        assert isinstance(obs, np.memmap)
+        assert obs.shape == (50, 6)
+        assert len(meta["records"]) == 2
+
+    def test_unchanged_shards_are_reused_and_stale_removed(self, tmp_path, json_dir):
+        """Test that only changed JSON files are rewritten and removed ones are dropped."""
+        shard_dir = tmp_path / "rllib_binary"
+        write_binary_shards(str(json_dir), str(shard_dir))
+        (shard_path,) = shard_dir.iterdir()
+        meta_mtime = os.stat(shard_path / "meta.json").st_mtime_ns
+
+        write_binary_shards(str(json_dir), str(shard_dir))
+        assert os.stat(shard_path / "meta.json").st_mtime_ns == meta_mtime
+
+        (json_path,) = json_dir.iterdir()
+        json_path.rename(json_dir / "renamed.json")
+        write_binary_shards(str(json_dir), str(shard_dir))
+        assert [p.name for p in shard_dir.iterdir()] == ["renamed.shard"]
+
+    def test_object_columns_round_trip(self, tmp_path):
+        """Test that columns that are not fixed-shape arrays are kept as objects."""
+        json_dir = tmp_path / "rllib"
+        json_dir.mkdir()
+        record = {
+            "type": "SampleBatch",
+            SampleBatch.ACTIONS: [1, 2, 3],
+            SampleBatch.INFOS: [{"a": 1}, {}, {"b": [2]}],
+        }
+        (json_dir / "output.json").write_text(json.dumps(record) + "\n")
+        shard_dir = write_binary_shards(str(json_dir), str(tmp_path / "rllib_binary"))
+
+        batch = BinaryShardReader(shard_dir, IOContext(config={"train_batch_size": 3})).next()
+        np.testing.assert_array_equal(batch[SampleBatch.ACTIONS], [1, 2, 3])
+        assert list(batch[SampleBatch.INFOS]) == [{"a": 1}, {}, {"b": [2]}]
+
+    def test_postprocessing_multi_agent_shards_raises(self, tmp_path):
+        """Test that postprocessing batches of several policies is rejected up front."""
+        writer = JsonWriter(str(tmp_path / "rllib"))
+        human_batch = make_batch(10).policy_batches["human"]
+        writer.write(MultiAgentBatch({"human": human_batch, "assistant": human_batch}, 10))
+        shard_dir = write_binary_shards(str(tmp_path / "rllib"), str(tmp_path / "rllib_binary"))
+
+        ioctx = IOContext(config={"postprocess_inputs": True})
+        with pytest.raises(ValueError, match="postprocess_inputs is not supported"):
+            BinaryShardReader(shard_dir, ioctx)
+        # Without postprocessing the same shards are read as usual.
+        assert BinaryShardReader(shard_dir, IOContext()).next().count == 10
+
+    def test_empty_directory_raises(self, tmp_path):
+        """Test that reading a directory without shards fails like JsonReader."""
+        with pytest.raises(ValueError):
+            BinaryShardReader(str(tmp_path))
@@ -0,0 +1,195 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from blockassist.convert_cache import convert_episodes_cached
+
+_CONFIG = {"max_seq_len": 32, "inventory_player_indices": [0, 1]}
+
+
+class FakeConverter:
+    """Stands in for mbag's converter, writing one JSON file per episode."""
+
+    def __init__(self):
+        self.converted = []
+
+    def __call__(self, data_dir: str, episode_fname: str, out_dir: str) -> dict:
+        self.converted.append(Path(episode_fname).relative_to(data_dir).as_posix())
+        os.makedirs(out_dir)
+        # JsonWriter names output by timestamp, so every shard gets the same name.
+        out_path = Path(out_dir) / "output-2025-01-01_00-00-00_worker-0_0.json"
+        out_path.write_text(json.dumps({"episode": Path(episode_fname).read_text()}))
+        return {"mbag_config": {"num_players": 2}, "out_dir": out_dir}
+
+
+def convert_in_worker(data_dir: str, episode_fname: str, out_dir: str) -> dict:
+    # Module level so the process pool can pickle it.
+    os.makedirs(out_dir)
+    out_path = Path(out_dir) / "output-2025-01-01_00-00-00_worker-0_0.json"
+    out_path.write_text(json.dumps({"episode": Path(episode_fname).read_text()}))
+    if Path(episode_fname).read_text() == "fail":
+        raise RuntimeError("conversion failed")
+    return {"mbag_config": {"num_players": 2}, "out_dir": out_dir}
+
+
+def write_episode(checkpoint: Path, name: str, contents: str) -> Path:
+    run_dir = checkpoint / name / "1"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    zip_path = run_dir / "episodes.zip"
+    zip_path.write_text(contents)
+    return zip_path
+
+
+def run_cached(
+    checkpoint: Path,
+    converter,
+    config: dict = _CONFIG,
+    max_workers: int = 1,
+    exclude_keys=(),
+):
+    return convert_episodes_cached(
+        data_dir=str(checkpoint),
+        data_glob=str(checkpoint / "evaluate_*" / "**" / "episodes.zip"),
+        out_dir=str(checkpoint.parent / "rllib"),
+        cache_dir=str(checkpoint.parent / "rllib_cache"),
+        convert_config=config,
+        convert_episode=converter,
+        max_workers=max_workers,
+        exclude_keys=exclude_keys,
+    )
+
+
+def read_outputs(out_dir: str) -> list[str]:
+    return sorted(json.loads(p.read_text())["episode"] for p in Path(out_dir).glob("*.json"))
+
+
+class TestConvertEpisodesCached:
+    def test_converts_each_episode_once(self, tmp_path):
+        """Test that a second run reuses every shard and gives the same output."""
+        checkpoint = tmp_path / "base_checkpoint"
+        write_episode(checkpoint, "evaluate_a", "a")
+        write_episode(checkpoint, "evaluate_b", "b")
+
+        converter = FakeConverter()
+        result = run_cached(checkpoint, converter)
+        assert sorted(converter.converted) == ["evaluate_a/1/episodes.zip", "evaluate_b/1/episodes.zip"]
+        assert result["session_count"] == 2
+        assert result["mbag_config"] == {"num_players": 2}
+        assert read_outputs(result["out_dir"]) == ["a", "b"]
+
+        converter = FakeConverter()
+        result = run_cached(checkpoint, converter)
+        assert converter.converted == []
+        assert read_outputs(result["out_dir"]) == ["a", "b"]
+
+    def test_converts_only_new_and_changed_episodes(self, tmp_path):
+        """Test that only added or modified episodes are converted again."""
+        checkpoint = tmp_path / "base_checkpoint"
+        write_episode(checkpoint, "evaluate_a", "a")
+        zip_b = write_episode(checkpoint, "evaluate_b", "b")
+        run_cached(checkpoint, FakeConverter())
+
+        zip_b.write_text("b2")
+        write_episode(checkpoint, "evaluate_c", "c")
+        converter = FakeConverter()
+        result = run_cached(checkpoint, converter)
+
+        assert sorted(converter.converted) == ["evaluate_b/1/episodes.zip", "evaluate_c/1/episodes.zip"]
+        assert read_outputs(result["out_dir"]) == ["a", "b2", "c"]
+
+    def test_config_change_invalidates_cache(self, tmp_path):
+        """Test that changing the convert config reconverts every episode."""
+        checkpoint = tmp_path / "base_checkpoint"
+        write_episode(checkpoint, "evaluate_a", "a")
+        run_cached(checkpoint, FakeConverter())
+
+        converter = FakeConverter()
+        run_cached(checkpoint, converter, config={**_CONFIG, "max_seq_len": 64})
+        assert converter.converted == ["evaluate_a/1/episodes.zip"]
+
+    def test_removed_episodes_are_pruned(self, tmp_path):
+        """Test that shards of deleted episodes leave the cache and the output."""
+        checkpoint = tmp_path / "base_checkpoint"
+        write_episode(checkpoint, "evaluate_a", "a")
+        zip_b = write_episode(checkpoint, "evaluate_b", "b")
+        run_cached(checkpoint, FakeConverter())
+        assert len([p for p in (tmp_path / "rllib_cache").iterdir() if p.is_dir()]) == 2
+
+        zip_b.unlink()
+        result = run_cached(checkpoint, FakeConverter())
+
+        assert read_outputs(result["out_dir"]) == ["a"]
+        assert len([p for p in (tmp_path / "rllib_cache").iterdir() if p.is_dir()]) == 1
+
+    def test_failed_conversion_is_not_cached(self, tmp_path):
+        """Test that an episode whose conversion raised is converted next time."""
+        checkpoint = tmp_path / "base_checkpoint"
+        write_episode(checkpoint, "evaluate_a", "a")
+
+        def failing_converter(data_dir, episode_fname, out_dir):
+            os.makedirs(out_dir)
+            raise RuntimeError("conversion failed")
+
+        with pytest.raises(RuntimeError):
+            run_cached(checkpoint, failing_converter)
+
+        converter = FakeConverter()
+        run_cached(checkpoint, converter)
+        assert converter.converted == ["evaluate_a/1/episodes.zip"]
+
+    def test_no_episodes_raises(self, tmp_path):
+        """Test that converting an empty checkpoint raises FileNotFoundError."""
+        checkpoint = tmp_path / "base_checkpoint"
+        checkpoint.mkdir()
+        with pytest.raises(FileNotFoundError):
+            run_cached(checkpoint, FakeConverter())
+
+    def test_parallel_conversion_matches_serial(self, tmp_path):
+        """Test that converting across processes merges every episode into out_dir."""
+        checkpoint = tmp_path / "base_checkpoint"
+        for name in "abcd":
+            write_episode(checkpoint, f"evaluate_{name}", name)
+
+        result = run_cached(checkpoint, convert_in_worker, max_workers=2)
+
+        assert result["session_count"] == 4
+        assert read_outputs(result["out_dir"]) == ["a", "b", "c", "d"]
+        assert len(list(Path(result["out_dir"]).glob("*.json"))) == 4
+
+    def test_parallel_failure_keeps_other_shards(self, tmp_path):
+        """Test that one failed episode does not discard the others' conversions."""
+        checkpoint = tmp_path / "base_checkpoint"
+        write_episode(checkpoint, "evaluate_a", "a")
+        zip_b = write_episode(checkpoint, "evaluate_b", "fail")
+
+        with pytest.raises(RuntimeError):
+            run_cached(checkpoint, convert_in_worker, max_workers=2)
+
+        zip_b.write_text("b")
+        converter = FakeConverter()
+        result = run_cached(checkpoint, converter)
+        assert converter.converted == ["evaluate_b/1/episodes.zip"]
+        assert read_outputs(result["out_dir"]) == ["a", "b"]
+
+    def test_excluded_episodes_are_left_out(self, tmp_path):
+        """Test that excluded episodes are neither converted nor written to out_dir."""
+        checkpoint = tmp_path / "base_checkpoint"
+        write_episode(checkpoint, "evaluate_a", "a")
+        first = run_cached(checkpoint, FakeConverter())
+
+        write_episode(checkpoint, "evaluate_b", "b")
+        converter = FakeConverter()
+        result = run_cached(checkpoint, converter, exclude_keys=set(first["episode_keys"]))
+
+        assert converter.converted == ["evaluate_b/1/episodes.zip"]
+        assert result["session_count"] == 1
+        assert len(result["episode_keys"]) == 2
+        assert read_outputs(result["out_dir"]) == ["b"]
+
+        converter = FakeConverter()
+        result = run_cached(checkpoint, converter, exclude_keys=set(result["episode_keys"]))
+        assert converter.converted == []
+        assert result["session_count"] == 0
+        assert read_outputs(result["out_dir"]) == []
@@ -1,13 +1,37 @@
+import json
+import os
 import tempfile
+import threading
+import time
+import zipfile
 from pathlib import Path
+from unittest.mock import patch
 
 import pytest
 
+from blockassist import data, sessions
 from blockassist.data import (
     backup_evaluate_dirs,
+    delete_evaluate_dirs,
+    delete_evaluate_zips,
     get_all_evaluate_dirs,
+    get_compress_type,
+    get_session_index,
     get_total_episodes,
+    restore_evaluate_dirs_from_backup,
+    zip_and_upload_all_episodes,
+    zip_and_upload_episodes,
 )
+from blockassist.readiness import REQUIRED_RUN_FILES
+
+
+def _write_run(run_dir: Path, run_json: str = '{"status": "COMPLETED"}') -> None:
+    """Writes run_dir with every required file, keeping ones that already exist."""
+    run_dir.mkdir(parents=True, exist_ok=True)
+    for file in REQUIRED_RUN_FILES:
+        if file != "run.json" and not (run_dir / file).exists():
+            (run_dir / file).write_text("{}")
+    (run_dir / "run.json").write_text(run_json)
 
 
 class TestGetEvaluationDirs:
@@ -224,3 +248,474 @@ class TestGetTotalEpisodes:
 
             result = get_total_episodes(str(checkpoint_dir))
             assert result == 1
+
+
+class TestZipAndUploadEpisodes:
+    def _make_evaluate_dirs(self, checkpoint_dir: Path, count: int) -> list[Path]:
+        evaluate_dirs = []
+        for i in range(count):
+            eval_dir = checkpoint_dir / f"evaluate_2025010{i}_120000"
+            _write_run(eval_dir / "1", f'{{"status": "COMPLETED", "run": {i}}}')
+            evaluate_dirs.append(eval_dir)
+        return evaluate_dirs
+
+    @pytest.mark.parametrize("max_workers", [1, 3])
+    def test_zip_and_upload_episodes_preserves_order(self, max_workers):
+        """Test that serial and pipelined modes upload every directory in order."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            checkpoint_dir = Path(temp_dir) / "base_checkpoint"
+            checkpoint_dir.mkdir()
+            evaluate_dirs = self._make_evaluate_dirs(checkpoint_dir, 5)
+
+            def fake_upload(zip_path, bucket_name, s3_key):
+                assert Path(zip_path).exists()
+                return f"s3://{bucket_name}/{s3_key}"
+
+            with patch("blockassist.data.upload_zip_to_s3", side_effect=fake_upload):
+                result = zip_and_upload_episodes(
+                    "user",
+                    str(checkpoint_dir),
+                    "bucket",
+                    evaluate_dirs,
+                    max_workers=max_workers,
+                )
+
+            assert result == [
+                f"s3://bucket/user/{d.name}.zip" for d in evaluate_dirs
+            ]
+            with zipfile.ZipFile(
+                checkpoint_dir / "evaluate_zips" / f"{evaluate_dirs[0].name}.zip"
+            ) as zipf:
+                assert zipf.read("1/run.json") == b'{"status": "COMPLETED", "run": 0}'
+
+    def test_zip_and_upload_episodes_bounds_pending_zips(self):
+        """Test that no more than max_pending_zips archives are in flight at once."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            checkpoint_dir = Path(temp_dir) / "base_checkpoint"
+            checkpoint_dir.mkdir()
+            evaluate_dirs = self._make_evaluate_dirs(checkpoint_dir, 6)
+
+            lock = threading.Lock()
+            in_flight = 0
+            max_in_flight = 0
+            real_zip = data._zip_evaluate_dir
+
+            def counting_zip(*args):
+                nonlocal in_flight, max_in_flight
+                with lock:
+                    in_flight += 1
+                    max_in_flight = max(max_in_flight, in_flight)
+                return real_zip(*args)
+
+            def slow_upload(zip_path, bucket_name, s3_key):
+                nonlocal in_flight
+                time.sleep(0.05)
+                with lock:
+                    in_flight -= 1
+                return s3_key
+
+            with patch("blockassist.data._zip_evaluate_dir", side_effect=counting_zip), \
+                 patch("blockassist.data.upload_zip_to_s3", side_effect=slow_upload):
+                result = zip_and_upload_episodes(
+                    "user",
+                    str(checkpoint_dir),
+                    "bucket",
+                    evaluate_dirs,
+                    max_workers=4,
+                    max_pending_zips=2,
+                )
+
+            assert len(result) == 6
+            assert max_in_flight <= 2
+
+    def test_zip_and_upload_episodes_propagates_upload_error(self):
+        """Test that an upload failure in pipelined mode is raised to the caller."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            checkpoint_dir = Path(temp_dir) / "base_checkpoint"
+            checkpoint_dir.mkdir()
+            evaluate_dirs = self._make_evaluate_dirs(checkpoint_dir, 3)
+
+            with patch(
+                "blockassist.data.upload_zip_to_s3",
+                side_effect=RuntimeError("upload failed"),
+            ), pytest.raises(RuntimeError, match="upload failed"):
+                zip_and_upload_episodes(
+                    "user", str(checkpoint_dir), "bucket", evaluate_dirs, max_workers=2
+                )
+
+
+    def test_session_dirs_with_the_same_name_get_their_own_zip(self, tmp_path):
+        """Test that session run dirs, which are all named 1, do not share a zip or key."""
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        evaluate_dirs = self._make_evaluate_dirs(checkpoint_dir, 4)
+        session_dirs = [d / "1" for d in evaluate_dirs]
+        uploaded = {}
+
+        def fake_upload(zip_path, bucket_name, s3_key):
+            with zipfile.ZipFile(zip_path) as zipf:
+                uploaded[s3_key] = zipf.read("run.json")
+            return f"s3://{bucket_name}/{s3_key}"
+
+        with patch("blockassist.data.upload_zip_to_s3", side_effect=fake_upload):
+            result = zip_and_upload_episodes(
+                "user",
+                str(checkpoint_dir),
+                "bucket",
+                session_dirs,
+                max_workers=2,
+                skip_unchanged=True,
+            )
+
+        assert result == [f"s3://bucket/user/{d.name}_1.zip" for d in evaluate_dirs]
+        assert uploaded == {
+            f"user/{d.name}_1.zip": f'{{"status": "COMPLETED", "run": {i}}}'.encode()
+            for i, d in enumerate(evaluate_dirs)
+        }
+        manifest = json.loads(
+            (checkpoint_dir / "evaluate_zips" / "upload_manifest.json").read_text()
+        )
+        assert sorted(manifest["evaluate_dirs"]) == [f"{d.name}_1" for d in evaluate_dirs]
+
+
+class TestGetCompressType:
+    def test_get_compress_type_by_suffix(self, tmp_path):
+        """Test that known compressed formats are stored and text is deflated."""
+        (tmp_path / "episodes.zip").write_bytes(b"PK" * 100)
+        (tmp_path / "run.json").write_text('{"status": "COMPLETED"}')
+
+        assert get_compress_type(tmp_path / "episodes.zip") == zipfile.ZIP_STORED
+        assert get_compress_type(tmp_path / "run.json") == zipfile.ZIP_DEFLATED
+
+    def test_get_compress_type_sniffs_unknown_files(self, tmp_path):
+        """Test that high-entropy files with unknown suffixes are stored."""
+        (tmp_path / "random.bin").write_bytes(os.urandom(8192))
+        (tmp_path / "zeros.bin").write_bytes(b"\0" * 8192)
+
+        assert get_compress_type(tmp_path / "random.bin") == zipfile.ZIP_STORED
+        assert get_compress_type(tmp_path / "zeros.bin") == zipfile.ZIP_DEFLATED
+
+    def test_zip_stores_inner_episodes_zip(self, tmp_path):
+        """Test that the inner episodes.zip is stored rather than re-deflated."""
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        session_dir = checkpoint_dir / "evaluate_20250101_120000" / "1"
+        session_dir.mkdir(parents=True)
+        (session_dir / "episodes.zip").write_bytes(os.urandom(4096))
+        (session_dir / "config.json").write_text('{"a": 1}' * 100)
+        _write_run(session_dir)
+
+        with patch("blockassist.data.upload_zip_to_s3", return_value="s3://b/k"):
+            zip_and_upload_episodes(
+                "user", str(checkpoint_dir), "bucket", [session_dir.parent]
+            )
+
+        zip_path = checkpoint_dir / "evaluate_zips" / "evaluate_20250101_120000.zip"
+        with zipfile.ZipFile(zip_path) as zipf:
+            assert zipf.getinfo("1/episodes.zip").compress_type == zipfile.ZIP_STORED
+            assert zipf.getinfo("1/config.json").compress_type == zipfile.ZIP_DEFLATED
+
+
+class TestIncrementalUpload:
+    def test_skip_unchanged_uploads_only_new_dirs(self, tmp_path):
+        """Test that reruns only upload evaluate directories that changed."""
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        old_dir = checkpoint_dir / "evaluate_20250101_120000"
+        new_dir = checkpoint_dir / "evaluate_20250102_130000"
+        for d in (old_dir, new_dir):
+            _write_run(d / "1")
+
+        with patch(
+            "blockassist.data.upload_zip_to_s3",
+            side_effect=lambda path, bucket, key: f"s3://{bucket}/{key}",
+        ) as mock_upload:
+            first = zip_and_upload_episodes(
+                "user", str(checkpoint_dir), "bucket", [old_dir], skip_unchanged=True
+            )
+            second = zip_and_upload_episodes(
+                "user",
+                str(checkpoint_dir),
+                "bucket",
+                [old_dir, new_dir],
+                skip_unchanged=True,
+            )
+
+        assert first == ["s3://bucket/user/evaluate_20250101_120000.zip"]
+        assert second == [
+            "s3://bucket/user/evaluate_20250101_120000.zip",
+            "s3://bucket/user/evaluate_20250102_130000.zip",
+        ]
+        uploaded_keys = [c.args[2] for c in mock_upload.call_args_list]
+        assert uploaded_keys == [
+            "user/evaluate_20250101_120000.zip",
+            "user/evaluate_20250102_130000.zip",
+        ]
+
+    def test_skip_unchanged_reuploads_modified_dir(self, tmp_path):
+        """Test that a changed file or a different S3 key triggers a new upload."""
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        eval_dir = checkpoint_dir / "evaluate_20250101_120000"
+        _write_run(eval_dir / "1", '{"status": "FAILED"}')
+        run_json = eval_dir / "1" / "run.json"
+
+        with patch(
+            "blockassist.data.upload_zip_to_s3", return_value="s3://bucket/key"
+        ) as mock_upload:
+            zip_and_upload_episodes(
+                "user", str(checkpoint_dir), "bucket", [eval_dir], skip_unchanged=True
+            )
+            run_json.write_text('{"status": "COMPLETED"}')
+            zip_and_upload_episodes(
+                "user", str(checkpoint_dir), "bucket", [eval_dir], skip_unchanged=True
+            )
+            zip_and_upload_episodes(
+                "other", str(checkpoint_dir), "bucket", [eval_dir], skip_unchanged=True
+            )
+
+        assert mock_upload.call_count == 3
+
+
+class TestUploadAllEpisodes:
+    def test_incomplete_and_stale_runs_are_skipped(self, tmp_path):
+        """Test that crashed or incomplete sessions are not zipped or uploaded."""
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        complete_dir = checkpoint_dir / "evaluate_20250101_120000"
+        missing_dir = checkpoint_dir / "evaluate_20250102_120000"
+        stale_dir = checkpoint_dir / "evaluate_20250103_120000"
+        _write_run(complete_dir / "1")
+        _write_run(missing_dir / "1")
+        (missing_dir / "1" / "episodes.zip").unlink()
+        _write_run(stale_dir / "1", '{"status": "RUNNING"}')
+        old = time.time() - 3600
+        os.utime(stale_dir / "1" / "run.json", (old, old))
+
+        with patch(
+            "blockassist.data.upload_zip_to_s3",
+            side_effect=lambda path, bucket, key: f"s3://{bucket}/{key}",
+        ):
+            result = zip_and_upload_all_episodes("user", str(checkpoint_dir), "bucket")
+
+        assert result == ["s3://bucket/user/evaluate_20250101_120000.zip"]
+        assert [p.name for p in (checkpoint_dir / "evaluate_zips").glob("*.zip")] == [
+            "evaluate_20250101_120000.zip"
+        ]
+
+
+    def test_abandoned_session_dir_is_skipped(self, tmp_path):
+        """Test that a crashed session is left out instead of failing the batch."""
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        crashed_dir = checkpoint_dir / "evaluate_20250101_120000" / "1"
+        complete_dir = checkpoint_dir / "evaluate_20250102_120000" / "1"
+        _write_run(crashed_dir, '{"status": "FAILED"}')
+        (crashed_dir / "episodes.zip").unlink()
+        _write_run(complete_dir)
+
+        with patch(
+            "blockassist.data.upload_zip_to_s3",
+            side_effect=lambda path, bucket, key: f"s3://{bucket}/{key}",
+        ):
+            result = zip_and_upload_episodes(
+                "user",
+                str(checkpoint_dir),
+                "bucket",
+                [crashed_dir, complete_dir],
+                max_workers=2,
+            )
+
+        assert result == ["s3://bucket/user/evaluate_20250102_120000_1.zip"]
+
+
+class TestStreamToS3:
+    def test_stream_to_s3_skips_evaluate_zips(self, tmp_path):
+        """Test that streamed uploads never write an archive to disk."""
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        eval_dir = checkpoint_dir / "evaluate_20250101_120000"
+        _write_run(eval_dir / "1")
+
+        with patch(
+            "blockassist.data._stream_evaluate_dir_to_s3",
+            return_value="s3://bucket/user/evaluate_20250101_120000.zip",
+        ) as mock_stream, patch("blockassist.data.upload_zip_to_s3") as mock_upload:
+            result = zip_and_upload_episodes(
+                "user", str(checkpoint_dir), "bucket", [eval_dir], stream_to_s3=True
+            )
+
+        assert result == ["s3://bucket/user/evaluate_20250101_120000.zip"]
+        mock_stream.assert_called_once()
+        mock_upload.assert_not_called()
+        # Only the upload manifest is written there.
+        assert not list((checkpoint_dir / "evaluate_zips").glob("*.zip"))
+
+    def test_stream_to_s3_falls_back_to_zip_file(self, tmp_path):
+        """Test that a failed stream is retried from a zip file on disk."""
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        eval_dir = checkpoint_dir / "evaluate_20250101_120000"
+        _write_run(eval_dir / "1")
+
+        with patch(
+            "blockassist.data.S3MultipartWriter",
+            side_effect=ConnectionError("connection dropped"),
+        ), patch(
+            "blockassist.data.upload_zip_to_s3", return_value="s3://bucket/key"
+        ) as mock_upload:
+            result = zip_and_upload_episodes(
+                "user", str(checkpoint_dir), "bucket", [eval_dir], stream_to_s3=True
+            )
+
+        assert result == ["s3://bucket/key"]
+        zip_path = checkpoint_dir / "evaluate_zips" / "evaluate_20250101_120000.zip"
+        mock_upload.assert_called_once_with(
+            str(zip_path), "bucket", "user/evaluate_20250101_120000.zip"
+        )
+
+
+class TestSessionIndex:
+    def _write_session(self, run_dir: Path, quest: str, goal_pct: float) -> None:
+        run_dir.mkdir(parents=True)
+        (run_dir / "config.json").write_text(json.dumps({"goal_generator_name": quest}))
+        (run_dir / "run.json").write_text(
+            json.dumps({"status": "COMPLETED", "start_time": "2025-01-02T12:00:00"})
+        )
+        (run_dir / "metrics.json").write_text(
+            json.dumps({"mean_metrics": {"goal_percentage_5_min": goal_pct}})
+        )
+        (run_dir / "episodes.zip").touch()
+
+    def test_session_index_queries(self, tmp_path):
+        """Test per-quest, per-date and goal percentage queries."""
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        self._write_session(checkpoint_dir / "evaluate_a" / "1", "diamond_quest", 0.5)
+        self._write_session(checkpoint_dir / "evaluate_b" / "1", "diamond_quest", 0.25)
+        self._write_session(checkpoint_dir / "evaluate_b" / "2", "blockassist", 0.25)
+
+        index = get_session_index(str(checkpoint_dir))
+
+        assert index.total_sessions() == 3
+        assert index.sessions_per_quest() == {"diamond_quest": 2, "blockassist": 1}
+        assert index.sessions_per_date() == {"2025-01-02": 3}
+        assert index.total_goal_percentage() == pytest.approx(1.0)
+
+    def test_session_index_only_rescans_changed_dirs(self, tmp_path):
+        """Test that unchanged evaluate dirs are served from the persisted index."""
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        self._write_session(checkpoint_dir / "evaluate_a" / "1", "blockassist", 0.5)
+        assert get_total_episodes(str(checkpoint_dir)) == 1
+        assert (checkpoint_dir / "session_index.json").exists()
+
+        self._write_session(checkpoint_dir / "evaluate_b" / "1", "blockassist", 0.5)
+        with patch(
+            "blockassist.sessions._index_run_dir", wraps=sessions._index_run_dir
+        ) as mock_index_run_dir:
+            assert get_total_episodes(str(checkpoint_dir)) == 2
+
+        indexed = [c.args[0].parent.name for c in mock_index_run_dir.call_args_list]
+        assert indexed == ["evaluate_b"]
+
+    def test_session_index_picks_up_completed_run(self, tmp_path):
+        """Test that a run missing files is rechecked once they appear."""
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        run_dir = checkpoint_dir / "evaluate_a" / "1"
+        self._write_session(run_dir, "blockassist", 0.5)
+        (run_dir / "episodes.zip").unlink()
+        assert get_total_episodes(str(checkpoint_dir)) == 0
+
+        (run_dir / "episodes.zip").touch()
+        os.utime(run_dir, ns=(0, run_dir.stat().st_mtime_ns + 1))
+        assert get_total_episodes(str(checkpoint_dir)) == 1
+
+
+class TestLinkedBackup:
+    def _make_checkpoint(self, tmp_path: Path, status: str) -> Path:
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        run_dir = checkpoint_dir / "evaluate_20250101_120000" / "1"
+        run_dir.mkdir(parents=True)
+        (run_dir / "episodes.zip").write_bytes(os.urandom(1024))
+        _write_run(run_dir, json.dumps({"status": status}))
+        return checkpoint_dir
+
+    def test_backup_hard_links_finished_runs(self, tmp_path):
+        """Test that finished runs are hard-linked when reflinks are unavailable."""
+        checkpoint_dir = self._make_checkpoint(tmp_path, "COMPLETED")
+
+        with patch("blockassist.linking._reflink", None):
+            backup_evaluate_dirs(str(checkpoint_dir))
+
+        src = checkpoint_dir / "evaluate_20250101_120000" / "1" / "episodes.zip"
+        backup = checkpoint_dir / "evaluate" / "evaluate_20250101_120000" / "1" / "episodes.zip"
+        assert backup.read_bytes() == src.read_bytes()
+        assert backup.stat().st_ino == src.stat().st_ino
+
+    def test_backup_copies_unfinished_runs(self, tmp_path):
+        """Test that files of a run still being written are never hard-linked."""
+        checkpoint_dir = self._make_checkpoint(tmp_path, "RUNNING")
+
+        with patch("blockassist.linking._reflink", None):
+            backup_evaluate_dirs(str(checkpoint_dir))
+
+        src = checkpoint_dir / "evaluate_20250101_120000" / "1" / "run.json"
+        backup = checkpoint_dir / "evaluate" / "evaluate_20250101_120000" / "1" / "run.json"
+        assert backup.read_text() == src.read_text()
+        assert backup.stat().st_ino != src.stat().st_ino
+
+    def test_restore_survives_clean(self, tmp_path):
+        """Test that backup, clean and restore round-trip the data."""
+        checkpoint_dir = self._make_checkpoint(tmp_path, "COMPLETED")
+        src = checkpoint_dir / "evaluate_20250101_120000" / "1" / "episodes.zip"
+        content = src.read_bytes()
+
+        backup_evaluate_dirs(str(checkpoint_dir))
+        delete_evaluate_dirs(str(checkpoint_dir))
+        assert not src.exists()
+        restore_evaluate_dirs_from_backup(str(checkpoint_dir))
+
+        assert src.read_bytes() == content
+
+    def test_backup_copy_strategy(self, tmp_path):
+        """Test that the copy strategy always makes independent copies."""
+        checkpoint_dir = self._make_checkpoint(tmp_path, "COMPLETED")
+
+        backup_evaluate_dirs(str(checkpoint_dir), copy_strategy="copy")
+
+        src = checkpoint_dir / "evaluate_20250101_120000" / "1" / "episodes.zip"
+        backup = checkpoint_dir / "evaluate" / "evaluate_20250101_120000" / "1" / "episodes.zip"
+        assert backup.stat().st_ino != src.stat().st_ino
+        delete_evaluate_dirs(str(checkpoint_dir))
+        with pytest.raises(ValueError, match="Unknown copy strategy"):
+            restore_evaluate_dirs_from_backup(str(checkpoint_dir), copy_strategy="x")
+
+
+class TestParallelDirectoryOps:
+    @pytest.mark.parametrize("max_workers", [1, 4])
+    def test_clean_backup_restore_report_timings(self, tmp_path, max_workers):
+        """Test that every stage handles each directory once and reports its time."""
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        names = [f"evaluate_2025010{i}_120000" for i in range(5)]
+        for name in names:
+            (checkpoint_dir / name / "1").mkdir(parents=True)
+            (checkpoint_dir / name / "1" / "run.json").write_text(name)
+        (checkpoint_dir / "evaluate_zips").mkdir()
+        (checkpoint_dir / "evaluate_zips" / "a.zip").touch()
+
+        backed_up = backup_evaluate_dirs(str(checkpoint_dir), max_workers=max_workers)
+        deleted = delete_evaluate_dirs(str(checkpoint_dir), max_workers=max_workers)
+        deleted_zips = delete_evaluate_zips(str(checkpoint_dir), max_workers=max_workers)
+        restored = restore_evaluate_dirs_from_backup(
+            str(checkpoint_dir), max_workers=max_workers
+        )
+
+        assert sorted(d.name for d in backed_up) == names
+        assert sorted(d.name for d in deleted) == names
+        assert [p.name for p in deleted_zips] == ["a.zip"]
+        assert sorted(d.name for d in restored) == names
+        assert all(t >= 0 for t in restored.values())
+        for name in names:
+            assert (checkpoint_dir / name / "1" / "run.json").read_text() == name
+        assert not (checkpoint_dir / "evaluate_zips" / "a.zip").exists()
+
+    def test_parallel_errors_propagate(self, tmp_path):
+        """Test that a failing directory operation is raised to the caller."""
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        (checkpoint_dir / "evaluate_a").mkdir(parents=True)
+        (checkpoint_dir / "evaluate_b").mkdir(parents=True)
+
+        with patch("blockassist.data.shutil.rmtree", side_effect=PermissionError("denied")), \
+             pytest.raises(PermissionError, match="denied"):
+            delete_evaluate_dirs(str(checkpoint_dir), max_workers=2)
@@ -0,0 +1,111 @@
+import logging
+from unittest.mock import patch
+
+from blockassist.early_stopping import TrainingStopper, get_validation_loss
+
+
+class FakeAlgorithm:
+    """Saves numbered checkpoint directories like an RLlib Algorithm."""
+
+    def __init__(self, tmp_path):
+        self.tmp_path = tmp_path
+        self.iteration = 0
+        self.saves = 0
+
+    def save(self):
+        self.saves += 1
+        checkpoint = self.tmp_path / f"checkpoint_{self.iteration:06d}"
+        checkpoint.mkdir()
+        return str(checkpoint)
+
+    def train(self):
+        raise AssertionError("trained after stopping")
+
+
+def make_result(iteration, loss=None, iter_seconds=1.0):
+    result = {"training_iteration": iteration, "time_this_iter_s": iter_seconds}
+    if loss is not None:
+        result["info"] = {"learner": {"human": {"validation": {"cross_entropy": loss}}}}
+    return result
+
+
+def run_iterations(stopper, algorithm, losses):
+    for iteration, loss in enumerate(losses, start=1):
+        algorithm.iteration = iteration
+        stopper.on_train_result(algorithm, make_result(iteration, loss))
+        if stopper.stop_reason:
+            return iteration
+
+
+class TestTrainingStopper:
+    def test_validation_loss_is_read_from_learner_info(self):
+        """Test that the held-out cross-entropy is found in mbag's results."""
+        assert get_validation_loss(make_result(1, 0.5)) == 0.5
+        assert get_validation_loss(make_result(1)) is None
+
+    def test_keeps_only_best_checkpoint(self, tmp_path):
+        """Test that each improvement is saved and replaces the previous best."""
+        stopper = TrainingStopper()
+        algorithm = FakeAlgorithm(tmp_path)
+
+        assert run_iterations(stopper, algorithm, [1.0, 0.8, 0.9, 0.7, 0.75]) is None
+
+        assert stopper.best_iteration == 4
+        assert stopper.best_loss == 0.7
+        assert stopper.best_checkpoint == str(tmp_path / "checkpoint_000004")
+        assert [p.name for p in tmp_path.iterdir()] == ["checkpoint_000004"]
+
+    def test_stops_after_patience_without_improvement(self, tmp_path):
+        """Test that training stops once the loss has not improved for patience iterations."""
+        stopper = TrainingStopper(patience=2)
+        algorithm = FakeAlgorithm(tmp_path)
+
+        stopped_at = run_iterations(stopper, algorithm, [1.0, 0.8, 0.85, 0.9, 0.5])
+
+        assert stopped_at == 4
+        assert stopper.stop_reason == "early_stopping"
+        assert stopper.best_iteration == 2
+        # mbag's loop keeps calling train(), which now returns the last result.
+        assert algorithm.train()["training_iteration"] == 4
+
+    def test_stops_before_exceeding_time_budget(self, tmp_path):
+        """Test that training stops when the next iteration would overrun the budget."""
+        stopper = TrainingStopper(time_budget_s=100)
+        algorithm = FakeAlgorithm(tmp_path)
+
+        with patch("blockassist.early_stopping.time.monotonic", side_effect=[0, 50, 85]):
+            with stopper.activate():
+                stopper.on_train_result(algorithm, make_result(1, iter_seconds=30))
+                assert stopper.stop_reason is None
+                stopper.on_train_result(algorithm, make_result(2, iter_seconds=30))
+
+        assert stopper.stop_reason == "time_budget"
+        assert stopper.best_checkpoint is None
+
+    def test_stopped_loop_saves_only_once(self, tmp_path, caplog):
+        """Test that mbag's remaining loop iterations neither train nor save again."""
+        stopper = TrainingStopper(time_budget_s=100)
+        algorithm = FakeAlgorithm(tmp_path)
+        mbag_log = logging.getLogger("train_mbag")
+
+        times = [0] + [4 * i for i in range(1, 26)]
+        with patch("blockassist.early_stopping.time.monotonic", side_effect=times):
+            with stopper.activate(), caplog.at_level(logging.INFO, "train_mbag"):
+                # mbag's training loop with its default save_freq of 25.
+                for train_iter in range(100):
+                    mbag_log.info(f"Starting training iteration {train_iter}")
+                    if stopper.stop_reason:
+                        result = algorithm.train()
+                    else:
+                        algorithm.iteration += 1
+                        result = make_result(algorithm.iteration, iter_seconds=4)
+                        stopper.on_train_result(algorithm, result)
+                    if algorithm.iteration % 25 == 0:
+                        checkpoint = algorithm.save()
+                final_checkpoint = algorithm.save()
+
+        assert stopper.stop_reason == "time_budget"
+        assert result["training_iteration"] == 25
+        assert algorithm.saves == 1
+        assert final_checkpoint == checkpoint == str(tmp_path / "checkpoint_000025")
+        assert len(caplog.records) == 25
@@ -1,5 +1,6 @@
+from pathlib import Path
 from types import SimpleNamespace
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import pytest
 
@@ -215,3 +216,16 @@ class TestEpisodeRunnerTelemetry:
 
         common_patches["mock_main"].assert_called_once()
         mock_telemetry_session.assert_not_called()
+
+    def test_after_episode_queues_background_conversion(self, common_patches):
+        """Test that each recorded evaluate dir is handed to the background converter."""
+        self.setup_mocks(common_patches, main_return_value={"goal_percentage_1_min": 0.5})
+        common_patches["mock_main"].evaluate_dir = Path("evaluate_x/1")
+        converter = MagicMock()
+
+        runner = EpisodeRunner(
+            "dummy_address_eoa", "dummy_checkpoint_dir", background_converter=converter
+        )
+        runner.start()
+
+        converter.submit.assert_called_once_with(Path("evaluate_x/1"))
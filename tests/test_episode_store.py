@@ -0,0 +1,123 @@
+import copy
+import pickle
+import zipfile
+from pathlib import Path
+
+import numpy as np
+from mbag.evaluation.episode import MbagEpisode
+
+from blockassist.episode_store import (
+    EPISODE_META_NAME,
+    EPISODE_STORE_NAME,
+    load_episode,
+    load_stored_episode,
+    migrate_checkpoint,
+    write_stored_episode,
+)
+
+
+def make_episode(length: int = 4, num_players: int = 2) -> MbagEpisode:
+    rng = np.random.default_rng(0)
+
+    def obs(t):
+        return (
+            rng.integers(0, 10, size=(3, 5, 4, 5), dtype=np.uint8),
+            rng.integers(0, 64, size=(num_players, 10), dtype=np.int32),
+            np.array(t, dtype=np.int32),
+        )
+
+    return MbagEpisode(
+        env_config={"num_players": num_players},
+        reward_history=[0.0] * length,
+        cumulative_reward=0.0,
+        length=length,
+        obs_history=[[obs(t) for _ in range(num_players)] for t in range(length)],
+        last_obs=[obs(length) for _ in range(num_players)],
+        info_history=[[{"step": t} for _ in range(num_players)] for t in range(length)],
+        last_infos=[{"step": length} for _ in range(num_players)],
+    )
+
+
+def write_episode_zip(run_dir: Path, episode: MbagEpisode) -> Path:
+    run_dir.mkdir(parents=True, exist_ok=True)
+    zip_path = run_dir / "episodes.zip"
+    with zipfile.ZipFile(zip_path, "w") as zipf:
+        with zipf.open("episodes.pickle", "w") as f:
+            pickle.dump((episode,), f)
+    return zip_path
+
+
+def assert_same_obs(a: MbagEpisode, b: MbagEpisode) -> None:
+    assert len(a.obs_history) == len(b.obs_history)
+    for step_a, step_b in zip(a.obs_history, b.obs_history):
+        for obs_a, obs_b in zip(step_a, step_b):
+            for piece_a, piece_b in zip(obs_a, obs_b):
+                np.testing.assert_array_equal(piece_a, piece_b)
+
+
+class TestEpisodeStore:
+    def test_round_trip(self, tmp_path):
+        """Test that a stored episode loads back with identical contents."""
+        episode = make_episode()
+        write_stored_episode(episode, tmp_path / "1")
+
+        loaded = load_stored_episode(tmp_path / "1")
+
+        assert loaded.length == episode.length
+        assert loaded.info_history == episode.info_history
+        assert_same_obs(loaded, episode)
+        world, inventory, t = loaded.obs_history[2][1]
+        assert isinstance(world, np.memmap) and isinstance(inventory, np.memmap)
+        assert t.shape == () and int(t) == 2
+
+    def test_deepcopy_is_copy_on_write(self, tmp_path):
+        """Test that modifying a deep copy leaves the store and original intact."""
+        write_stored_episode(make_episode(), tmp_path / "1")
+        loaded = load_stored_episode(tmp_path / "1")
+        original = loaded.obs_history[0][0][0].copy()
+
+        repaired = copy.deepcopy(loaded)
+        repaired.obs_history[0][0][0][...] = 255
+
+        np.testing.assert_array_equal(repaired.obs_history[0][0][0], 255)
+        np.testing.assert_array_equal(loaded.obs_history[0][0][0], original)
+        reloaded = load_stored_episode(tmp_path / "1")
+        np.testing.assert_array_equal(reloaded.obs_history[0][0][0], original)
+
+    def test_load_episode_dispatches_by_file(self, tmp_path):
+        """Test that load_episode reads both stored episodes and zips."""
+        episode = make_episode()
+        zip_path = write_episode_zip(tmp_path / "zip", episode)
+        write_stored_episode(episode, tmp_path / "store")
+
+        assert_same_obs(load_episode(str(zip_path)), episode)
+        assert_same_obs(load_episode(str(tmp_path / "store" / EPISODE_META_NAME)), episode)
+
+
+class TestMigrateCheckpoint:
+    def test_migrate_is_incremental_and_prunes(self, tmp_path):
+        """Test that migration only stores new zips and drops removed ones."""
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        zip_a = write_episode_zip(checkpoint_dir / "evaluate_a" / "1", make_episode(3))
+        write_episode_zip(checkpoint_dir / "evaluate_b" / "1", make_episode(5))
+        store = checkpoint_dir / EPISODE_STORE_NAME
+
+        first = migrate_checkpoint(str(checkpoint_dir))
+        assert sorted(p.relative_to(store).as_posix() for p in first) == [
+            "evaluate_a/1",
+            "evaluate_b/1",
+        ]
+        assert load_stored_episode(store / "evaluate_b" / "1").length == 5
+
+        assert migrate_checkpoint(str(checkpoint_dir)) == []
+
+        zip_a.unlink()
+        write_episode_zip(checkpoint_dir / "evaluate_c" / "1", make_episode(2))
+        third = migrate_checkpoint(str(checkpoint_dir))
+
+        assert [p.relative_to(store).as_posix() for p in third] == ["evaluate_c/1"]
+        assert not (store / "evaluate_a" / "1").exists()
+        assert sorted(
+            p.parent.relative_to(store).as_posix()
+            for p in store.glob(f"evaluate_*/**/{EPISODE_META_NAME}")
+        ) == ["evaluate_b/1", "evaluate_c/1"]
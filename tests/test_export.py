@@ -0,0 +1,113 @@
+import json
+import pickle
+
+import gymnasium as gym
+import numpy as np
+import pytest
+from ray.rllib.algorithms.ppo import PPOConfig
+from ray.rllib.algorithms.ppo.ppo_torch_policy import PPOTorchPolicy
+
+from blockassist.export import (
+    dequantize_weights,
+    export_checkpoint,
+    load_exported_policy,
+    quantize_weights,
+)
+
+
+@pytest.fixture(scope="module")
+def policy():
+    config = (
+        PPOConfig()
+        .framework("torch")
+        .rl_module(_enable_rl_module_api=False)
+        .training(_enable_learner_api=False, model={"fcnet_hiddens": [64, 64]})
+        .to_dict()
+    )
+    return PPOTorchPolicy(gym.spaces.Box(-1, 1, (8,)), gym.spaces.Discrete(4), config)
+
+
+@pytest.fixture
+def checkpoint_dir(tmp_path, policy):
+    """An algorithm checkpoint laid out like the ones training writes."""
+    checkpoint_dir = tmp_path / "checkpoint_000001"
+    policy.export_checkpoint(str(checkpoint_dir / "policies" / "human"))
+    policy.export_checkpoint(str(checkpoint_dir / "policies" / "assistant"))
+    (checkpoint_dir / "algorithm_state.pkl").write_bytes(b"state" * 1000)
+    return checkpoint_dir
+
+
+def read_state(export_dir):
+    with open(export_dir / "policies" / "human" / "policy_state.pkl", "rb") as f:
+        return pickle.load(f)
+
+
+class TestQuantization:
+    def test_int8_round_trip_is_close(self):
+        """Test that int8 weights dequantize to within one step of their row scale."""
+        rng = np.random.default_rng(0)
+        weights = {
+            "layer.weight": rng.normal(size=(16, 8)).astype(np.float32),
+            "layer.bias": rng.normal(size=16).astype(np.float32),
+        }
+        tensors = quantize_weights(weights, "int8")
+        assert str(tensors["layer.weight"].dtype) == "torch.int8"
+        assert str(tensors["layer.bias"].dtype) == "torch.float32"
+
+        restored = dequantize_weights(tensors)
+        assert set(restored) == set(weights)
+        step = np.abs(weights["layer.weight"]).max(axis=1, keepdims=True) / 127
+        assert np.all(np.abs(restored["layer.weight"] - weights["layer.weight"]) <= step)
+        np.testing.assert_array_equal(restored["layer.bias"], weights["layer.bias"])
+
+
+class TestExportCheckpoint:
+    def test_rllib_export_keeps_one_policy_without_optimizer(self, tmp_path, checkpoint_dir):
+        """Test that the export drops the algorithm state, other policies and optimizer state."""
+        export_dir = export_checkpoint(
+            checkpoint_dir, tmp_path / "export", export_format="rllib"
+        )
+
+        assert sorted(p.name for p in (export_dir / "policies").iterdir()) == ["human"]
+        assert not (export_dir / "algorithm_state.pkl").exists()
+        state = read_state(export_dir)
+        assert "_optimizer_variables" not in state
+        assert state["weights"]
+        info = json.loads((export_dir / "export.json").read_text())
+        assert info["max_abs_diff"] == 0.0
+
+    @pytest.mark.parametrize("quantization", ["none", "fp16", "int8"])
+    def test_safetensors_export_round_trips(self, tmp_path, checkpoint_dir, policy, quantization):
+        """Test that quantized exports load back into a policy close to the original."""
+        export_dir = export_checkpoint(
+            checkpoint_dir, tmp_path / "export", quantization=quantization
+        )
+
+        assert (export_dir / "policies" / "human" / "model.safetensors").exists()
+        assert read_state(export_dir)["weights"] == {}
+        exported = load_exported_policy(export_dir, "human")
+        for name, weight in policy.get_weights().items():
+            np.testing.assert_allclose(exported.get_weights()[name], weight, atol=0.05)
+
+    def test_quantized_export_is_smaller(self, tmp_path, checkpoint_dir):
+        """Test that int8 weights take less space than float32 ones."""
+        sizes = {}
+        for quantization in ("none", "int8"):
+            export_dir = export_checkpoint(
+                checkpoint_dir, tmp_path / quantization, quantization=quantization
+            )
+            sizes[quantization] = (export_dir / "policies" / "human" / "model.safetensors").stat().st_size
+        assert sizes["int8"] < sizes["none"] / 2
+
+    def test_failed_verification_leaves_no_export(self, tmp_path, checkpoint_dir):
+        """Test that an export outside the tolerance raises and is removed."""
+        with pytest.raises(ValueError, match="tolerance"):
+            export_checkpoint(
+                checkpoint_dir, tmp_path / "export", quantization="int8", tolerance=0.0
+            )
+        assert list(tmp_path.glob("export*")) == []
+
+    def test_missing_policy_raises(self, tmp_path, checkpoint_dir):
+        """Test that asking for a policy the checkpoint lacks fails clearly."""
+        with pytest.raises(FileNotFoundError, match="assistant"):
+            export_checkpoint(checkpoint_dir, tmp_path / "export", policy_id="other")
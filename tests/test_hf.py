@@ -0,0 +1,151 @@
+import hashlib
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from huggingface_hub.hf_api import RepoFile
+
+from blockassist.distributed import hf
+from blockassist.distributed.hf import HfUploadRecord, upload_to_huggingface
+
+_REPO_ID = "user/blockassist-model"
+# Files at least this large are stored in LFS, like HuggingFace does for weights.
+_LFS_MIN_SIZE = 64
+
+
+class FakeHfApi:
+    """In-memory HuggingFace repo with git blob IDs and LFS SHA-256s."""
+
+    def __init__(self):
+        self.files: dict[str, bytes] = {}
+        self.commits: list[list[str]] = []
+        self.list_error = None
+
+    def create_repo(self, **kwargs):
+        pass
+
+    def list_repo_tree(self, repo_id, recursive=False, repo_type=None, revision=None):
+        if self.list_error:
+            raise self.list_error
+        entries = []
+        for path, data in self.files.items():
+            lfs = None
+            if len(data) >= _LFS_MIN_SIZE:
+                sha256 = hashlib.sha256(data).hexdigest()
+                lfs = {"size": len(data), "oid": sha256, "pointerSize": 128}
+            blob_id = hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+            entries.append(RepoFile(path=path, size=len(data), oid=blob_id, lfs=lfs))
+        return entries
+
+    def create_commit(self, repo_id, operations, commit_message, repo_type=None):
+        self.commits.append([op.path_in_repo for op in operations])
+        for op in operations:
+            with op.as_file() as f:
+                self.files[op.path_in_repo] = f.read()
+        return SimpleNamespace(oid=f"commit{len(self.commits)}")
+
+
+@pytest.fixture
+def fake_api():
+    api = FakeHfApi()
+    with (
+        patch.object(hf, "HfApi", return_value=api),
+        patch.object(hf.telemetry, "push_telemetry_event_uploaded"),
+    ):
+        yield api
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    model_path = tmp_path / "model"
+    (model_path / "policies" / "human").mkdir(parents=True)
+    (model_path / "policies" / "human" / "model.safetensors").write_bytes(b"w" * 128)
+    (model_path / "policies" / "human" / "rllib_checkpoint.json").write_text("{}")
+    return model_path
+
+
+def upload(model_path, record_path, metadata=None):
+    return upload_to_huggingface(
+        model_path=model_path,
+        user_id="user",
+        repo_id=_REPO_ID,
+        chain_metadata_dict=metadata or {"numSessions": 1},
+        record_path=record_path,
+    )
+
+
+class TestUploadToHuggingface:
+    def test_first_upload_is_one_commit(self, fake_api, model_dir, tmp_path):
+        """Test that all files and the metadata are pushed in a single commit."""
+        git_ref = upload(model_dir, tmp_path / "record.json")
+
+        assert git_ref == "commit1"
+        assert sorted(fake_api.commits[0]) == [
+            "README.md",
+            "gensyn.json",
+            "policies/human/model.safetensors",
+            "policies/human/rllib_checkpoint.json",
+        ]
+        assert json.loads(fake_api.files["gensyn.json"]) == {"numSessions": 1}
+
+    def test_unchanged_files_are_skipped(self, fake_api, model_dir, tmp_path):
+        """Test that a re-upload only pushes changed files and the metadata."""
+        record_path = tmp_path / "record.json"
+        upload(model_dir, record_path)
+        (model_dir / "policies" / "human" / "rllib_checkpoint.json").write_text('{"a": 1}')
+
+        git_ref = upload(model_dir, record_path, {"numSessions": 2})
+
+        assert git_ref == "commit2"
+        assert sorted(fake_api.commits[1]) == [
+            "gensyn.json",
+            "policies/human/rllib_checkpoint.json",
+        ]
+        assert json.loads(fake_api.files["gensyn.json"]) == {"numSessions": 2}
+
+    def test_lfs_files_are_compared_without_record(self, fake_api, model_dir):
+        """Test that LFS hashes alone are enough to skip unchanged weights."""
+        upload(model_dir, None)
+        upload(model_dir, None)
+
+        assert "policies/human/model.safetensors" not in fake_api.commits[1]
+        # Small files have no SHA-256 on the Hub, so they are pushed again.
+        assert "policies/human/rllib_checkpoint.json" in fake_api.commits[1]
+
+    def test_files_changed_on_hub_are_uploaded(self, fake_api, model_dir, tmp_path):
+        """Test that a recorded file is re-uploaded if the repo no longer holds it."""
+        record_path = tmp_path / "record.json"
+        upload(model_dir, record_path)
+        fake_api.files["policies/human/rllib_checkpoint.json"] = b"edited"
+
+        upload(model_dir, record_path)
+
+        assert "policies/human/rllib_checkpoint.json" in fake_api.commits[1]
+        assert fake_api.files["policies/human/rllib_checkpoint.json"] == b"{}"
+
+    def test_listing_failure_uploads_everything(self, fake_api, model_dir, tmp_path):
+        """Test that all files are pushed if the repo cannot be listed."""
+        record_path = tmp_path / "record.json"
+        upload(model_dir, record_path)
+        fake_api.list_error = OSError("offline")
+
+        upload(model_dir, record_path)
+
+        assert len(fake_api.commits[1]) == 4
+
+
+class TestHfUploadRecord:
+    def test_record_round_trip(self, tmp_path):
+        """Test that recorded files are read back per repo."""
+        files = {"a.bin": {"sha256": "1", "blob_id": "2"}}
+        HfUploadRecord(tmp_path / "record.json").record_upload(_REPO_ID, "abc", files)
+
+        record = HfUploadRecord(tmp_path / "record.json")
+        assert record.get_files(_REPO_ID) == files
+        assert record.get_files("other/repo") == {}
+
+    def test_unreadable_record_is_ignored(self, tmp_path):
+        """Test that a corrupt record behaves like an empty one."""
+        (tmp_path / "record.json").write_text("not json")
+        assert HfUploadRecord(tmp_path / "record.json").get_files(_REPO_ID) == {}
@@ -0,0 +1,74 @@
+import json
+
+from blockassist.metrics import TrainingMetrics, build_logger_creator
+
+
+def read_events(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+class TestTrainingMetrics:
+    def test_phase_writes_start_and_end_events(self, tmp_path):
+        """Test that a phase is recorded with its duration, CPU and memory."""
+        path = tmp_path / "logs" / "training_metrics.jsonl"
+        metrics = TrainingMetrics(path)
+
+        with metrics.phase("conversion"):
+            sum(range(10000))
+
+        start, end = read_events(path)
+        assert start["event"] == "phase_start"
+        assert start["phase"] == "conversion"
+        assert end["event"] == "phase"
+        assert end["phase"] == "conversion"
+        assert end["duration_s"] >= 0
+        assert end["cpu_percent"] >= 0
+        assert end["rss_mb"] > 0
+        assert end["peak_rss_mb"] > 0
+
+    def test_without_path_keeps_events_in_memory(self, tmp_path):
+        """Test that metrics without a path write no file."""
+        metrics = TrainingMetrics()
+        metrics.record("start", num_training_iters=2)
+        assert metrics.events[0]["num_training_iters"] == 2
+        assert list(tmp_path.iterdir()) == []
+
+    def test_rllib_logger_reports_iterations(self, tmp_path):
+        """Test that trainer results reach the active metrics through the logger."""
+        path = tmp_path / "training_metrics.jsonl"
+        metrics = TrainingMetrics(path)
+
+        with metrics.activate():
+            logger = build_logger_creator(str(tmp_path / "run"))({})
+            for iteration in (1, 2):
+                logger.on_result(
+                    {
+                        "training_iteration": iteration,
+                        "time_this_iter_s": 2.0,
+                        "num_env_steps_trained_this_iter": 100,
+                    }
+                )
+            logger.close()
+        metrics.summary(session_count=1)
+
+        events = read_events(path)
+        assert [e.get("phase") for e in events if e["event"] == "phase"] == [
+            "trainer_setup",
+            "checkpoint_write",
+        ]
+        iterations = [e for e in events if e["event"] == "iteration"]
+        assert [e["iteration"] for e in iterations] == [1, 2]
+        assert all(e["samples_per_s"] == 50.0 for e in iterations)
+        summary = events[-1]
+        assert summary["event"] == "summary"
+        assert summary["samples"] == 200
+        assert summary["samples_per_s"] == 50.0
+        assert summary["session_count"] == 1
+
+    def test_logger_is_inert_without_active_metrics(self, tmp_path):
+        """Test that trainers built outside activate() do not record anything."""
+        metrics = TrainingMetrics(tmp_path / "training_metrics.jsonl")
+        logger = build_logger_creator(str(tmp_path / "run"))({})
+        logger.on_result({"training_iteration": 1, "time_this_iter_s": 1.0})
+        logger.close()
+        assert metrics.events == []
@@ -0,0 +1,56 @@
+import pytest
+import torch
+import torch.nn as nn
+
+from blockassist.merging.bagging import bag_models
+from blockassist.merging.parallel import ParallelEnsemble
+
+
+def make_heterogeneous_models() -> list[nn.Module]:
+    torch.manual_seed(0)
+    return [
+        nn.Linear(8, 4),
+        nn.Sequential(nn.Linear(8, 16), nn.ReLU(), nn.Linear(16, 4)),
+        nn.Sequential(nn.Linear(8, 32), nn.Tanh(), nn.Linear(32, 4)),
+    ]
+
+
+class TestParallelEnsemble:
+    def test_matches_bagging(self):
+        """Test that models spread over workers give the bag_models output."""
+        models = make_heterogeneous_models()
+        weights = [0.5, 0.3, 0.2]
+        x = torch.randn(5, 8)
+        expected = bag_models(models, weights=weights)(x)
+
+        with ParallelEnsemble(models, weights=weights, num_workers=2) as ensemble:
+            assert ensemble.num_workers == 2
+            assert torch.allclose(ensemble(x), expected, atol=1e-6)
+            # Workers stay up between calls.
+            assert torch.allclose(ensemble(x * 2), bag_models(models, weights=weights)(x * 2))
+
+    def test_custom_aggregation_gets_outputs_in_model_order(self):
+        """Test that outputs are gathered back in the order of the models."""
+        models = make_heterogeneous_models()
+        x = torch.randn(2, 8)
+
+        with ParallelEnsemble(models, aggregation_fn=list, num_workers=2) as ensemble:
+            outputs = ensemble(x)
+
+        for model, output in zip(models, outputs):
+            assert torch.allclose(output, model(x), atol=1e-6)
+
+    def test_worker_errors_are_raised(self):
+        """Test that a failing forward raises in the caller and workers recover."""
+        with ParallelEnsemble(make_heterogeneous_models(), num_workers=2) as ensemble:
+            with pytest.raises(RuntimeError):
+                ensemble(torch.randn(2, 3))
+            assert ensemble(torch.randn(2, 8)).shape == (2, 4)
+
+    def test_closed_ensemble_raises(self):
+        """Test that calling a closed ensemble fails instead of hanging."""
+        ensemble = ParallelEnsemble([nn.Linear(8, 4)], num_workers=1)
+        ensemble.close()
+        ensemble.close()
+        with pytest.raises(RuntimeError):
+            ensemble(torch.randn(2, 8))
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from blockassist.readiness import (
+    REQUIRED_RUN_FILES,
+    AbandonedRunError,
+    get_abandoned_reason,
+    get_run_dirs,
+    is_evaluate_dir_ready,
+    is_run_dir_finished,
+    wait_for_evaluate_dir,
+)
+
+
+def _write_run(run_dir: Path, status: str = "COMPLETED") -> None:
+    run_dir.mkdir(parents=True, exist_ok=True)
+    for file in REQUIRED_RUN_FILES:
+        if file != "run.json":
+            (run_dir / file).write_text("{}")
+    (run_dir / "run.json").write_text(f'{{"status": "{status}"}}')
+
+
+class TestRunReadiness:
+    def test_get_run_dirs_accepts_run_and_evaluate_dirs(self, tmp_path):
+        """Test that both an evaluate_ dir and one of its runs resolve to run dirs."""
+        evaluate_dir = tmp_path / "evaluate_20250101_120000"
+        _write_run(evaluate_dir / "1")
+        _write_run(evaluate_dir / "2")
+        (evaluate_dir / "_sources").mkdir()
+
+        assert sorted(d.name for d in get_run_dirs(evaluate_dir)) == ["1", "2"]
+        assert get_run_dirs(evaluate_dir / "1") == [evaluate_dir / "1"]
+
+    @pytest.mark.parametrize(
+        "content, expected",
+        [
+            ('{"status": "COMPLETED"}', True),
+            ('{"status": "INTERRUPTED"}', True),
+            ('{"status": "RUNNING"}', False),
+            ('{"status": "COMPL', False),
+        ],
+    )
+    def test_is_run_dir_finished(self, tmp_path, content, expected):
+        """Test that only fully written, finished run.json files count."""
+        _write_run(tmp_path / "1")
+        (tmp_path / "1" / "run.json").write_text(content)
+        assert is_run_dir_finished(tmp_path / "1") is expected
+
+    def test_stale_running_run_is_not_finished(self, tmp_path):
+        """Test that a RUNNING run which stopped heartbeating is reported as abandoned."""
+        _write_run(tmp_path / "1", status="RUNNING")
+        old = time.time() - 3600
+        os.utime(tmp_path / "1" / "run.json", (old, old))
+
+        assert not is_run_dir_finished(tmp_path / "1")
+        assert get_abandoned_reason(tmp_path / "1") == "stopped heartbeating"
+
+    @pytest.mark.parametrize("status", ["COMPLETED", "FAILED"])
+    def test_finished_run_missing_files_is_not_finished(self, tmp_path, status):
+        """Test that a finished run without all required files is never ready."""
+        _write_run(tmp_path / "1", status=status)
+        (tmp_path / "1" / "episodes.zip").unlink()
+
+        assert not is_run_dir_finished(tmp_path / "1")
+        assert "episodes.zip" in get_abandoned_reason(tmp_path / "1")
+        with pytest.raises(AbandonedRunError, match="episodes.zip"):
+            wait_for_evaluate_dir(tmp_path / "1", timeout=0.3)
+
+    def test_is_evaluate_dir_ready_requires_a_run(self, tmp_path):
+        """Test that an empty or missing evaluate dir is not ready."""
+        evaluate_dir = tmp_path / "evaluate_20250101_120000"
+        assert not is_evaluate_dir_ready(evaluate_dir)
+        evaluate_dir.mkdir()
+        assert not is_evaluate_dir_ready(evaluate_dir)
+        _write_run(evaluate_dir / "1")
+        assert is_evaluate_dir_ready(evaluate_dir)
+
+
+class TestWaitForEvaluateDir:
+    @pytest.mark.parametrize("use_inotify", [True, False])
+    def test_wait_returns_once_run_completes(self, tmp_path, use_inotify):
+        """Test that waiting ends as soon as a run dir created later completes."""
+        run_dir = tmp_path / "evaluate_20250101_120000" / "1"
+
+        def record_session():
+            time.sleep(0.2)
+            _write_run(run_dir, status="RUNNING")
+            time.sleep(0.2)
+            (run_dir / "run.json").write_text('{"status": "COMPLETED"}')
+
+        writer = threading.Thread(target=record_session)
+        writer.start()
+        start = time.monotonic()
+        if use_inotify:
+            wait_for_evaluate_dir(run_dir, timeout=10)
+        else:
+            with patch("blockassist.readiness._open_inotify", return_value=None):
+                wait_for_evaluate_dir(run_dir, timeout=10)
+        writer.join()
+
+        assert time.monotonic() - start < 5
+        assert is_evaluate_dir_ready(run_dir)
+
+    def test_wait_raises_for_missing_dir(self, tmp_path):
+        """Test that a directory that never appears raises FileNotFoundError."""
+        with pytest.raises(FileNotFoundError, match="does not exist after waiting"):
+            wait_for_evaluate_dir(tmp_path / "evaluate_missing", timeout=0.3)
+
+    def test_wait_raises_for_unfinished_run(self, tmp_path):
+        """Test that a run still in progress at the deadline raises TimeoutError."""
+        _write_run(tmp_path / "1", status="RUNNING")
+        with pytest.raises(TimeoutError, match="did not finish"):
+            wait_for_evaluate_dir(tmp_path / "1", timeout=0.3)
+
+    def test_wait_gives_up_on_abandoned_run_at_once(self, tmp_path):
+        """Test that a run that stopped heartbeating fails without waiting for the timeout."""
+        _write_run(tmp_path / "1", status="RUNNING")
+        old = time.time() - 3600
+        os.utime(tmp_path / "1" / "run.json", (old, old))
+
+        start = time.monotonic()
+        with pytest.raises(AbandonedRunError, match="stopped heartbeating"):
+            wait_for_evaluate_dir(tmp_path / "1", timeout=60)
+        assert time.monotonic() - start < 5
@@ -0,0 +1,226 @@
+import io
+import os
+import zipfile
+from unittest.mock import patch
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from blockassist.distributed.s3 import (
+    S3MultipartWriter,
+    configure_s3_transfer,
+    get_s3_client,
+    upload_zip_to_s3,
+)
+
+_BUCKET = "blockassist-episode"
+
+
+@pytest.fixture
+def s3_bucket(monkeypatch):
+    """Moto-backed bucket with fresh transfer settings and client cache."""
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        configure_s3_transfer(
+            multipart_threshold_mb=5,
+            multipart_chunksize_mb=5,
+            max_concurrency=2,
+            max_part_attempts=3,
+        )
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=_BUCKET)
+        yield client
+    configure_s3_transfer()
+
+
+class TestS3Client:
+    def test_get_s3_client_is_cached(self, s3_bucket):
+        """Test that the same client is reused within a process."""
+        assert get_s3_client() is get_s3_client()
+
+    def test_configure_s3_transfer_resets_client(self, s3_bucket):
+        """Test that changing transfer settings rebuilds the client."""
+        client = get_s3_client()
+        configure_s3_transfer(max_concurrency=4)
+        assert get_s3_client() is not client
+
+    def test_client_does_not_retry(self, s3_bucket):
+        """Test that botocore leaves retries to the upload functions."""
+        assert get_s3_client().meta.config.retries["total_max_attempts"] == 1
+
+
+class TestUploadZipToS3:
+    def test_upload_small_zip(self, s3_bucket, tmp_path):
+        """Test that zips below the multipart threshold are uploaded whole."""
+        zip_path = tmp_path / "small.zip"
+        zip_path.write_bytes(b"small zip")
+
+        uri = upload_zip_to_s3(str(zip_path), _BUCKET, "user/small.zip")
+
+        assert uri == f"s3://{_BUCKET}/user/small.zip"
+        body = s3_bucket.get_object(Bucket=_BUCKET, Key="user/small.zip")["Body"]
+        assert body.read() == b"small zip"
+
+    def test_upload_small_zip_is_retried(self, s3_bucket, tmp_path):
+        """Test that a failed whole-file upload is retried."""
+        zip_path = tmp_path / "small.zip"
+        zip_path.write_bytes(b"small zip")
+
+        client = get_s3_client()
+        real_upload_file = client.upload_file
+        calls = []
+
+        def flaky_upload_file(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                raise ConnectionError("connection dropped")
+            return real_upload_file(*args, **kwargs)
+
+        with patch.object(client, "upload_file", side_effect=flaky_upload_file), \
+             patch("blockassist.distributed.s3.time.sleep"):
+            upload_zip_to_s3(str(zip_path), _BUCKET, "user/small.zip")
+
+        assert len(calls) == 2
+        body = s3_bucket.get_object(Bucket=_BUCKET, Key="user/small.zip")["Body"]
+        assert body.read() == b"small zip"
+
+    def test_upload_multipart_zip(self, s3_bucket, tmp_path):
+        """Test that large zips are uploaded in parts and reassembled."""
+        zip_path = tmp_path / "large.zip"
+        content = os.urandom(12 * 1024 * 1024)
+        zip_path.write_bytes(content)
+
+        upload_zip_to_s3(str(zip_path), _BUCKET, "user/large.zip")
+
+        body = s3_bucket.get_object(Bucket=_BUCKET, Key="user/large.zip")["Body"]
+        assert body.read() == content
+
+    def test_upload_multipart_retries_only_failed_part(self, s3_bucket, tmp_path):
+        """Test that a dropped part is retried without resending the others."""
+        zip_path = tmp_path / "large.zip"
+        content = os.urandom(12 * 1024 * 1024)
+        zip_path.write_bytes(content)
+
+        client = get_s3_client()
+        real_upload_part = client.upload_part
+        calls = []
+
+        def flaky_upload_part(**kwargs):
+            calls.append(kwargs["PartNumber"])
+            if kwargs["PartNumber"] == 2 and calls.count(2) == 1:
+                raise ConnectionError("connection dropped")
+            return real_upload_part(**kwargs)
+
+        with patch.object(client, "upload_part", side_effect=flaky_upload_part), \
+             patch("blockassist.distributed.s3.time.sleep"):
+            upload_zip_to_s3(str(zip_path), _BUCKET, "user/large.zip")
+
+        assert sorted(calls) == [1, 2, 2, 3]
+        body = s3_bucket.get_object(Bucket=_BUCKET, Key="user/large.zip")["Body"]
+        assert body.read() == content
+
+    def test_upload_multipart_aborts_after_max_attempts(self, s3_bucket, tmp_path):
+        """Test that the multipart upload is aborted once a part keeps failing."""
+        zip_path = tmp_path / "large.zip"
+        zip_path.write_bytes(os.urandom(6 * 1024 * 1024))
+
+        client = get_s3_client()
+        with patch.object(
+            client, "upload_part", side_effect=ConnectionError("connection dropped")
+        ), patch("blockassist.distributed.s3.time.sleep"), pytest.raises(
+            ConnectionError
+        ):
+            upload_zip_to_s3(str(zip_path), _BUCKET, "user/large.zip")
+
+        assert s3_bucket.list_multipart_uploads(Bucket=_BUCKET).get("Uploads") is None
+
+    def test_upload_multipart_retries_create_and_complete(self, s3_bucket, tmp_path):
+        """Test that starting and completing a multipart upload are retried too."""
+        zip_path = tmp_path / "large.zip"
+        content = os.urandom(6 * 1024 * 1024)
+        zip_path.write_bytes(content)
+
+        client = get_s3_client()
+        calls = []
+
+        def fail_first_call(name):
+            real = getattr(client, name)
+
+            def flaky(**kwargs):
+                calls.append(name)
+                if calls.count(name) == 1:
+                    raise ConnectionError("connection dropped")
+                return real(**kwargs)
+
+            return flaky
+
+        with patch.object(
+            client,
+            "create_multipart_upload",
+            side_effect=fail_first_call("create_multipart_upload"),
+        ), patch.object(
+            client,
+            "complete_multipart_upload",
+            side_effect=fail_first_call("complete_multipart_upload"),
+        ), patch("blockassist.distributed.s3.time.sleep"):
+            upload_zip_to_s3(str(zip_path), _BUCKET, "user/large.zip")
+
+        assert calls.count("create_multipart_upload") == 2
+        assert calls.count("complete_multipart_upload") == 2
+        body = s3_bucket.get_object(Bucket=_BUCKET, Key="user/large.zip")["Body"]
+        assert body.read() == content
+
+    def test_upload_multipart_abort_failure_keeps_error(self, s3_bucket, tmp_path):
+        """Test that a failing abort does not hide the error that caused it."""
+        zip_path = tmp_path / "large.zip"
+        zip_path.write_bytes(os.urandom(6 * 1024 * 1024))
+
+        client = get_s3_client()
+        with patch.object(
+            client, "upload_part", side_effect=ConnectionError("connection dropped")
+        ), patch.object(
+            client, "abort_multipart_upload", side_effect=OSError("abort failed")
+        ), patch("blockassist.distributed.s3.time.sleep"), pytest.raises(
+            ConnectionError
+        ):
+            upload_zip_to_s3(str(zip_path), _BUCKET, "user/large.zip")
+
+    def test_upload_missing_zip(self, tmp_path):
+        """Test that a missing zip raises FileNotFoundError."""
+        with pytest.raises(FileNotFoundError, match="Zip file does not exist"):
+            upload_zip_to_s3(str(tmp_path / "missing.zip"), _BUCKET)
+
+
+class TestS3MultipartWriter:
+    def test_stream_zip_round_trip(self, s3_bucket):
+        """Test that a zip written to the stream is uploaded intact in parts."""
+        payload = os.urandom(11 * 1024 * 1024)
+        with S3MultipartWriter(_BUCKET, "user/stream.zip") as writer:
+            with zipfile.ZipFile(writer, "w") as zipf:
+                zipf.writestr("1/episodes.zip", payload)
+                zipf.writestr("1/run.json", '{"status": "COMPLETED"}')
+            assert writer.tell() > len(payload)
+
+        body = s3_bucket.get_object(Bucket=_BUCKET, Key="user/stream.zip")["Body"]
+        with zipfile.ZipFile(io.BytesIO(body.read())) as zipf:
+            assert zipf.read("1/episodes.zip") == payload
+            assert zipf.read("1/run.json") == b'{"status": "COMPLETED"}'
+
+    def test_stream_buffers_at_most_one_part(self, s3_bucket):
+        """Test that full parts are uploaded as soon as they are buffered."""
+        writer = S3MultipartWriter(_BUCKET, "user/stream.zip")
+        writer.write(os.urandom(12 * 1024 * 1024))
+        assert len(writer._parts) == 2
+        assert len(writer._buffer) < writer.part_size
+        writer.close()
+
+    def test_stream_aborts_on_exception(self, s3_bucket):
+        """Test that leaving the with block through an exception aborts the upload."""
+        with pytest.raises(RuntimeError):
+            with S3MultipartWriter(_BUCKET, "user/stream.zip") as writer:
+                writer.write(b"partial")
+                raise RuntimeError("zip failed")
+
+        assert s3_bucket.list_multipart_uploads(Bucket=_BUCKET).get("Uploads") is None
+        assert "Contents" not in s3_bucket.list_objects_v2(Bucket=_BUCKET)
@@ -0,0 +1,104 @@
+import json
+import pickle
+import weakref
+
+import numpy as np
+import pytest
+import torch
+import torch.nn as nn
+
+from blockassist.merging.bagging import bag_models
+from blockassist.merging.streaming import (
+    RunningWeightedMean,
+    find_policy_checkpoints,
+    stream_average_state_dicts,
+    stream_bagged_outputs,
+    stream_merge_policy_checkpoints,
+)
+from blockassist.merging.weight_merging import merge_models
+
+
+def write_policy_checkpoint(checkpoint_dir, weights: dict) -> None:
+    policy_dir = checkpoint_dir / "policies" / "human"
+    policy_dir.mkdir(parents=True)
+    checkpoint_info = {"state_file": "policy_state.pkl"}
+    (policy_dir / "rllib_checkpoint.json").write_text(json.dumps(checkpoint_info))
+    with open(policy_dir / "policy_state.pkl", "wb") as f:
+        pickle.dump({"weights": weights}, f)
+
+
+class TestRunningWeightedMean:
+    def test_matches_weighted_average(self):
+        """Test that the running mean equals the weighted average of all sets."""
+        values = [torch.randn(3, 2) for _ in range(5)]
+        weights = [1.0, 0.0, 2.5, 3.0, 0.5]
+
+        mean = RunningWeightedMean()
+        for value, weight in zip(values, weights):
+            mean.add({"w": value}, weight)
+
+        expected = sum(w * v for w, v in zip(weights, values)) / sum(weights)
+        assert torch.allclose(mean.result()["w"], expected, atol=1e-6)
+
+    def test_inputs_are_not_modified(self):
+        """Test that the first set is copied rather than accumulated into."""
+        first = np.ones(3, dtype=np.float32)
+        mean = RunningWeightedMean()
+        mean.add({"w": first})
+        mean.add({"w": np.zeros(3, dtype=np.float32)})
+        np.testing.assert_array_equal(first, 1.0)
+
+    def test_mismatched_sets_raise(self):
+        """Test that sets with other names or shapes are rejected."""
+        mean = RunningWeightedMean()
+        mean.add({"w": torch.zeros(2)})
+        with pytest.raises(ValueError):
+            mean.add({"v": torch.zeros(2)})
+        with pytest.raises(ValueError):
+            mean.add({"w": torch.zeros(3)})
+
+
+class TestStreaming:
+    def test_state_dicts_match_merge_models(self, make_mlps):
+        """Test that streaming parameter averaging equals merge_models."""
+        models = make_mlps(4)
+        weights = [1.0, 2.0, 3.0, 4.0]
+
+        streamed = stream_average_state_dicts((m.state_dict() for m in models), weights)
+
+        expected = merge_models(models, weights=weights).state_dict()
+        for name, tensor in expected.items():
+            assert torch.allclose(streamed[name], tensor, atol=1e-6)
+
+    def test_outputs_match_bagging_one_model_at_a_time(self, make_mlps):
+        """Test that streamed outputs equal bag_models while models are freed."""
+        x = torch.randn(5, 8)
+        expected = bag_models(make_mlps(3))(x)
+        alive = []
+
+        def load_models():
+            torch.manual_seed(0)
+            for _ in range(3):
+                model = nn.Sequential(nn.Linear(8, 16), nn.ReLU(), nn.Linear(16, 4))
+                alive.append(weakref.ref(model))
+                assert sum(ref() is not None for ref in alive) == 1
+                yield model
+                del model
+
+        assert torch.allclose(stream_bagged_outputs(load_models(), x), expected, atol=1e-6)
+
+    def test_merge_policy_checkpoints(self, tmp_path):
+        """Test that a policy is averaged over every snapshot under a directory."""
+        for i, value in enumerate([1.0, 2.0, 6.0]):
+            weights = {"fc.weight": np.full((2, 2), value, dtype=np.float32)}
+            write_policy_checkpoint(tmp_path / f"snapshot_{i}", weights)
+
+        assert len(find_policy_checkpoints(tmp_path)) == 3
+        merged = stream_merge_policy_checkpoints(tmp_path)
+        np.testing.assert_allclose(merged["fc.weight"], np.full((2, 2), 3.0))
+        assert merged["fc.weight"].dtype == np.float32
+
+    def test_no_checkpoints_raise(self, tmp_path):
+        """Test that merging an empty directory fails."""
+        with pytest.raises(FileNotFoundError):
+            stream_merge_policy_checkpoints(tmp_path)
@@ -1,8 +1,20 @@
-from unittest.mock import patch
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import MagicMock, patch
 
 import pytest
 
-from blockassist.train import TrainingRunner
+from blockassist import early_stopping, metrics
+from blockassist.continual import ContinualTrainingState
+from blockassist.globals import get_identifier
+from blockassist.train import (
+    BackgroundConverter,
+    TrainingRunner,
+    _precompute_evaluate_dir,
+    run_sharded_convert_main,
+)
 
 
 class TestTrainingRunnerTelemetry:
@@ -175,4 +187,329 @@ class TestTrainingRunnerTelemetry:
         mock_convert.assert_called_once()
         mock_train.assert_called_once()
         # Verify telemetry was NOT called since only KeyboardInterrupt is caught
-        mock_telemetry_trained.assert_not_called()
\ No newline at end of file
+        mock_telemetry_trained.assert_not_called()
+
+    def test_start_with_episode_store_migrates_before_convert(self, common_patches):
+        """Test that the episode store is synced and used for conversion."""
+        mock_convert = common_patches["mock_convert"]
+        mock_train = common_patches["mock_train"]
+
+        self.setup_mocks(common_patches, config={"test": "config"}, out_dir="/out")
+        mock_train.return_value = {"final_checkpoint": "/path/to/model"}
+
+        with patch("blockassist.train.episode_store.migrate_checkpoint") as mock_migrate:
+            runner = TrainingRunner("dummy_address_eoa", use_episode_store=True)
+            runner.start()
+
+        mock_migrate.assert_called_once_with(runner.checkpoint_dir)
+        mock_convert.assert_called_once_with(True)
+
+    def test_start_with_convert_cache_skips_full_convert(self, common_patches):
+        """Test that the conversion cache is used instead of a full conversion."""
+        mock_convert = common_patches["mock_convert"]
+        mock_train = common_patches["mock_train"]
+        mock_train.return_value = {"final_checkpoint": "/path/to/model"}
+
+        with patch("blockassist.train.run_sharded_convert_main") as mock_cached_convert:
+            mock_cached_convert.return_value = {
+                "mbag_config": {"test": "config"},
+                "out_dir": "/out",
+                "session_count": 3,
+            }
+            runner = TrainingRunner("dummy_address_eoa", use_convert_cache=True)
+            runner.start()
+
+        mock_cached_convert.assert_called_once_with(
+            runner.checkpoint_dir, False, max_workers=1, use_cache=True
+        )
+        mock_convert.assert_not_called()
+        common_patches["mock_rmtree"].assert_not_called()
+        mock_train.assert_called_once_with(
+            mbag_config={"test": "config"}, rllib_path="/out", num_training_iters=1
+        )
+        assert common_patches["mock_telemetry_trained"].call_args[0][2] == 3
+
+    def test_start_with_convert_workers_shards_without_cache(self, common_patches):
+        """Test that convert_workers > 1 converts in parallel without keeping a cache."""
+        mock_convert = common_patches["mock_convert"]
+        mock_train = common_patches["mock_train"]
+        mock_train.return_value = {"final_checkpoint": "/path/to/model"}
+
+        with patch("blockassist.train.run_sharded_convert_main") as mock_sharded_convert:
+            mock_sharded_convert.return_value = {"mbag_config": {}, "out_dir": "/out"}
+            runner = TrainingRunner("dummy_address_eoa", convert_workers=4)
+            runner.start()
+
+        mock_sharded_convert.assert_called_once_with(
+            runner.checkpoint_dir, False, max_workers=4, use_cache=False
+        )
+        mock_convert.assert_not_called()
+
+    def test_start_with_binary_shards_trains_from_shards(self, common_patches):
+        """Test that the converted JSON is written as binary shards and trained from."""
+        mock_train = common_patches["mock_train"]
+        mock_train.return_value = {"final_checkpoint": "/path/to/model"}
+        common_patches["mock_convert"].return_value = {"mbag_config": {}, "out_dir": "/out"}
+
+        with patch("blockassist.train.write_binary_shards") as mock_write:
+            mock_write.return_value = "/binary"
+            runner = TrainingRunner("dummy_address_eoa", binary_shards=True)
+            runner.start()
+
+        mock_write.assert_called_once_with(
+            "/out", os.path.join(runner.checkpoint_dir, "..", "rllib_binary")
+        )
+        mock_train.assert_called_once_with(
+            mbag_config={}, rllib_path="/binary", num_training_iters=1, binary_shards=True
+        )
+
+    def test_validation_uses_best_checkpoint_as_model(self, common_patches, tmp_path):
+        """Test that the best validation checkpoint, not the last one, becomes the model."""
+        common_patches["mock_convert"].return_value = {"mbag_config": {}, "out_dir": "/out"}
+        algorithm = MagicMock()
+
+        def train(**kwargs):
+            for iteration, loss in enumerate([0.9, 0.5, 0.6, 0.7], start=1):
+                algorithm.save.return_value = str(tmp_path / f"checkpoint_{iteration}")
+                early_stopping._ACTIVE_STOPPER.on_train_result(
+                    algorithm,
+                    {
+                        "training_iteration": iteration,
+                        "info": {"learner": {"human": {"validation": {"cross_entropy": loss}}}},
+                    },
+                )
+            return {"final_checkpoint": str(tmp_path / "checkpoint_4")}
+
+        common_patches["mock_train"].side_effect = train
+        runner = TrainingRunner(
+            "dummy_address_eoa", validation_prop=0.1, early_stopping_patience=2
+        )
+        runner.start()
+
+        assert common_patches["mock_train"].call_args.kwargs["validation_prop"] == 0.1
+        assert runner.model_dir == str(tmp_path / "checkpoint_2")
+        (stopping,) = [e for e in runner.metrics.events if e["event"] == "stopping"]
+        assert stopping["stop_reason"] == "early_stopping"
+        assert stopping["best_iteration"] == 2
+
+    def test_metrics_file_records_phases_and_summary(self, common_patches, tmp_path):
+        """Test that a run writes conversion and training phases and a summary."""
+        self.setup_mocks(common_patches, config={"test": "config"}, out_dir="/out")
+        common_patches["mock_train"].return_value = {"final_checkpoint": "/path/to/model"}
+        metrics_path = tmp_path / "training_metrics.jsonl"
+
+        TrainingRunner("dummy_address_eoa", metrics_path=str(metrics_path)).start()
+
+        events = [json.loads(line) for line in metrics_path.read_text().splitlines()]
+        assert events[0]["event"] == "start"
+        assert [e["phase"] for e in events if e["event"] == "phase"] == [
+            "conversion",
+            "training",
+        ]
+        assert events[-1]["event"] == "summary"
+        assert events[-1]["session_count"] == 1
+        assert events[-1]["model_dir"] == "/path/to/model"
+
+
+class TestContinualTraining:
+    @pytest.fixture
+    def patches(self):
+        with patch("blockassist.train.telemetry.push_telemetry_event_trained"), \
+             patch("blockassist.train.run_sharded_convert_main") as mock_convert, \
+             patch("blockassist.train.run_train_main") as mock_train:
+            yield mock_convert, mock_train
+
+    def make_runner(self, tmp_path):
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        checkpoint_dir.mkdir()
+        return TrainingRunner(
+            "dummy_address_eoa", checkpoint_dir=str(checkpoint_dir), continual=True
+        )
+
+    def test_first_run_trains_from_base_and_records_checkpoint(self, tmp_path, patches):
+        """Test that the first continual run trains on everything and records its checkpoint."""
+        mock_convert, mock_train = patches
+        final_checkpoint = tmp_path / "checkpoint_000001"
+        final_checkpoint.mkdir()
+        mock_convert.return_value = {
+            "mbag_config": {}, "out_dir": "/out", "session_count": 2, "episode_keys": ["a", "b"]
+        }
+        mock_train.return_value = {"final_checkpoint": str(final_checkpoint)}
+
+        runner = self.make_runner(tmp_path)
+        runner.start()
+
+        assert mock_convert.call_args.kwargs["exclude_keys"] == set()
+        assert "checkpoint_path" not in mock_train.call_args.kwargs
+        state = ContinualTrainingState(tmp_path / "continual_training.json")
+        identifier = get_identifier("dummy_address_eoa")
+        assert state.get_last_checkpoint(identifier) == str(final_checkpoint)
+        assert state.get_trained_episodes(identifier) == {"a", "b"}
+
+    def test_missing_checkpoint_trains_from_base(self, tmp_path, patches):
+        """Test that a recorded checkpoint that was deleted is not resumed."""
+        mock_convert, mock_train = patches
+        state = ContinualTrainingState(tmp_path / "continual_training.json")
+        state.record(get_identifier("dummy_address_eoa"), str(tmp_path / "gone"), ["a"])
+        mock_convert.return_value = {
+            "mbag_config": {}, "out_dir": "/out", "session_count": 1, "episode_keys": ["a"]
+        }
+        mock_train.return_value = {"final_checkpoint": str(tmp_path / "new")}
+
+        self.make_runner(tmp_path).start()
+
+        assert mock_convert.call_args.kwargs["exclude_keys"] == set()
+        assert "checkpoint_path" not in mock_train.call_args.kwargs
+
+    def test_resumes_from_last_checkpoint_with_new_sessions_only(self, tmp_path, patches):
+        """Test that a later run resumes the recorded checkpoint and excludes trained episodes."""
+        mock_convert, mock_train = patches
+        first_checkpoint = tmp_path / "checkpoint_000001"
+        first_checkpoint.mkdir()
+        mock_convert.return_value = {
+            "mbag_config": {}, "out_dir": "/out", "session_count": 1, "episode_keys": ["a"]
+        }
+        mock_train.return_value = {"final_checkpoint": str(first_checkpoint)}
+        self.make_runner(tmp_path).start()
+
+        mock_convert.return_value = {
+            "mbag_config": {}, "out_dir": "/out", "session_count": 1, "episode_keys": ["a", "b"]
+        }
+        mock_train.return_value = {"final_checkpoint": str(tmp_path / "checkpoint_000002")}
+        runner = TrainingRunner(
+            "dummy_address_eoa", checkpoint_dir=str(tmp_path / "base_checkpoint"), continual=True
+        )
+        runner.start()
+
+        assert mock_convert.call_args.kwargs["exclude_keys"] == {"a"}
+        assert mock_train.call_args.kwargs["checkpoint_path"] == str(first_checkpoint)
+        assert runner.model_dir == str(tmp_path / "checkpoint_000002")
+
+    def test_skips_training_without_new_sessions(self, tmp_path, patches):
+        """Test that training is skipped when every episode was already trained on."""
+        mock_convert, mock_train = patches
+        mock_convert.return_value = {"out_dir": "/out", "session_count": 0, "episode_keys": ["a"]}
+
+        runner = self.make_runner(tmp_path)
+        runner.start()
+
+        mock_train.assert_not_called()
+        assert runner.model_dir is None
+        assert runner.training_ended.is_set()
+
+
+class TestTrainAutotune:
+    @pytest.fixture
+    def patches(self):
+        with patch("blockassist.train.telemetry.push_telemetry_event_trained"), \
+             patch("blockassist.train.run_convert_main") as mock_convert, \
+             patch("blockassist.train.run_train_main") as mock_train, \
+             patch("blockassist.autotune.probe_hardware", return_value={
+                 "physical_cores": 4, "logical_cores": 8, "total_ram_gb": 16, "available_ram_gb": 16
+             }):
+            mock_convert.return_value = {"mbag_config": {}, "out_dir": "/out"}
+            yield mock_train
+
+    def test_calibrate_mode_times_short_runs_before_training(self, tmp_path, patches):
+        """Test that calibration runs short trainings and trains with the winner."""
+        mock_train = patches
+
+        def train(**kwargs):
+            active = metrics._ACTIVE_METRICS
+            if active is not None and kwargs["num_training_iters"] == 2:
+                threads = kwargs["train_settings"].torch_threads
+                active.on_train_result(
+                    {"training_iteration": 2, "time_this_iter_s": 1.0,
+                     "num_env_steps_trained_this_iter": 100 * threads}
+                )
+            return {"final_checkpoint": str(tmp_path / "ckpt")}
+
+        mock_train.side_effect = train
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        checkpoint_dir.mkdir()
+        TrainingRunner(
+            "dummy_address_eoa",
+            num_training_iters=5,
+            checkpoint_dir=str(checkpoint_dir),
+            train_autotune="calibrate",
+        ).start()
+
+        calibration_calls = [c for c in mock_train.call_args_list if c.kwargs["num_training_iters"] == 2]
+        assert all(c.kwargs["train_settings"].train_batch_size == 1024 for c in calibration_calls)
+        final_call = mock_train.call_args_list[-1]
+        assert final_call.kwargs["num_training_iters"] == 5
+        assert final_call.kwargs["train_settings"].torch_threads == 4
+        assert final_call.kwargs["train_settings"].train_batch_size is None
+        assert (tmp_path / "train_autotune.json").exists()
+
+    def test_default_keeps_mbag_settings(self, tmp_path, patches):
+        """Test that training settings are left alone unless autotuning is enabled."""
+        mock_train = patches
+        mock_train.return_value = {"final_checkpoint": str(tmp_path / "ckpt")}
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        checkpoint_dir.mkdir()
+
+        TrainingRunner("dummy_address_eoa", checkpoint_dir=str(checkpoint_dir)).start()
+
+        mock_train.assert_called_once()
+        assert mock_train.call_args.kwargs.get("train_settings") is None
+
+
+class TestBackgroundConverter:
+    def write_episode(self, checkpoint_dir, name):
+        run_dir = checkpoint_dir / name / "1"
+        run_dir.mkdir(parents=True)
+        (run_dir / "episodes.zip").write_text(name)
+        return run_dir
+
+    def fake_convert(self, named_config, data_dir, episode_fname, out_dir):
+        os.makedirs(out_dir)
+        (Path(out_dir) / "output-0.json").write_text(json.dumps({"episode": episode_fname}))
+        return {"mbag_config": {"named_config": named_config}, "out_dir": out_dir}
+
+    def test_precomputed_episodes_are_reused_by_training(self, tmp_path):
+        """Test that episodes converted while recording are not converted again."""
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        run_dir = self.write_episode(checkpoint_dir, "evaluate_a")
+        self.write_episode(checkpoint_dir, "evaluate_b")
+
+        with patch("blockassist.train._convert_episode", side_effect=self.fake_convert) as mock_convert:
+            keys = _precompute_evaluate_dir(str(checkpoint_dir), str(run_dir), False)
+            assert len(keys) == 1
+            assert mock_convert.call_count == 1
+
+            result = run_sharded_convert_main(str(checkpoint_dir))
+
+        # Only evaluate_b was left for the train stage.
+        assert mock_convert.call_count == 2
+        assert "evaluate_b" in mock_convert.call_args.args[2]
+        assert result["session_count"] == 2
+        assert len(list(Path(result["out_dir"]).glob("*.json"))) == 2
+
+    def test_submit_and_wait_run_in_executor(self, tmp_path):
+        """Test that submitted evaluate dirs are converted and waited for."""
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        run_dir = self.write_episode(checkpoint_dir, "evaluate_a")
+        converter = BackgroundConverter(str(checkpoint_dir))
+
+        with patch("blockassist.train.ProcessPoolExecutor", lambda **kwargs: ThreadPoolExecutor(1)), \
+             patch("blockassist.train._convert_episode", side_effect=self.fake_convert):
+            future = converter.submit(run_dir)
+            converter.shutdown()
+
+        assert future.done()
+        assert len(future.result()) == 1
+        assert (tmp_path / "rllib_cache").is_dir()
+
+    def test_failed_background_conversion_does_not_raise(self, tmp_path):
+        """Test that wait() logs instead of raising, leaving the episode to training."""
+        checkpoint_dir = tmp_path / "base_checkpoint"
+        run_dir = self.write_episode(checkpoint_dir, "evaluate_a")
+        converter = BackgroundConverter(str(checkpoint_dir))
+
+        with patch("blockassist.train.ProcessPoolExecutor", lambda **kwargs: ThreadPoolExecutor(1)), \
+             patch("blockassist.train._convert_episode", side_effect=RuntimeError("boom")):
+            future = converter.submit(run_dir)
+            converter.wait()
+
+        assert isinstance(future.exception(), RuntimeError)
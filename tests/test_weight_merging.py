@@ -0,0 +1,86 @@
+import pytest
+import torch
+import torch.nn as nn
+
+from blockassist.merging.weight_merging import compare_with_bagging, merge_models
+
+
+def make_linear(weight: list[list[float]], bias: list[float]) -> nn.Linear:
+    model = nn.Linear(len(weight[0]), len(weight))
+    with torch.no_grad():
+        model.weight.copy_(torch.tensor(weight))
+        model.bias.copy_(torch.tensor(bias))
+    return model
+
+
+class TestMergeModels:
+    def test_average_of_linear_models_matches_bagging(self):
+        """Test that averaging linear models gives exactly the bagged output."""
+        torch.manual_seed(0)
+        models = [nn.Linear(6, 3) for _ in range(4)]
+        weights = [4.0, 3.0, 2.0, 1.0]
+
+        merged = merge_models(models, weights=weights)
+
+        samples = [torch.randn(5, 6) for _ in range(3)]
+        assert compare_with_bagging(merged, models, samples, weights) < 1e-5
+
+    def test_inputs_are_not_modified(self, make_mlps):
+        """Test that merging returns a new model and leaves the inputs alone."""
+        models = make_mlps(2)
+        before = [m.state_dict()["0.weight"].clone() for m in models]
+
+        merged = merge_models(models)
+
+        assert all(merged is not m for m in models)
+        for model, weight in zip(models, before):
+            assert torch.equal(model.state_dict()["0.weight"], weight)
+
+    def test_task_arithmetic(self):
+        """Test that the scaled mean task vector is added to the base model."""
+        base = make_linear([[0.0, 0.0]], [0.0])
+        models = [make_linear([[1.0, 0.0]], [1.0]), make_linear([[0.0, 3.0]], [1.0])]
+
+        merged = merge_models(models, "task_arithmetic", base_model=base, scaling=2.0)
+
+        assert torch.allclose(merged.weight, torch.tensor([[1.0, 3.0]]))
+        assert torch.allclose(merged.bias, torch.tensor([2.0]))
+
+    def test_ties_resolves_sign_conflicts(self):
+        """Test that TIES trims small entries and averages only the elected sign."""
+        base = make_linear([[0.0, 0.0, 0.0, 0.0]], [0.0])
+        models = [
+            make_linear([[3.0, 0.1, -1.0, 0.0]], [0.0]),
+            make_linear([[1.0, 0.0, 2.0, -4.0]], [0.0]),
+            make_linear([[-1.0, 0.0, 2.0, 0.0]], [0.0]),
+        ]
+
+        merged = merge_models(models, "ties", base_model=base, density=0.5)
+
+        # Each model keeps its two largest entries, so 0.1 and the second
+        # model's 1.0 are trimmed. Entry 0: -1 disagrees with the elected
+        # positive sign and is dropped. Entry 2: -1 is outvoted by 2 + 2.
+        assert torch.allclose(merged.weight, torch.tensor([[3.0, 0.0, 2.0, -4.0]]))
+
+    def test_methods_without_base_raise(self, make_mlps):
+        """Test that task arithmetic and TIES need the model they start from."""
+        with pytest.raises(ValueError):
+            merge_models(make_mlps(2), "ties")
+
+    def test_different_architectures_raise(self):
+        """Test that models with different parameter shapes cannot be merged."""
+        with pytest.raises(ValueError):
+            merge_models([nn.Linear(8, 4), nn.Linear(8, 2)])
+
+
+class TestCompareWithBagging:
+    def test_tolerance_exceeded_raises(self, make_mlps):
+        """Test that a nonlinear merge far from bagging fails validation."""
+        models = make_mlps(2)
+        merged = merge_models(models)
+
+        samples = [torch.randn(16, 8) * 10]
+        diff = compare_with_bagging(merged, models, samples)
+        assert diff > 0
+        with pytest.raises(ValueError):
+            compare_with_bagging(merged, models, samples, tolerance=diff / 2)